@@ -0,0 +1,143 @@
+import json, random
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+CHECKING = 'Assets:Bank:Checking'
+PAYEES = ['Grocer', 'Cafe', 'Hardware Store', 'Gas Station', 'Pharmacy', 'Bookshop', 'Restaurant', 'Cinema']
+BILLS = [
+    {"tag": "rent", "account": "Expenses:Rent", "liability": "Liabilities:Rent", "amount": "1200.00", "due": "1", "payee": "Landlord"},
+    {"tag": "power", "account": "Expenses:Utilities:Power", "liability": "Liabilities:Power", "amount": "80.00", "due": "15", "payee": "Power Co"},
+    {"tag": "phone", "account": "Expenses:Utilities:Phone", "liability": "Liabilities:Phone", "amount": "45.00", "due": "20", "payee": "Phone Co"}
+]
+
+class SyntheticTransaction:
+    def __init__(self, id, date, payee, amount, account, reconciled):
+        self.id = id
+        self.date = date
+        self.payee = payee
+        self.amount = amount
+        self.account = account
+        self.reconciled = reconciled
+
+def synthetic_transactions(count, accounts=50, start=date(2020, 1, 1), days=365 * 5, reconciled=0.9, seed=0):
+    rng = random.Random(seed)
+    expenses = [f"Expenses:Category{i:03d}" for i in range(accounts)]
+    txns = []
+    for i in range(count):
+        txns.append(SyntheticTransaction(
+            id=f"TRN-{i:08d}",
+            date=start + timedelta(days=int(i * days / max(count, 1))),
+            payee=rng.choice(PAYEES),
+            amount=f"{rng.randint(100, 50000) / 100:.2f}",
+            account=rng.choice(expenses),
+            reconciled=rng.random() < reconciled))
+    return expenses, txns
+
+def generate_ledger(directory, transactions, accounts=50, reconciled=0.9, seed=0):
+    """
+    Write a ledger split into one included file per month
+
+    Returns the main ledger path and the synthetic transactions, so bank files
+    can be generated against the same data.
+    """
+    directory = Path(directory)
+    (directory / 'txns').mkdir(parents=True, exist_ok=True)
+    expenses, txns = synthetic_transactions(transactions, accounts, reconciled=reconciled, seed=seed)
+    months = {}
+    for txn in txns:
+        months.setdefault(txn.date.strftime('%Y-%m'), []).append(txn)
+    start = txns[0].date if txns else date(2020, 1, 1)
+    for month, month_txns in months.items():
+        lines = []
+        for txn in month_txns:
+            lines.append(f'{txn.date} * "{txn.payee}" ""')
+            lines.append(f'  {CHECKING}  -{txn.amount} USD')
+            if txn.reconciled: lines.append(f'    rec: "{txn.id}"')
+            lines.append(f'  {txn.account}  {txn.amount} USD')
+            lines.append('')
+        for bill in BILLS:
+            bill_date = datetime.strptime(f"{month}-{int(bill['due']):02d}", '%Y-%m-%d').date()
+            lines.append(f'{bill_date} ! "{bill["payee"]}" #bill ^{bill["tag"]}-{month}')
+            lines.append(f'  {bill["account"]}  {bill["amount"]} USD')
+            lines.append(f'  {bill["liability"]}  -{bill["amount"]} USD')
+            lines.append('')
+        (directory / 'txns' / f"{month}.beancount").write_text('\n'.join(lines), encoding='utf-8')
+    main = [
+        'option "title" "Synthetic"',
+        'option "operating_currency" "USD"',
+        '',
+        f'{start - timedelta(days=1)} open {CHECKING}',
+        f'{start - timedelta(days=1)} open Equity:Opening'
+    ]
+    for account in expenses + [b['account'] for b in BILLS] + [b['liability'] for b in BILLS]:
+        main.append(f'{start - timedelta(days=1)} open {account}')
+    main.append('')
+    main.append(f'{start} query "by_account" "SELECT account, sum(position) WHERE account ~ \'{{0}}\' GROUP BY account"')
+    main.append(f'{start} query "by_month" "SELECT year, month, sum(position) WHERE account ~ \'Expenses\' AND year = {{year}} GROUP BY year, month"')
+    main.append('')
+    for month in sorted(months):
+        main.append(f'include "txns/{month}.beancount"')
+    ledger_path = directory / 'main.beancount'
+    ledger_path.write_text('\n'.join(main) + '\n', encoding='utf-8')
+    (directory / 'bills.json').write_text(json.dumps(BILLS, indent=4), encoding='utf-8')
+    return ledger_path, txns
+
+def bank_transactions(txns, new=0, seed=0):
+    # Every ledger transaction as the bank would report it, plus new unseen ones
+    rng = random.Random(seed)
+    bank = [(t.id, t.date, t.payee.upper() + f" #{rng.randint(1000, 9999)}", f"-{t.amount}") for t in txns]
+    last = txns[-1].date if txns else date(2020, 1, 1)
+    for i in range(new):
+        bank.append((f"NEW-{i:08d}", last + timedelta(days=i % 30), rng.choice(PAYEES).upper(), f"-{rng.randint(100, 50000) / 100:.2f}"))
+    return bank
+
+def generate_simplefin(path, txns, accounts=1, new=0, seed=0):
+    bank = bank_transactions(txns, new, seed)
+    data = {"errors": [], "accounts": []}
+    for a in range(accounts):
+        data['accounts'].append({
+            "id": f"ACT-{a:04d}",
+            "name": f"Checking {a}",
+            "currency": "USD",
+            "balance": "0.00",
+            "balance-date": 0,
+            "org": {"name": "Synthetic Bank", "domain": "bank.example"},
+            "transactions": [{
+                "id": id if a == 0 else f"{id}-{a}",
+                "posted": int(datetime.combine(txn_date, datetime.min.time()).timestamp()),
+                "amount": amount,
+                "description": payee,
+                "payee": payee
+            } for id, txn_date, payee, amount in bank]
+        })
+    Path(path).write_text(json.dumps(data), encoding='utf-8')
+    return path
+
+def generate_ofx(path, txns, new=0, seed=0, account_id='000123456789'):
+    bank = bank_transactions(txns, new, seed)
+    lines = [
+        'OFXHEADER:100', 'DATA:OFXSGML', 'VERSION:102', 'SECURITY:NONE', 'ENCODING:USASCII',
+        'CHARSET:1252', 'COMPRESSION:NONE', 'OLDFILEUID:NONE', 'NEWFILEUID:NONE', '',
+        '<OFX>',
+        '<SIGNONMSGSRSV1><SONRS><STATUS><CODE>0<SEVERITY>INFO</STATUS>',
+        '<DTSERVER>20240101000000<LANGUAGE>ENG<FI><ORG>Synthetic Bank<FID>1</FI></SONRS></SIGNONMSGSRSV1>',
+        '<BANKMSGSRSV1><STMTTRNRS><TRNUID>1<STATUS><CODE>0<SEVERITY>INFO</STATUS>',
+        '<STMTRS><CURDEF>USD<BANKACCTFROM><BANKID>1<ACCTID>' + account_id + '<ACCTTYPE>CHECKING</BANKACCTFROM>',
+        '<BANKTRANLIST><DTSTART>20200101<DTEND>20300101'
+    ]
+    for id, txn_date, payee, amount in bank:
+        lines.append('<STMTTRN>')
+        lines.append('<TRNTYPE>DEBIT')
+        lines.append(f'<DTPOSTED>{txn_date.strftime("%Y%m%d")}120000')
+        lines.append(f'<TRNAMT>{amount}')
+        lines.append(f'<FITID>{id}')
+        lines.append(f'<NAME>{payee}')
+        lines.append('</STMTTRN>')
+    lines += [
+        '</BANKTRANLIST>',
+        '<LEDGERBAL><BALAMT>0.00<DTASOF>20240101</LEDGERBAL>',
+        '</STMTRS></STMTTRNRS></BANKMSGSRSV1>',
+        '</OFX>'
+    ]
+    Path(path).write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    return path
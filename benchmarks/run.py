@@ -0,0 +1,122 @@
+import json, os, platform, statistics, sys, tempfile, time, typer
+from datetime import datetime
+from pathlib import Path
+from typing_extensions import Annotated
+from .generate import CHECKING, generate_ledger, generate_simplefin, generate_ofx
+
+def timeit(name, func, repeat, results, setup=None, **info):
+    times = []
+    for _ in range(repeat):
+        if setup is not None: setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    result = {"name": name, "repeat": repeat, "min": min(times), "median": statistics.median(times), "max": max(times)}
+    result.update(info)
+    results.append(result)
+    print(f"{name:<28} min {result['min']:.4f}s  median {result['median']:.4f}s", file=sys.stderr)
+    return result
+
+def generate_simplefin_data(simplefin_path, copies):
+    # The single account repeated under new ids, so a store has partitions it does not need to read
+    data = json.loads(Path(simplefin_path).read_text(encoding='utf-8'))
+    account = data['accounts'][0]
+    data['accounts'] = [dict(account, id=f"{account['id']}-{i}") for i in range(copies)]
+    return data
+
+def run_benchmarks(directory, transactions, accounts, new, matches, repeat):
+    # Imported late so BEAN_TOOLS_CACHE_DIR applies to the cache module
+    from bean_tools import __version__
+    from bean_tools.prompts import console
+    from bean_tools.ledger import Ledger, ledger_load
+    from bean_tools.helpers import get_json, get_pending, get_matches
+    from bean_tools.bean_bills import check_bills, bills_matrix, month_range
+    from bean_tools.bean_inquiry import run_query, PARSED
+    from bean_tools.edits import EditSession
+    from bean_tools.simplefin import Account, simplefin_data, store_write
+    from bean_tools.ofx import ofx_load
+    from beancount import loader
+
+    console.quiet = True
+    results = []
+    directory = Path(directory)
+    ledger_path, txns = generate_ledger(directory / 'ledger', transactions, accounts)
+    simplefin_path = generate_simplefin(directory / 'data.json', txns, new=new)
+    ofx_path = generate_ofx(directory / 'data.ofx', txns, new=new)
+    size = {"transactions": transactions, "accounts": accounts, "new": new}
+
+    timeit("ledger_load_uncached", lambda: ledger_load(ledger_path, use_cache=False), repeat, results, **size)
+    ledger_load(ledger_path)
+    timeit("ledger_load_cached", lambda: ledger_load(ledger_path), repeat, results, **size)
+    entries, errors, options = loader.load_file(ledger_path)
+    timeit("ledger_construct", lambda: Ledger(entries, errors, options), repeat, results, **size)
+    ledger = Ledger(entries, errors, options)
+
+    timeit("simplefin_parse", lambda: Account(get_json(simplefin_path)['accounts'][0]), repeat, results, **size)
+    store_path = directory / 'store'
+    store_write(store_path, generate_simplefin_data(simplefin_path, 4), compress=True)
+    def store_parse():
+        store_accounts, load = simplefin_data(store_path)
+        return load(store_accounts[0])
+    timeit("simplefin_store_parse", store_parse, repeat, results, store_accounts=4, **size)
+    timeit("ofx_parse", lambda: ofx_load(ofx_path), repeat, results, **size)
+    month = txns[len(txns) // 2].date.strftime('%Y-%m') if txns else '2020-01'
+    timeit("ofx_parse_period", lambda: ofx_load(ofx_path, month), repeat, results, period=month, **size)
+    bank = Account(get_json(simplefin_path)['accounts'][0])
+    pending = get_pending(bank.transactions, ledger, CHECKING)
+    timeit("get_pending", lambda: get_pending(bank.transactions, ledger, CHECKING), repeat, results, pending=len(pending), **size)
+    sample = bank.transactions[:matches]
+    timeit("get_matches", lambda: [get_matches(t, ledger, CHECKING) for t in sample], repeat, results, matches=len(sample), **size)
+    timeit("get_matches_window", lambda: [get_matches(t, ledger, CHECKING, 7) for t in sample], repeat, results, matches=len(sample), days=7, **size)
+
+    bills = get_json(ledger_path.parent / 'bills.json', default=[])
+    timeit("bills_status", lambda: check_bills(bills, ledger, month), repeat, results, bills=len(bills), **size)
+    year = month_range(f"{month[:4]}-01", f"{month[:4]}-12")
+    timeit("bills_matrix_year", lambda: bills_matrix(bills, ledger, year), repeat, results, bills=len(bills), months=len(year), **size)
+
+    query_string = ledger.queries[0].query_string.format('Expenses')
+    timeit("inquiry_query_unparsed", lambda: run_query(ledger, query_string, use_cache=False), repeat, results, setup=PARSED.clear, **size)
+    timeit("inquiry_query", lambda: run_query(ledger, query_string), repeat, results, **size)
+
+    # Writes go to the generated ledger files, which are rebuilt on every run
+    bean = next(b for b in ledger.transactions if 'filename' in b.entry.meta)
+    timeit("bean_replace", lambda: ledger.replace(bean), repeat, results, **size)
+    beans = [b for b in ledger.transactions if b.entry.meta.get('filename') == bean.entry.meta['filename']]
+    session = EditSession(directory / 'journal.jsonl', checkpoint=None)
+    def session_replace():
+        for b in beans: ledger.replace(b, session)
+        ledger.commit(session)
+    timeit("session_replace_commit", session_replace, repeat, results, edits=len(beans), **size)
+
+    return {
+        "version": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": datetime.now().isoformat(timespec='seconds'),
+        "results": results
+    }
+
+def bench(
+    transactions: Annotated[int, typer.Option("--transactions", "-t", help="Number of ledger transactions to generate")]=10000,
+    accounts: Annotated[int, typer.Option("--accounts", "-a", help="Number of expense accounts to generate")]=50,
+    new: Annotated[int, typer.Option("--new", "-n", help="Number of bank transactions not yet in the ledger")]=100,
+    matches: Annotated[int, typer.Option("--matches", "-m", help="Number of bank transactions to look up matches for")]=500,
+    repeat: Annotated[int, typer.Option("--repeat", "-r", help="Number of times each benchmark is run")]=3,
+    output: Annotated[Path, typer.Option("--output", "-o", help="The JSON file to write results to instead of stdout", exists=False)]=None,
+    directory: Annotated[Path, typer.Option("--directory", "-D", help="Generate the synthetic files here instead of a temporary directory", exists=False)]=None
+):
+    """
+    Generate synthetic ledger, OFX and SimpleFIN files and time bean-tools against them
+    """
+    with tempfile.TemporaryDirectory(prefix='bean-tools-bench-') as tmp:
+        os.environ['BEAN_TOOLS_CACHE_DIR'] = str(Path(tmp) / 'cache')
+        report = run_benchmarks(directory or tmp, transactions, accounts, new, matches, repeat)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4)
+        print(f"Saved results to {output}", file=sys.stderr)
+    else:
+        print(json.dumps(report, indent=4))
+
+def main():
+    typer.run(bench)
@@ -0,0 +1,50 @@
+import sys, tempfile, time, typer
+from pathlib import Path
+from typing_extensions import Annotated
+from tests.simplefin_server import serve
+from .generate import synthetic_transactions, generate_simplefin
+
+def download(
+    transactions: Annotated[int, typer.Option("--transactions", "-t", help="Number of bank transactions to serve")]=10000,
+    accounts: Annotated[int, typer.Option("--accounts", "-a", help="Number of SimpleFIN accounts to serve")]=2,
+    latency: Annotated[float, typer.Option("--latency", "-l", help="Seconds each request takes on the server")]=0.2,
+    fail_every: Annotated[int, typer.Option("--fail-every", "-f", help="Answer the first request for every nth window with a 503")]=0,
+    window_days: Annotated[int, typer.Option("--window-days", "-w", help="Days per download window")]=60,
+    workers: Annotated[int, typer.Option("--workers", "-j", help="Concurrent windows for the parallel run")]=4,
+    serve_only: Annotated[bool, typer.Option("--serve", help="Only run the server and print its access url")]=False,
+    port: Annotated[int, typer.Option("--port", "-p", help="Port to listen on, 0 picks a free one")]=0
+):
+    """
+    Time a sequential and a parallel windowed download against the local stand-in server
+    """
+    from bean_tools.bean_download import simplefin_fetch
+    from bean_tools.helpers import get_timestamp
+    with tempfile.TemporaryDirectory() as directory:
+        data_path = Path(directory) / 'data.json'
+        expenses, txns = synthetic_transactions(transactions)
+        generate_simplefin(data_path, txns, accounts)
+        server, access_url = serve(data_path, port, latency, fail_every)
+        if serve_only:
+            print(f"ACCESS_URL={access_url}", file=sys.stderr)
+            try:
+                while True: time.sleep(60)
+            except KeyboardInterrupt:
+                server.shutdown()
+                return
+        start = get_timestamp(txns[0].date.isoformat())
+        end = get_timestamp(txns[-1].date.isoformat()) + 24 * 60 * 60
+        expected = transactions * accounts
+        for run_workers in (1, workers):
+            server.requests = 0
+            server.connections = set()
+            server.queries = set()
+            started = time.perf_counter()
+            data, failed = simplefin_fetch(access_url, start, end, window_days=window_days, workers=run_workers, backoff=0.01)
+            elapsed = time.perf_counter() - started
+            count = sum(len(a['transactions']) for a in data['accounts'])
+            status = 'ok' if count == expected and not failed else 'FAIL'
+            print(f"workers {run_workers:<3} {elapsed:.3f}s requests {server.requests} connections {len(server.connections)} transactions {count}/{expected} failed windows {len(failed)} [{status}]", file=sys.stderr)
+        server.shutdown()
+
+if __name__ == "__main__":
+    typer.run(download)
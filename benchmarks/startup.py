@@ -0,0 +1,55 @@
+import json, statistics, subprocess, sys, time, typer
+from typing_extensions import Annotated
+
+HEAVY_MODULES = ['beancount', 'beanquery', 'requests', 'dotenv', 'prompt_toolkit']
+
+# Runs a CLI invocation in a fresh interpreter and reports which heavy modules it imported
+PROBE = """
+import json, sys
+args, heavy = json.loads(sys.argv[1]), json.loads(sys.argv[2])
+sys.argv = ['bean-tools'] + args
+from bean_tools.cli import app
+try:
+    app()
+except SystemExit:
+    pass
+print(json.dumps([m for m in heavy if m in sys.modules]), file=sys.stderr)
+"""
+
+def time_command(args, repeat):
+    times = []
+    loaded = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-c', PROBE, json.dumps(args), json.dumps(HEAVY_MODULES)],
+            capture_output=True, text=True)
+        times.append(time.perf_counter() - start)
+        loaded = json.loads(result.stderr.strip().splitlines()[-1])
+    return statistics.median(times), loaded
+
+def startup(
+    budget: Annotated[float, typer.Option("--budget", "-b", help="Maximum median startup time in seconds")]=0.35,
+    repeat: Annotated[int, typer.Option("--repeat", "-r", help="Number of runs per command")]=5,
+    output: Annotated[str, typer.Option("--output", "-o", help="The JSON file to write results to")]=None
+):
+    """
+    Time `bean-tools version` and `--help` startup and fail when over budget or importing heavy dependencies
+    """
+    results = []
+    failed = False
+    for args in (['version'], ['--help']):
+        median, loaded = time_command(args, repeat)
+        over = median > budget
+        failed = failed or over or bool(loaded)
+        results.append({"command": ' '.join(args), "median": median, "budget": budget, "heavy_modules": loaded})
+        status = 'FAIL' if over or loaded else 'ok'
+        print(f"{' '.join(args):<10} median {median:.3f}s (budget {budget:.3f}s) heavy modules: {', '.join(loaded) or 'none'} [{status}]", file=sys.stderr)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump({"results": results}, f, indent=4)
+    if failed:
+        raise typer.Exit(code=1)
+
+if __name__ == "__main__":
+    typer.run(startup)
@@ -1,13 +1,14 @@
-import typer
+import bisect, csv, os, typer
 from .helpers import (
     get_json,
     set_json,
     dec,
-    cur,
-    append_lines,
-    insert_lines
+    cur
 )
 from .ledger import ledger_load, ledger_bean, new_bean
+from .ofx import ofx_paths, ofx_files_load
+from .simplefin import simplefin_accounts
+from .edits import edit_session
 from .prompts import (
     console,
     err_console,
@@ -28,9 +29,12 @@ from . import __version__
 from pathlib import Path
 from prompt_toolkit import prompt
 from prompt_toolkit.completion import FuzzyCompleter, WordCompleter
+from typing import List
 from typing_extensions import Annotated
 from datetime import date, datetime, timedelta
 
+STATUS_STYLES = {'missing': 'file', 'unpaid': 'error', 'pending': 'warning', 'paid': 'pos'}
+
 def print_bill(bill, spacing=20):
     status = ''
     amt_style = 'number'
@@ -51,6 +55,170 @@ def print_bill(bill, spacing=20):
     if status: bill_str = f"{bill_str}{' '*(10 - len(cur(bill['amount'])))} | {status}"
     return bill_str
 
+def bill_status(bill, ledger_data, month):
+    linked = ledger_data.linked(f"{bill['tag']}-{month}")
+    bill_txn = next((txn for txn in linked if 'bill' in txn.entry.tags), None)
+    payment_txn = next((txn for txn in linked if 'payment' in txn.entry.tags), None)
+    status = {'bill_txn': bill_txn, 'payment_txn': payment_txn}
+    if bill_txn is None: status['status'] = 'missing'
+    elif bill_txn.entry.flag == '!':
+        status['status'] = 'unpaid'
+        status['amount'] = cur(bill_txn.amount)
+    elif payment_txn is None:
+        status['status'] = 'pending'
+        status['amount'] = cur(bill_txn.amount)
+    else:
+        status['status'] = 'paid'
+        status['amount'] = cur(payment_txn.amount)
+    return status
+
+def check_bills(bills, ledger_data, month):
+    for bill in bills:
+        bill.update(bill_status(bill, ledger_data, month))
+    return bills
+
+def bill_bean(bill, month, currency, amount=None, bill_date=None, flag='!'):
+    bill_date = bill_date or datetime.strptime(f"{month}-{bill['due']}", "%Y-%m-%d").date()
+    amount = float(amount if amount is not None else bill['amount'])
+    new_bill = new_bean(
+        date=bill_date,
+        flag=flag,
+        payee=bill['payee'],
+        tags=['bill'],
+        links=[f"{bill['tag']}-{month}"],
+        postings=[])
+    new_bill.add_posting({"account": bill['account'], "amount": amount, "currency": currency})
+    new_bill.add_posting({"account": bill['liability'], "amount": -amount, "currency": currency})
+    return new_bill
+
+def batch_bills(bills, ledger_data, session, months, pay_bill, set_bill, output, currency):
+    """
+    Insert every missing bill and pay the selected unpaid ones across months
+
+    All edits are queued on the session and committed together, so each
+    ledger file is written once. Missing bills that are also being paid are
+    inserted already cleared. Returns the inserted and paid beans and the
+    entry text for stdout when there is no output file.
+    """
+    inserted, paid, buffer = [], [], ''
+    for month in months:
+        for bill in bills:
+            if set_bill and bill['tag'] != set_bill and bill['tag'] not in pay_bill: continue
+            status = bill_status(bill, ledger_data, month)
+            if status['status'] == 'missing':
+                new_bill = bill_bean(bill, month, currency, flag='*' if bill['tag'] in pay_bill else '!')
+                buffer += ledger_data.insert(new_bill, output, session)
+                inserted.append(new_bill)
+            elif status['status'] == 'unpaid' and bill['tag'] in pay_bill:
+                bill_txn = status['bill_txn']
+                bill_txn.update(flag='*')
+                if ledger_data.replace(bill_txn, session, checkpoint=False): paid.append(bill_txn)
+    ledger_data.commit(session)
+    return inserted, paid, buffer
+
+def bank_index(txns):
+    # Outgoing bank transactions by amount, each list sorted by date for window lookups
+    index = {}
+    for txn in txns:
+        if txn.amount >= 0: continue
+        index.setdefault(dec(txn.abs_amount), []).append((date.fromisoformat(txn.date), txn.id, txn))
+    for matches in index.values(): matches.sort(key=lambda m: m[:2])
+    return index
+
+def match_bills(bills, ledger_data, months, index, window):
+    """
+    Pair unpaid bills with bank payments of the same amount within window days of the bill date
+
+    Pairs are taken closest date first and every bank transaction pays at
+    most one bill. A pair is only kept when no other free bill or transaction
+    is as close, so payments that could be either of two bills are left for
+    a prompt. Returns (bill, bill_txn, bank transaction) for every match.
+    """
+    edges = []
+    unpaid = []
+    for month in months:
+        for bill in bills:
+            status = bill_status(bill, ledger_data, month)
+            if status['status'] != 'unpaid': continue
+            bill_txn = status['bill_txn']
+            bill_date = bill_txn.entry.date
+            matches = index.get(dec(bill_txn.amount), [])
+            start = bisect.bisect_left(matches, (bill_date - timedelta(days=window),))
+            end = bisect.bisect_left(matches, (bill_date + timedelta(days=window + 1),))
+            for txn_date, txn_id, txn in matches[start:end]:
+                edges.append((abs((txn_date - bill_date).days), len(unpaid), txn_date, txn_id, txn))
+            unpaid.append((bill, bill_txn))
+    edges.sort(key=lambda e: e[:4])
+    taken_bills, taken_txns, pairs = set(), set(), []
+    i = 0
+    while i < len(edges):
+        # Edges as close as each other are decided together so ties can be seen
+        j = i
+        while j < len(edges) and edges[j][0] == edges[i][0]: j += 1
+        group = [(bill_i, txn) for days, bill_i, txn_date, txn_id, txn in edges[i:j] if bill_i not in taken_bills and id(txn) not in taken_txns]
+        bill_degree, txn_degree = {}, {}
+        for bill_i, txn in group:
+            bill_degree[bill_i] = bill_degree.get(bill_i, 0) + 1
+            txn_degree[id(txn)] = txn_degree.get(id(txn), 0) + 1
+        for bill_i, txn in group:
+            if bill_degree[bill_i] == 1 and txn_degree[id(txn)] == 1:
+                pairs.append(unpaid[bill_i] + (txn,))
+            taken_bills.add(bill_i)
+            taken_txns.add(id(txn))
+        i = j
+    return pairs
+
+def month_range(start, end):
+    months = []
+    year, month = map(int, start.split('-'))
+    while f"{year:04d}-{month:02d}" <= end:
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+def bills_matrix(bills, ledger_data, months):
+    # One row per bill and month from the link index, the ledger is parsed once for the whole range
+    rows = []
+    for bill in bills:
+        for month in months:
+            status = bill_status(bill, ledger_data, month)
+            bill_txn, payment_txn = status['bill_txn'], status['payment_txn']
+            rows.append({
+                "tag": bill['tag'],
+                "month": month,
+                "status": status['status'],
+                "amount": status.get('amount', cur(bill['amount'])),
+                "due": str(bill_txn.entry.date) if bill_txn else f"{month}-{int(bill['due']):02d}",
+                "paid": str(payment_txn.entry.date) if payment_txn else None
+            })
+    return rows
+
+def print_matrix(rows, bills, months, spacing=20):
+    cells = {(row['tag'], row['month']): row for row in rows}
+    spacing = max(spacing, 5)
+    console.print(f"{' '*(spacing + 3)}" + ''.join(f"{month:>9}" for month in months))
+    for bill in bills:
+        line = f"{bill['tag']}{' '*(spacing - len(bill['tag']))} | "
+        for month in months:
+            row = cells[(bill['tag'], month)]
+            amount = '-' if row['status'] == 'missing' else cur(row['amount'])
+            line += f"[{STATUS_STYLES[row['status']]}]{amount:>9}[/]"
+        console.print(line)
+    totals = [sum(dec(cells[(b['tag'], month)]['amount']) for b in bills if cells[(b['tag'], month)]['status'] != 'missing') for month in months]
+    console.print(f"{'total':<{spacing}} | " + ''.join(f"[number]{cur(total):>9}[/]" for total in totals))
+    console.print(f"\n[pos]Paid[/] [warning]Pending[/] [error]Unpaid[/] [file]Missing[/]")
+
+def export_matrix(rows, export):
+    # CSV for spreadsheets, anything else is written as JSON
+    if export.suffix.lower() == '.csv':
+        with open(export, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()) if rows else [])
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        set_json(rows, export)
+    console.print(f"\nExported [number]{len(rows)}[/] bill months to [file]{export}[/]")
+
 def bean_bills(
     ledger: Annotated[Path, typer.Argument(
         help="The beancount ledger file to parse",
@@ -66,6 +234,9 @@ def bean_bills(
         "--month", "-m",
         help="Specify the billing month in the format YYYY-MM",
         callback=month_callback)]=date.today().strftime('%Y-%m'),
+    no_cache: Annotated[bool, typer.Option(
+        "--no-cache",
+        help="Parse the ledger without reading or updating the ledger cache or beancount's pickle cache")]=False,
     version: Annotated[bool, typer.Option(
         "--version", "-v",
         help="Show version info and exit",
@@ -86,9 +257,36 @@ def bean_bills(
     set_bill: Annotated[str, typer.Option(
         "--set-bill", "-b",
         help="Set a specific bill")]='',
-    pay_bill: Annotated[str, typer.Option(
+    pay_bill: Annotated[List[str], typer.Option(
         "--pay-bill", "-p",
-        help="Pay a specific bill")]='',
+        help="Pay a specific bill, can be repeated")]=None,
+    ofx: Annotated[List[Path], typer.Option(
+        "--ofx",
+        help="Pay unpaid bills matched by amount and date in these ofx files, can be repeated and accepts glob patterns",
+        exists=False)]=None,
+    simplefin: Annotated[Path, typer.Option(
+        "--simplefin", "-s",
+        help="Pay unpaid bills matched by amount and date in this simplefin file or store directory",
+        exists=True, file_okay=True, dir_okay=True, readable=True, resolve_path=True)]=None,
+    window: Annotated[int, typer.Option(
+        "--window", "-w",
+        help="Days before or after a bill's date a bank payment can be matched",
+        min=0)]=7,
+    batch: Annotated[bool, typer.Option(
+        "--batch",
+        help="Insert missing bills and pay the --pay-bill bills for --month, or every month from --from to --to, without prompting")]=False,
+    from_month: Annotated[str, typer.Option(
+        "--from", "-f",
+        help="Show a bills dashboard starting from this month in the format YYYY-MM",
+        callback=month_callback)]='',
+    to_month: Annotated[str, typer.Option(
+        "--to", "-t",
+        help="Show a bills dashboard up to and including this month in the format YYYY-MM, defaults to --month",
+        callback=month_callback)]='',
+    export: Annotated[Path, typer.Option(
+        "--export", "-x",
+        help="Export the bills dashboard to a .csv or .json file",
+        show_default=False, exists=False)]=None,
 ):
     """
     Review and keep track of bill payments in a beancount ledger
@@ -97,7 +295,9 @@ def bean_bills(
     # Load ledger
     if ledger is None:
         raise typer.BadParameter("Ledger file is required")
-    ledger_data = ledger_load(ledger)
+    # Runs without prompts resume an interrupted session instead of asking
+    session = edit_session(ledger, checkpoint=None, resume=True if batch or ofx or simplefin else None)
+    ledger_data = ledger_load(ledger, use_cache=not no_cache)
     account_completer = FuzzyCompleter(WordCompleter(ledger_data.accounts, sentence=True))
     payees_completer = FuzzyCompleter(WordCompleter(ledger_data.payees, sentence=True))
     currency = ledger_data.currency if operating_currency else default_currency
@@ -129,30 +329,61 @@ def bean_bills(
             console.print(print_bill(bill, spacing))
         raise typer.Exit()
 
+    pay_bill = pay_bill or []
+    for tag in pay_bill + ([set_bill] if set_bill else []):
+        if not any(b['tag'] == tag for b in bills):
+            err_console.print(f"\n[error]No bill with the name [string]'{tag}'[/] exists[/]\n")
+            raise typer.Exit()
+
+    # Insert and pay every bill in the months without prompting, then exit
+    if batch:
+        months = month_range(from_month or month, to_month or month)
+        inserted, paid, buffer = batch_bills(bills, ledger_data, session, months, pay_bill, set_bill, output, currency)
+        if buffer: console.print(buffer)
+        console.print(f"\nInserted [number]{len(inserted)}[/] and paid [number]{len(paid)}[/] bills from [date]{months[0] if months else month}[/] to [date]{months[-1] if months else month}[/]")
+        raise typer.Exit()
+
+    # Pay every unpaid bill with a matching bank payment, then exit
+    if ofx or simplefin:
+        months = month_range(from_month or month, to_month or month)
+        ofx_files = ofx_paths(ofx) if ofx else []
+        missing = [ofx_file for ofx_file in ofx_files if not os.path.isfile(ofx_file)]
+        if (ofx and not ofx_files) or missing:
+            err_console.print(f"\n[error]OFX file not found: {', '.join(missing) or ', '.join(str(o) for o in ofx)}[/]\n")
+            raise typer.Exit()
+        bank_accounts = ofx_files_load(ofx_files) if ofx_files else []
+        if simplefin: bank_accounts += simplefin_accounts(simplefin)
+        txns = [txn for account in bank_accounts for txn in account.transactions]
+        pairs = match_bills(bills, ledger_data, months, bank_index(txns), window)
+        console.print(f"\nMatched [number]{len(pairs)}[/] unpaid bills against [number]{len(txns)}[/] bank transactions\n")
+        paid = 0
+        for bill, bill_txn, txn in pairs:
+            bill_txn.update(flag='*')
+            if not ledger_data.replace(bill_txn, session, checkpoint=False): continue
+            console.print(f"Paid {bill_txn.print_head(theme=True)} with {txn.print(theme=True)}")
+            paid += 1
+        ledger_data.commit(session)
+        console.print(f"\nPaid [number]{paid}[/] bills from [date]{months[0] if months else month}[/] to [date]{months[-1] if months else month}[/]")
+        raise typer.Exit()
+
+    # Show every bill and month in the range, then exit
+    if from_month or to_month:
+        months = month_range(from_month or month, to_month or month)
+        if not months:
+            err_console.print(f"\n[error]--from [date]{from_month}[/] is after --to [date]{to_month or month}[/][/]\n")
+            raise typer.Exit()
+        rows = bills_matrix(bills, ledger_data, months)
+        console.print(f"\n[warning]Bills from [date]{months[0]}[/] to [date]{months[-1]}[/]:[/]\n")
+        print_matrix(rows, bills, months, spacing)
+        if export: export_matrix(rows, export)
+        raise typer.Exit()
+
     # Check for unpaid, pending and missing bills
     buffer = []
     console.print(f"\n[warning]Checking bills:[/]\n")
 
-    for i, bill in enumerate(bills):
-        linked = []
-        for txn in ledger_data.transactions:
-            if f"{bill['tag']}-{month}" in txn.entry.links:
-                linked.append(txn)
-        bill_txn = next((txn for txn in linked if 'bill' in txn.entry.tags), None)
-        payment_txn = next((txn for txn in linked if 'payment' in txn.entry.tags), None)
-        bills[i]['bill_txn'] = bill_txn
-        bills[i]['payment_txn'] = payment_txn
-        if bill_txn is None: bills[i]['status'] = 'missing'
-        elif bill_txn.entry.flag == '!':
-            bills[i]['status'] = 'unpaid'
-            bills[i]['amount'] = cur(bill_txn.amount)
-        elif payment_txn is None:
-            bills[i]['status'] = 'pending'
-            bills[i]['amount'] = cur(bill_txn.amount)
-        else:
-            bills[i]['status'] = 'paid'
-            bills[i]['amount'] = cur(payment_txn.amount)
-        console.print(print_bill(bills[i], spacing))
+    for bill in check_bills(bills, ledger_data, month):
+        console.print(print_bill(bill, spacing))
 
     if not pay_bill:
         # Add missing bills
@@ -161,9 +392,6 @@ def bean_bills(
         if set_bill and (not len(missing) or not any(b['tag'] == set_bill for b in missing)):
             console.print(f"\nBill [string]'{set_bill}'[/] is not missing in [date]{month}[/]\n")
             raise typer.Exit()
-        if set_bill and not any(b['tag'] == set_bill for b in bills):
-            err_console.print(f"\n[error]No bill with the name [string]'{set_bill}'[/] exists[/]\n")
-            raise typer.Exit()
         if len(missing):
             missing_prompt = 'y'
             if not set_bill:
@@ -187,15 +415,7 @@ def bean_bills(
                     else:
                         console.print(f"\n[answer]Inserting bill [string]\'{bill['tag']}\'[/][/]")
                     bill_date = datetime.strptime(f"{month}-{bill['due']}", "%Y-%m-%d").date()
-                    new_bill = new_bean(
-                        date=bill_date,
-                        flag='!',
-                        payee=bill['payee'],
-                        tags=['bill'],
-                        links=[f"{bill['tag']}-{bill_date.strftime('%Y-%m')}"],
-                        postings=[])
-                    new_bill.add_posting({"account": bill['account'], "amount": float(bill['amount']), "currency": currency})
-                    new_bill.add_posting({"account": bill['liability'], "amount": -float(bill['amount']), "currency": currency})
+                    new_bill = bill_bean(bill, month, currency, bill_date=bill_date)
                     console.print(f"\n{new_bill}")
                     bill_amount = prompt(
                         f"...Update bill amount? > ",
@@ -205,9 +425,7 @@ def bean_bills(
                         default=bill['amount'])
                     if bill_amount is None:
                         continue
-                    new_bill.update(postings=[])
-                    new_bill.add_posting({"account": bill['account'], "amount": float(bill_amount), "currency": currency})
-                    new_bill.add_posting({"account": bill['liability'], "amount": -float(bill_amount), "currency": currency})
+                    new_bill = bill_bean(bill, month, currency, amount=bill_amount, bill_date=bill_date)
                     new_bill_date = prompt(
                         f"...Update bill date? > ",
                         key_bindings=cancel_bindings,
@@ -219,9 +437,9 @@ def bean_bills(
                     new_bill.update(date=new_bill_date)
                     console.print(f"\n{new_bill}")
                     buffer.append(new_bill)
-                    if output:
-                        append_lines(output, new_bill.print())
+                    ledger_data.insert(new_bill, output, session)
 
+                ledger_data.commit(session)
                 if len(buffer): console.print(f"\n[pos]Bills inserted {'-'*64}[/]\n")
                 for bill in buffer:
                     console.print(bill)
@@ -234,12 +452,10 @@ def bean_bills(
         if not len(unpaid):
             console.print(f"\nNo bills to pay for in [date]{month}[/] or bills are missing\n")
             raise typer.Exit()
-        if not any(b['tag'] == pay_bill for b in bills):
-            console.print(f"\n[string]'{pay_bill}'[/] is not a valid bill\n")
-            raise typer.Exit()
-        if not any(b['tag'] == pay_bill for b in unpaid):
-            console.print(f"\n[string]'{pay_bill}'[/] is either missing or paid for\n")
-            raise typer.Exit()
+        for tag in pay_bill:
+            if not any(b['tag'] == tag for b in unpaid):
+                console.print(f"\n[string]'{tag}'[/] is either missing or paid for\n")
+                raise typer.Exit()
     if len(unpaid):
         unpaid_prompt = 'y'
         if not pay_bill:
@@ -250,7 +466,7 @@ def bean_bills(
                 validator=ValidOptions(['y', 'n'])).lower()
         if unpaid_prompt == 'y':
             for bill in unpaid:
-                if pay_bill and bill['tag'] != pay_bill:
+                if pay_bill and bill['tag'] not in pay_bill:
                     continue
                 elif not pay_bill:
                     pay_prompt = prompt(
@@ -261,7 +477,7 @@ def bean_bills(
                     if pay_prompt == 'n':
                         continue
                 else:
-                    console.print(f"\n[answer]Paying for bill [string]'{pay_bill}'[/][/]\n")
+                    console.print(f"\n[answer]Paying for bill [string]'{bill['tag']}'[/][/]\n")
                 new_bill_txn = bill['bill_txn']
                 new_bill_amount = prompt(
                     f"...Payment amount? > ",
@@ -272,15 +488,17 @@ def bean_bills(
                 if new_bill_amount is None:
                     continue
                 new_bill_txn.update(flag='*')
-                if not new_bill_txn.replace():
+                if not ledger_data.replace(new_bill_txn, session):
                     continue
                 if dec(bill['amount']) != dec(new_bill_amount):
                     pad = f"\n; {new_bill_txn.entry.date} pad {bill['liability']} {bill['account']}\n"
                     pad += f"; {new_bill_txn.entry.date + timedelta(days=1)} balance {bill['liability']} 0.00 {currency}"
-                    insert_lines(new_bill_txn.entry.meta['filename'], pad, new_bill_txn.entry.meta['lineno']+3)
+                    bill_file, bill_lineno = new_bill_txn.entry.meta['filename'], new_bill_txn.entry.meta['lineno']
+                    session.insert(bill_file, pad, bill_lineno + session.entry_count(bill_file, bill_lineno))
                 console.print(f"\n{new_bill_txn}")
                 buffer.append(new_bill_txn.print_head())
 
+            ledger_data.commit(session)
             console.print(f"[pos]Bills updated {'-'*64}[/]\n")
             for bill in buffer:
                 console.print(bill)
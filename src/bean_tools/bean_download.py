@@ -1,17 +1,30 @@
-import typer, os, base64, requests, json
-from .prompts import confirm_toolbar, ValidOptions, date_callback, version_callback, console, err_console
-from .helpers import get_timestamp
+import typer, os, base64, requests, json, time, email.utils
+from .prompts import confirm_toolbar, cancel_bindings, ValidOptions, date_callback, version_callback, console, err_console
+from .helpers import get_timestamp, get_json, set_json
+from .fileio import atomic_write
+from .simplefin import STORE_INDEX, store_index, store_write, store_append, store_transactions
 from typing_extensions import Annotated
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import dotenv_values
 from prompt_toolkit import prompt
-from datetime import datetime
+from datetime import datetime, timedelta
+from requests.adapters import HTTPAdapter
+
+DAY = 24 * 60 * 60
+RETRY_STATUS = (429, 500, 502, 503, 504)
+FORMATS = ('json', 'ndjson', 'ndjson.gz')
 
 def aggregator_callback(aggregator_str: str):
     if aggregator_str != 'simplefin':
         raise typer.BadParameter("Invalid aggregator, currently supported aggregators are 'simplefin'.")
     return aggregator_str
 
+def format_callback(format_str: str):
+    if format_str not in FORMATS:
+        raise typer.BadParameter(f"Invalid format, supported formats are {', '.join(FORMATS)}.")
+    return format_str
+
 def get_access_url():
     """
     Retreive access url from a SimpleFIN setup token
@@ -35,7 +48,7 @@ def get_access_url():
     if setup_token:
         decoded_token = base64.b64decode(setup_token, validate=True)
         claim_url = decoded_token.decode('utf-8')
-        response = requests.posts(claim_url)
+        response = requests.post(claim_url)
         access_url = response.text
         console.print(f"Access url: [string]{access_url}[/]")
         save_env = prompt(
@@ -50,12 +63,200 @@ def get_access_url():
             console.print(f"Saved access url to [file].env[/]")
     return access_url
 
+def date_windows(start, end, days):
+    # Splits [start, end) epoch seconds into windows of at most days each
+    if not start or not days: return [(start, end)]
+    windows = []
+    while start < end:
+        windows.append((start, min(start + days * DAY, end)))
+        start += days * DAY
+    return windows
+
+def window_date(timestamp, default):
+    return (datetime(1970, 1, 1) + timedelta(seconds=timestamp)).strftime('%Y-%m-%d') if timestamp else default
+
+def retry_after(value, default):
+    # Retry-After is either a number of seconds or an HTTP date
+    if value is None: return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+def fetch_window(session, url, start, end, pending, retries, backoff):
+    """
+    Fetch one date window, retrying connection errors and 429/5xx responses
+
+    Returns the decoded response, or raises the last error once retries run out.
+    """
+    params = {}
+    if start: params['start-date'] = start
+    if end: params['end-date'] = end
+    if pending: params['pending'] = 1
+    for attempt in range(retries + 1):
+        try:
+            response = session.get(url, params=params, timeout=60)
+            if response.status_code not in RETRY_STATUS:
+                response.raise_for_status()
+                return response.json()
+            error = requests.HTTPError(f"{response.status_code} {response.reason}", response=response)
+            delay = retry_after(response.headers.get('Retry-After'), backoff * 2 ** attempt)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
+            delay = backoff * 2 ** attempt
+        if attempt < retries: time.sleep(delay)
+    raise error
+
+def merge_windows(results):
+    # Later windows carry the newest balances, transactions are deduplicated by id
+    data = {"errors": [], "accounts": []}
+    accounts = {}
+    for result in results:
+        for error in result.get('errors', []):
+            if error not in data['errors']: data['errors'].append(error)
+        for account in result.get('accounts', []):
+            merged = accounts.get(account['id'])
+            if merged is None:
+                merged = accounts[account['id']] = dict(account, transactions=[])
+                data['accounts'].append(merged)
+                merged['seen'] = set()
+            else:
+                merged.update({k: v for k, v in account.items() if k != 'transactions'})
+            for txn in account.get('transactions', []):
+                if txn['id'] in merged['seen']: continue
+                merged['seen'].add(txn['id'])
+                merged['transactions'].append(txn)
+    for account in data['accounts']:
+        del account['seen']
+        account['transactions'].sort(key=lambda t: t['posted'])
+    return data
+
+def simplefin_fetch(access_url, start=None, end=None, pending=False, window_days=60, workers=4, retries=3, backoff=1.0):
+    """
+    Download accounts from SimpleFIN in date windows over one pooled session
+
+    Returns the merged data and a list of (start, end, error) for windows that
+    failed after retries, so partial downloads can still be saved.
+    """
+    scheme, rest = access_url.split('//', 1)
+    auth, rest = rest.split('@', 1)
+    url = f"{scheme}//{rest}/accounts"
+    if start and not end: end = int(time.time()) + DAY
+    windows = date_windows(start, end, window_days)
+    workers = max(1, min(workers, len(windows)))
+    with requests.Session() as session:
+        session.auth = tuple(auth.split(':', 1))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        def fetch(window):
+            try:
+                return fetch_window(session, url, window[0], window[1], pending, retries, backoff), None
+            except (requests.RequestException, ValueError) as e:
+                return None, str(e)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(fetch, windows))
+    failed = [(window[0], window[1], error) for window, (result, error) in zip(windows, results) if error is not None]
+    return merge_windows([result for result, error in results if result is not None]), failed
+
+def sync_cursors(output, overlap):
+    # Rebuilds cursors from an existing output so a first sync does not refetch everything
+    if os.path.isdir(output):
+        index = store_index(output) or {"accounts": []}
+        accounts = [(entry['id'], store_transactions(output, entry)) for entry in index['accounts']]
+    elif os.path.exists(output):
+        accounts = [(account['id'], account['transactions']) for account in (get_json(output, overwrite_invalid=False) or {"accounts": []})['accounts']]
+    else: accounts = []
+    cursors = {}
+    for account_id, transactions in accounts:
+        posted = {t['id']: t['posted'] for t in transactions}
+        last = max(posted.values(), default=0)
+        cursors[account_id] = {"posted": last, "ids": {id: p for id, p in posted.items() if p >= last - overlap * DAY}}
+    return cursors
+
+def sync_merge(data, cursors, overlap, stored=None):
+    """
+    Pick the new transactions out of a downloaded delta and advance the per-account cursors
+
+    A cursor holds the last posted timestamp and the ids seen in the overlap
+    before it. Downloaded transactions older than the overlap or already seen
+    are skipped. stored optionally maps account ids to transactions already in
+    the store, which may be ahead of the cursor if a previous run stopped
+    between writes. Returns (account, new transactions) for every account.
+    """
+    merged = []
+    for account in data['accounts']:
+        cursor = cursors.setdefault(account['id'], {"posted": 0, "ids": {}})
+        floor = cursor['posted'] - overlap * DAY
+        seen = set(cursor['ids'])
+        if stored and account['id'] in stored:
+            seen.update(t['id'] for t in stored[account['id']] if t['posted'] >= floor)
+        added = []
+        for txn in account['transactions']:
+            if txn['posted'] < floor or txn['id'] in seen: continue
+            seen.add(txn['id'])
+            added.append(txn)
+        merged.append((account, added))
+        if not added: continue
+        posted = max(cursor['posted'], max(t['posted'] for t in added))
+        ids = dict(cursor['ids'], **{t['id']: t['posted'] for t in added})
+        cursors[account['id']] = {"posted": posted, "ids": {id: p for id, p in ids.items() if p >= posted - overlap * DAY}}
+    return merged
+
+def sync_json(output, data, cursors, overlap):
+    # Single JSON files are rewritten whole with the new transactions merged in
+    store = {"errors": [], "accounts": []}
+    if os.path.exists(output):
+        store = get_json(output, default=store, overwrite_invalid=False)
+        if store is None:
+            err_console.print(f"[error]Could not read [file]{output}[/]. Exiting[/]")
+            raise typer.Exit(code=1)
+    accounts = {account['id']: account for account in store['accounts']}
+    merged = sync_merge(data, cursors, overlap, {id: account['transactions'] for id, account in accounts.items()})
+    for account, added in merged:
+        if account['id'] not in accounts:
+            store['accounts'].append(dict(account, transactions=added))
+            continue
+        stored = accounts[account['id']]
+        stored.update({k: v for k, v in account.items() if k != 'transactions'})
+        if added:
+            stored['transactions'].extend(added)
+            stored['transactions'].sort(key=lambda t: t['posted'])
+    store['errors'] = data['errors']
+    set_json(store, output)
+    return sum(len(added) for account, added in merged)
+
+def sync_store(output, data, cursors, overlap, compress):
+    # Store directories only append the new transactions to each partition, then rewrite the small index
+    index = store_index(output)
+    if index is None:
+        err_console.print(f"[error]Could not read the store index in [file]{output}[/]. Exiting[/]")
+        raise typer.Exit(code=1)
+    merged = sync_merge(data, cursors, overlap)
+    for account, added in merged:
+        store_append(output, index, account, added, compress)
+    index['errors'] = data['errors']
+    os.makedirs(output, exist_ok=True)
+    set_json(index, os.path.join(output, STORE_INDEX))
+    return sum(len(added) for account, added in merged)
+
 def bean_download(
     aggregator: Annotated[str, typer.Argument(help="Specify the aggregator to use", callback=aggregator_callback)]="simplefin",
-    output: Annotated[Path, typer.Option("--output", "-o", help="The output file to use for the downloaded transactions", exists=False)]="data.json",
+    output: Annotated[Path, typer.Option("--output", "-o", help="The output file, or store directory for ndjson formats, to use for the downloaded transactions", exists=False)]="data.json",
+    output_format: Annotated[str, typer.Option("--format", "-f", help="Save a single json file, or a store directory with one ndjson file per account and an index, optionally gzipped", callback=format_callback)]="json",
     start_date: Annotated[str, typer.Option("--start-date", "-s", help="Retreive transactions on or after this date in the format YYYY-MM-DD", callback=date_callback)]="",
     end_date: Annotated[str, typer.Option("--end-date", "-e", help="Retreive transactions before (but not including) this date in the format YYYY-MM-DD", callback=date_callback)]="",
     pending: Annotated[bool, typer.Option("--pending", "-p", help="Include pending transactions")]=False,
+    window_days: Annotated[int, typer.Option("--window-days", "-w", help="Split the date range into requests of at most this many days, 0 downloads it in one request", min=0)]=60,
+    workers: Annotated[int, typer.Option("--workers", "-j", help="Maximum number of date windows to download at once", min=1)]=4,
+    sync: Annotated[bool, typer.Option("--sync", help="Download only transactions newer than the last sync and merge them into the output file")]=False,
+    state: Annotated[Path, typer.Option("--state", help="The file that keeps per-account sync cursors", exists=False)]="sync_state.json",
+    overlap: Annotated[int, typer.Option("--overlap", help="Days before each sync cursor to download again for late posting transactions", min=0)]=7,
+    retries: Annotated[int, typer.Option("--retries", "-r", help="Retry failed or rate limited requests this many times with exponential backoff", min=0)]=3,
     version: Annotated[bool, typer.Option("--version", "-v", help="Show version info and exit", callback=version_callback, is_eager=True)]=False
 ):
     """
@@ -71,27 +272,49 @@ def bean_download(
             if not 'ACCESS_URL' in env_vars:
                 access_url = get_access_url()
             else: access_url = env_vars['ACCESS_URL']
-            if not access_url:
-                err_console.print(f"[error]Could not get a valid access url. Exiting[/]")
-                raise typer.Exit()
-            scheme, rest = access_url.split('//', 1)
-            auth, rest = rest.split('@', 1)
-            parameters = []
-            parameters_str = ''
-            if start_date: parameters.append(f"start-date={get_timestamp(start_date)}")
-            if end_date: parameters.append(f"end-date={get_timestamp(end_date)}")
-            if pending: parameters.append(f"pending=1")
-            if len(parameters): parameters_str = f"?{'&'.join(parameters)}"
-            url = f"{scheme}//{rest}/accounts{parameters_str}"
-            username, password = auth.split(':', 1)
-            response = requests.get(url, auth=(username, password))
-            data = response.json()
-            with open(output, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=4)
-            if data['errors'] and len(data['errors']):
-                console.print(f"SimpleFIN error messages:\n")
-                err_count = 1
-                for err in data['errors']:
-                    console.print(f"  {err_count}) [warning]{err}[/]")
-                    err_count += 1
-            console.print(f"\nSaved SimpleFIN data to [file]{output}[/]")
+        if not access_url:
+            err_console.print(f"[error]Could not get a valid access url. Exiting[/]")
+            raise typer.Exit()
+        if output_format != 'json' and output == Path('data.json'): output = Path('data')
+        store = output_format != 'json' or os.path.isdir(output)
+        start = get_timestamp(start_date) if start_date else None
+        end = get_timestamp(end_date) if end_date else None
+        if sync:
+            cursors = get_json(state, default={}, overwrite_invalid=False) if os.path.exists(state) else sync_cursors(output, overlap)
+            if cursors is None:
+                err_console.print(f"[error]Could not read sync state [file]{state}[/]. Exiting[/]")
+                raise typer.Exit(code=1)
+            if cursors:
+                start = max(min(cursor['posted'] for cursor in cursors.values()) - overlap * DAY, start or 0)
+        started = time.perf_counter()
+        data, failed = simplefin_fetch(access_url, start, end, pending, window_days, workers, retries)
+        if failed and (sync or not data['accounts']):
+            # A partial delta would leave gaps behind the cursors, so syncs are all or nothing
+            for window_start, window_end, error in failed:
+                err_console.print(f"  [date]{window_date(window_start, 'start')}[/] to [date]{window_date(window_end, 'now')}[/]: [error]{error}[/]")
+            err_console.print(f"[error]Download failed. Exiting[/]")
+            raise typer.Exit(code=1)
+        if data['errors'] and len(data['errors']):
+            console.print(f"SimpleFIN error messages:\n")
+            err_count = 1
+            for err in data['errors']:
+                console.print(f"  {err_count}) [warning]{err}[/]")
+                err_count += 1
+        transaction_count = sum(len(acct['transactions']) for acct in data['accounts'])
+        console.print(f"\nDownloaded [number]{transaction_count}[/] transactions from [number]{len(data['accounts'])}[/] accounts in [number]{time.perf_counter() - started:.2f}[/]s")
+        if sync:
+            if store: added = sync_store(output, data, cursors, overlap, output_format == 'ndjson.gz')
+            else: added = sync_json(output, data, cursors, overlap)
+            set_json(cursors, state)
+            console.print(f"Synced [number]{added}[/] new transactions into [file]{output}[/]")
+            return
+        if store:
+            store_write(output, data, output_format == 'ndjson.gz')
+        else:
+            atomic_write(output, [json.dumps(data, indent=4)])
+        console.print(f"Saved SimpleFIN data to [file]{output}[/]")
+        if failed:
+            err_console.print(f"[warning]Failed to download [number]{len(failed)}[/] date windows, the saved data is incomplete:[/]")
+            for window_start, window_end, error in failed:
+                err_console.print(f"  [date]{window_date(window_start, 'start')}[/] to [date]{window_date(window_end, 'now')}[/]: [error]{error}[/]")
+            raise typer.Exit(code=1)
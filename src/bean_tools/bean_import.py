@@ -1,20 +1,21 @@
 import typer
 from .helpers import (
-    get_key,
-    set_key,
-    get_json_values,
     replace_lines,
+    get_json,
     cur,
-    append_lines,
     dec,
     eval_string_dec,
     eval_string_float,
     get_pending,
-    get_matches
+    get_matches,
+    reconcile_pairs
 )
 from .ledger import ledger_load, ledger_bean
-from .ofx import ofx_load
-from .simplefin import simplefin_load
+from .edits import edit_session
+from .payees import PayeeStore, payee_rules_load
+from .rules import import_rules_load
+from .ofx import ofx_paths, ofx_files_load
+from .simplefin import simplefin_load, simplefin_accounts, simplefin_write
 from .prompts import (
     console,
     err_console,
@@ -37,9 +38,12 @@ from .prompts import (
     version_callback
 )
 from . import __version__
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+import os, time
 from prompt_toolkit import prompt, HTML
 from prompt_toolkit.completion import FuzzyCompleter, WordCompleter
+from typing import List
 from typing_extensions import Annotated
 
 def get_posting(type, default_amount, default_currency, op_cur, completer, color, default_account=''):
@@ -73,123 +77,97 @@ def get_posting(type, default_amount, default_currency, op_cur, completer, color
     if not currency: return None
     return {"account": account, "amount": amount, "currency": currency}
 
-def bean_import(
-    ledger: Annotated[Path, typer.Argument(
-        help="The beancount ledger file to base the parser from",
-        exists=True, file_okay=True, dir_okay=False, readable=True, resolve_path=True)],
-    ofx: Annotated[Path, typer.Option(
-        "--ofx", "-x",
-        help="The ofx file to parse",
-        exists=True, file_okay=True, dir_okay=False, readable=True, resolve_path=True)]=None,
-    simplefin: Annotated[Path, typer.Option(
-        "--simplefin", "-s",
-        help="The simplefin file to parse",
-        exists=True, file_okay=True, dir_okay=False, readable=True, resolve_path=True)]=None,
-    output: Annotated[Path, typer.Option(
-        "--output", "-o",
-        help="The output file to write to instead of stdout",
-        show_default=False, exists=False)]=None,
-    period: Annotated[str, typer.Option(
-        "--period", "-d",
-        help="Specify a year, month or day period to parse transactions from in the format YYYY, YYYY-MM or YYYY-MM-DD",
-        callback=period_callback)]="",
-    account: Annotated[str, typer.Option(
-        "--account", "-a",
-        help="Specify the account transactions belong to",
-        callback=account_callback)]="",
-    payees: Annotated[Path, typer.Option(
-        "--payees", "-p",
-        help="The payee file to use for name substitutions",
-        exists=False)]="payees.json",
-    operating_currency: Annotated[bool, typer.Option(
-        "--operating-currency", "-c",
-        help="Skip the currency prompt when inserting and use the ledger's operating_currency")]=False,
-    flag: Annotated[str, typer.Option(
-        "--flag", "-f",
-        help="Specify the default flag to set for transactions",
-        callback=flag_callback)]="*",
-    version: Annotated[bool, typer.Option(
-        "--version", "-v",
-        help="Show version info and exit",
-        callback=version_callback, is_eager=True)]=False,
-):
-    """
-    Parse transactions for review and editing for a beancount LEDGER and output transaction entries to stdout
+class ImportContext:
     """
+    State shared by every account imported in one run
 
-    console_output = f"LEDGER File: [file]{ledger}[/]\nPAYEES File: [file]{payees}[/]"
-    buffer = ''
-
-    if ofx: console_output += f"\nOFX File: [file]{ofx}[/]"
-    if simplefin: console_output += f"\nSimpleFIN File: [file]{simplefin}[/]"
-    if output: console_output +=  f"\nOUTPUT File: [file]{output}[/]"
-    console.print(f"{console_output}")
-
-    txn_data = None
-
-    # Parse file into txn_data
-    if ofx:
-        txn_data = ofx_load(ofx)
-    if simplefin:
-        txn_data = simplefin_load(simplefin)
-
-    if txn_data and len(txn_data.transactions):
-        console.print(f"Parsed [number]{len(txn_data.transactions)}[/] transactions")
-    else:
-        err_console.print(f"[error]No transactions found. Please provide a valid file to parse.[/]")
-        raise typer.Exit()
-
-    # Parse ledger file into ledger_data
-    ledger_data = ledger_load(ledger)
-    if ledger_data and len(ledger_data.transactions):
-        console.print(f"Parsed [number]{len(ledger_data.transactions)}[/] beans from LEDGER file")
-        console.print(f"Default currency: [answer]{ledger_data.currency}[/]")
-    else:
-        err_console.print(f"[error]No transaction entries found in LEDGER file. Exiting.[/]")
-        raise typer.Exit()
-    account_completer = FuzzyCompleter(WordCompleter(ledger_data.accounts, sentence=True))
-    tags_completer = FuzzyCompleter(WordCompleter(ledger_data.tags))
-    links_completer = FuzzyCompleter(WordCompleter(ledger_data.links))
-
-    # Filter transactions by dates specified from cli
-    if period:
-        filtered = [t for t in txn_data.transactions if t.date.startswith(period)]
-        if len(filtered):
-            console.print(f"Found [number]{len(filtered)}[/] transactions within period [date]{period}[/]")
-        else:
-            err_console.print(f"[error]No transactions found within the specified period [date]{period}[/]. Exiting.[/]")
-            raise typer.Exit()
-    else:
-        filtered = txn_data.transactions
-
-    # Check if account specified, else prompt
-    if not account:
-        account = prompt(
-            f"Beancount account transactions belong to > ",
-            validator=valid_account,
-            completer=account_completer)
-    console.print(f"Transaction account: [answer]{account}[/]")
-
-    # Match transactions not in beans into pending
-    pending = []
-    pending = get_pending(filtered, ledger_data.transactions, account)
-    if len(pending):
-        console.print(f"Found [number]{len(pending)}[/] transactions not in LEDGER")
-    else:
-        console.print(f"[warning]No pending transactions found. Exiting.[/]")
-
-    # Parse each pending transaction
-    reconcile_count = 0
-    insert_count = 0
-    pending = sorted(pending, key=lambda x: x.date)
+    The ledger, its indexes and completers are loaded once and reloaded only
+    when the ledger changes on disk outside of the edit session.
+    """
+    def __init__(self, ledger, ledger_data, session, payee_store, import_rules, output, flag, operating_currency, window, no_cache):
+        self.ledger = ledger
+        self.ledger_data = ledger_data
+        self.session = session
+        self.payee_store = payee_store
+        self.import_rules = import_rules
+        self.output = output
+        self.flag = flag
+        self.operating_currency = operating_currency
+        self.window = window
+        self.no_cache = no_cache
+        self.buffer = ''
+        self.reconcile_count = 0
+        self.insert_count = 0
+        self.completers()
+
+    def completers(self):
+        self.account_completer = FuzzyCompleter(WordCompleter(self.ledger_data.accounts, sentence=True))
+        self.tags_completer = FuzzyCompleter(WordCompleter(self.ledger_data.tags))
+        self.links_completer = FuzzyCompleter(WordCompleter(self.ledger_data.links))
+
+    def commit(self):
+        # Edits to files whose content changed were not written, so they do not count
+        self.ledger_data.commit(self.session)
+        dropped_edits, dropped_appends = self.session.take_dropped()
+        self.reconcile_count -= dropped_edits
+        self.insert_count -= dropped_appends
+
+    def reload(self):
+        if not self.ledger_data.is_stale(): return True
+        console.print(f"...[warning]LEDGER changed on disk, reloading[/]")
+        self.commit()
+        ledger_data = ledger_load(self.ledger, use_cache=not self.no_cache)
+        if ledger_data is None: return False
+        self.ledger_data = ledger_data
+        self.completers()
+        return True
+
+def match_account(txns_list, ledger_data, account, window, reconcile):
+    # Only reads the ledger indexes, so accounts can be matched concurrently. Bank accounts
+    # imported into the same beancount account share its postings and are paired together
+    pendings = [sorted(get_pending(txns, ledger_data, account), key=lambda x: x.date) for txns in txns_list]
+    pairs = reconcile_pairs([txn for pending in pendings for txn in pending], ledger_data, account, window) if reconcile else []
+    return pendings, pairs
+
+def auto_reconcile(pairs, ledger_data, session):
+    # Every confident pairing is written in one batch before any prompt
+    reconciled = {}
+    for txn, bean, post in pairs:
+        post.meta.update({'rec': txn.id})
+        reconciled.setdefault(bean, []).append((txn.id, post))
+    done = set()
+    for bean, recs in reconciled.items():
+        if ledger_data.replace(bean, session, checkpoint=False):
+            done.update(rec for rec, post in recs)
+            continue
+        # The file was not changed, so neither is the bean
+        for rec, post in recs: del post.meta['rec']
+    ledger_data.commit(session)
+    return done
+
+def auto_insert(ctx, pending, account):
+    # Inserts transactions without ledger matches using the first matching rule
+    leftovers = []
+    for txn in pending:
+        if not get_matches(txn, ctx.ledger_data, account, ctx.window):
+            payee = ctx.payee_store.resolve(txn.payee)
+            rule = ctx.import_rules.match(txn, account, payee)
+            if rule is not None:
+                new_bean = rule.bean(txn, account, payee, ctx.flag, ctx.ledger_data.currency)
+                ctx.buffer += ctx.ledger_data.insert(new_bean, ctx.output, ctx.session)
+                ctx.insert_count += 1
+                continue
+        leftovers.append(txn)
+    return leftovers
+
+def import_transactions(ctx, txn_data, account, pending):
+    # Prompts for each pending transaction, returns False if the user quit
     for txn_count, txn in enumerate(pending):
         console.print(f"Parsing {txn_count+1}/{len(pending)}: {txn.print(theme=True)}")
 
-        # Update ledger data for every transaction
-        ledger_data = ledger_load(ledger)
-        account_completer = FuzzyCompleter(WordCompleter(ledger_data.accounts, sentence=True))
-        tags_completer = FuzzyCompleter(WordCompleter(ledger_data.tags))
-        links_completer = FuzzyCompleter(WordCompleter(ledger_data.links))
+        # Reload ledger data only if it was edited outside of this session
+        if not ctx.reload():
+            raise typer.Exit()
 
         # Reconcile, Insert, Skip?
         resolve = prompt(
@@ -201,7 +179,7 @@ def bean_import(
         if resolve[0] == "r":
             console.print(f"...Reconciling")
             reconcile_matches = []
-            reconcile_matches = get_matches(txn, ledger_data.transactions, account)
+            reconcile_matches = get_matches(txn, ctx.ledger_data, account, ctx.window)
 
             # Matches found
             matches_canceled = False
@@ -233,9 +211,12 @@ def bean_import(
                         if post.account == account:
                             post.meta.update({'rec': txn.id})
                             break
-                    bean_reconcile.replace()
-                    console.print(bean_reconcile.print())
-                    reconcile_count += 1
+                    if ctx.ledger_data.replace(bean_reconcile, ctx.session):
+                        console.print(bean_reconcile.print())
+                        ctx.reconcile_count += 1
+                    else:
+                        del post.meta['rec']
+                        err_console.print(f"[error]<<ERROR>> Could not write the reconciliation to {bean_reconcile.print_head()}, skipping[/]")
                 else: matches_canceled = True
             else: matches_canceled = True
             # No matches found
@@ -253,9 +234,9 @@ def bean_import(
             console.print(f"...Inserting")
 
             # Replace payee
-            payees_set = sorted(set(get_json_values(payees)).union(ledger_data.payees))
+            payees_set = sorted(set(ctx.payee_store.names).union(ctx.ledger_data.payees))
             payee_completer = FuzzyCompleter(WordCompleter(payees_set, sentence=True))
-            payee = get_key(payees, txn.payee)
+            payee = ctx.payee_store.resolve(txn.payee)
 
             # Payee not found, replace
             if not payee:
@@ -268,7 +249,7 @@ def bean_import(
             # Payee entered
             if payee:
                 console.print(f"...Replaced [string]{txn.payee}[/] with [answer]{payee}[/]")
-                set_key(payees, txn.payee, payee)
+                ctx.payee_store.set(txn.payee, payee)
                 txn.payee = payee
 
             # Update total transaction amount
@@ -284,11 +265,11 @@ def bean_import(
                 new_amount = eval_string_float(new_amount)
 
             # Add credit postings until total is equal to transaction amount
-            new_bean = ledger_bean(txn, txn_data.account_id, flag)
+            new_bean = ledger_bean(txn, txn_data.account_id, ctx.flag)
             new_posting = None
             while new_bean.amount < new_amount:
                 console.print(f"\n{new_bean.print()}")
-                new_posting = get_posting("Credit", new_amount - new_bean.amount, ledger_data.currency, operating_currency, account_completer, "pos")
+                new_posting = get_posting("Credit", new_amount - new_bean.amount, ctx.ledger_data.currency, ctx.operating_currency, ctx.account_completer, "pos")
                 if new_posting is not None:
                     new_posting['amount'] = eval_string_dec(new_posting['amount'])
                     new_bean.add_posting(new_posting)
@@ -298,7 +279,7 @@ def bean_import(
             # Add debit posting
             if new_posting is not None:
                 console.print(f"\n{new_bean.print()}")
-                new_posting = get_posting("Debit", new_amount * -1, ledger_data.currency, operating_currency, account_completer, "neg", default_account=account)
+                new_posting = get_posting("Debit", new_amount * -1, ctx.ledger_data.currency, ctx.operating_currency, ctx.account_completer, "neg", default_account=account)
                 if new_posting is not None:
                     new_posting['amount'] = eval_string_dec(new_posting['amount'])
                     new_bean.add_posting(new_posting)
@@ -367,7 +348,7 @@ def bean_import(
                         key_bindings=cancel_bindings,
                         bottom_toolbar=cancel_toolbar,
                         validator=valid_link_tag,
-                        completer=tags_completer,
+                        completer=ctx.tags_completer,
                         default=" ".join(new_bean.entry.tags))
                     if edit_tags:
                         new_bean.update(tags=set(edit_tags.split()))
@@ -380,7 +361,7 @@ def bean_import(
                         key_bindings=cancel_bindings,
                         bottom_toolbar=cancel_toolbar,
                         validator=valid_link_tag,
-                        completer=links_completer,
+                        completer=ctx.links_completer,
                         default=" ".join(new_bean.entry.links))
                     if edit_links:
                         new_bean.update(links=set(edit_links.split()))
@@ -401,12 +382,12 @@ def bean_import(
                         new_amount = eval_string_float(new_amount)
                     while new_bean.amount < new_amount:
                         console.print(f"\n{new_bean.print()}")
-                        new_posting = get_posting("Credit", new_amount - new_bean.amount, ledger_data.currency, operating_currency, account_completer, "pos")
+                        new_posting = get_posting("Credit", new_amount - new_bean.amount, ctx.ledger_data.currency, ctx.operating_currency, ctx.account_completer, "pos")
                         if new_posting is not None:
                             new_posting['amount'] = eval_string_dec(new_posting['amount'])
                             new_bean.add_posting(new_posting)
                     console.print(f"\n{new_bean.print()}")
-                    new_posting = get_posting("Debit", new_amount * -1, ledger_data.currency, operating_currency, account_completer, "neg", default_account=account)
+                    new_posting = get_posting("Debit", new_amount * -1, ctx.ledger_data.currency, ctx.operating_currency, ctx.account_completer, "neg", default_account=account)
                     if new_posting is not None:
                         new_posting['amount'] = eval_string_dec(new_posting['amount'])
                         new_bean.add_posting(new_posting)
@@ -441,15 +422,11 @@ def bean_import(
                         found_account = True
 
                 if found_account:
-                    if output:
-                        console_insert = f'[file]{output}[/]'
-                        append_lines(output, new_bean.print())
-                    else:
-                        console_insert = f'[file]buffer[/]'
-                        buffer += f"\n{new_bean.print()}"
+                    console_insert = f'[file]{ctx.output}[/]' if ctx.output else f'[file]buffer[/]'
+                    ctx.buffer += ctx.ledger_data.insert(new_bean, ctx.output, ctx.session)
                     console.print(f"...Inserted {new_bean.print_head(theme=True)} into {console_insert}")
                     console.print(f"\n{new_bean.print()}")
-                    insert_count += 1
+                    ctx.insert_count += 1
 
         # Skip transaction
         if resolve[0] == "s":
@@ -457,16 +434,250 @@ def bean_import(
 
         # Quit
         if resolve[0] == "q":
-            break
+            return False
+    return True
+
+def bean_import(
+    ledger: Annotated[Path, typer.Argument(
+        help="The beancount ledger file to base the parser from",
+        exists=True, file_okay=True, dir_okay=False, readable=True, resolve_path=True)],
+    ofx: Annotated[List[Path], typer.Option(
+        "--ofx", "-x",
+        help="The ofx files to parse, can be repeated and accepts glob patterns",
+        exists=False)]=None,
+    simplefin: Annotated[Path, typer.Option(
+        "--simplefin", "-s",
+        help="The simplefin file or store directory to parse",
+        exists=True, file_okay=True, dir_okay=True, readable=True, resolve_path=True)]=None,
+    output: Annotated[Path, typer.Option(
+        "--output", "-o",
+        help="The output file to write to instead of stdout",
+        show_default=False, exists=False)]=None,
+    period: Annotated[str, typer.Option(
+        "--period", "-d",
+        help="Specify a year, month or day period to parse transactions from in the format YYYY, YYYY-MM or YYYY-MM-DD",
+        callback=period_callback)]="",
+    account: Annotated[str, typer.Option(
+        "--account", "-a",
+        help="Specify the account transactions belong to",
+        callback=account_callback)]="",
+    payees: Annotated[Path, typer.Option(
+        "--payees", "-p",
+        help="The payee file to use for name substitutions",
+        exists=False)]="payees.json",
+    payee_rules: Annotated[Path, typer.Option(
+        "--payee-rules",
+        help="The payee rules file with exact, prefix, regex or fuzzy payee normalizations, used if it exists",
+        exists=False)]="payee_rules.json",
+    operating_currency: Annotated[bool, typer.Option(
+        "--operating-currency", "-c",
+        help="Skip the currency prompt when inserting and use the ledger's operating_currency")]=False,
+    flag: Annotated[str, typer.Option(
+        "--flag", "-f",
+        help="Specify the default flag to set for transactions",
+        callback=flag_callback)]="*",
+    rules: Annotated[Path, typer.Option(
+        "--rules", "-r",
+        help="The import rules file mapping payees and amount ranges to postings, used if it exists",
+        exists=False)]="rules.json",
+    headless: Annotated[bool, typer.Option(
+        "--headless",
+        help="Import without prompting: reconcile single matches, insert rule matches and leave the rest for review")]=False,
+    review: Annotated[Path, typer.Option(
+        "--review",
+        help="The SimpleFIN file to write transactions left for review to",
+        show_default=False, exists=False)]=None,
+    account_map: Annotated[Path, typer.Option(
+        "--account-map", "-m",
+        help="A JSON file mapping SimpleFIN or OFX account ids to beancount accounts, imports every mapped account in one run",
+        exists=True, file_okay=True, dir_okay=False, readable=True, resolve_path=True)]=None,
+    jobs: Annotated[int, typer.Option(
+        "--jobs", "-j",
+        help="Number of OFX files to parse and accounts to match concurrently, 0 uses one per CPU",
+        min=0)]=0,
+    auto_reconcile_all: Annotated[bool, typer.Option(
+        "--auto-reconcile",
+        help="Reconcile every transaction with a confident one-to-one ledger match before prompting, always on with --headless")]=False,
+    window: Annotated[int, typer.Option(
+        "--window", "-w",
+        help="Only match ledger postings dated within this many days of a transaction, 0 matches any date",
+        min=0)]=0,
+    reconcile_window: Annotated[int, typer.Option(
+        "--reconcile-window",
+        help="Only auto-reconcile a transaction with a posting dated within this many days, 0 allows any date",
+        min=0)]=7,
+    no_cache: Annotated[bool, typer.Option(
+        "--no-cache",
+        help="Parse the ledger without reading or updating the ledger cache or beancount's pickle cache")]=False,
+    version: Annotated[bool, typer.Option(
+        "--version", "-v",
+        help="Show version info and exit",
+        callback=version_callback, is_eager=True)]=False,
+):
+    """
+    Parse transactions for review and editing for a beancount LEDGER and output transaction entries to stdout
+    """
+
+    console_output = f"LEDGER File: [file]{ledger}[/]\nPAYEES File: [file]{payees}[/]"
+
+    ofx_files = ofx_paths(ofx) if ofx else []
+    for ofx_file in ofx_files: console_output += f"\nOFX File: [file]{ofx_file}[/]"
+    if simplefin: console_output += f"\nSimpleFIN File: [file]{simplefin}[/]"
+    if account_map: console_output += f"\nACCOUNT MAP File: [file]{account_map}[/]"
+    if output: console_output +=  f"\nOUTPUT File: [file]{output}[/]"
+    console.print(f"{console_output}")
+
+    # Parse files into (txn_data, account) pairs to import
+    missing = [ofx_file for ofx_file in ofx_files if not os.path.isfile(ofx_file)]
+    if (ofx and not ofx_files) or missing:
+        err_console.print(f"[error]OFX file not found: {', '.join(missing) or ', '.join(str(o) for o in ofx)}. Exiting.[/]")
+        raise typer.Exit()
+    mapping = None
+    if account_map:
+        mapping = get_json(account_map, default={}, overwrite_invalid=False)
+        if not isinstance(mapping, dict):
+            err_console.print(f"[error]Invalid account map {account_map}, expected account ids mapped to accounts. Exiting.[/]")
+            raise typer.Exit()
+    imports = []
+    txn_datas = []
+    if ofx_files:
+        txn_datas += ofx_files_load(ofx_files, period, jobs)
+    if simplefin and mapping is not None:
+        txn_datas += simplefin_accounts(simplefin)
+    elif simplefin:
+        txn_data = simplefin_load(simplefin, headless)
+        if txn_data: imports.append((txn_data, account))
+    # Statements from different accounts are never imported into a single --account
+    account_ids = sorted({txn_data.account_id for txn_data in txn_datas})
+    if mapping is None and len(account_ids) > 1:
+        if headless:
+            err_console.print(f"[error]Found {len(account_ids)} accounts ({', '.join(account_ids)}), an --account-map is required to import them headless. Exiting.[/]")
+            raise typer.Exit()
+        if account: console.print(f"[warning]Found {len(account_ids)} accounts, prompting for each instead of using {account}[/]")
+        account = ''
+    for txn_data in txn_datas:
+        if mapping is None:
+            imports.append((txn_data, account))
+        elif txn_data.account_id in mapping:
+            imports.append((txn_data, mapping[txn_data.account_id]))
+        else:
+            console.print(f"[warning]Skipping account {txn_data.institution} - {txn_data.account_type} ({txn_data.account_id}), not in account map[/]")
+    imports = [(txn_data, txn_account) for txn_data, txn_account in imports if len(txn_data.transactions)]
+
+    if len(imports):
+        console.print(f"Parsed [number]{sum(len(txn_data.transactions) for txn_data, txn_account in imports)}[/] transactions from [number]{len(imports)}[/] accounts")
+    else:
+        err_console.print(f"[error]No transactions found. Please provide a valid file to parse.[/]")
+        raise typer.Exit()
+
+    # Parse ledger file into ledger_data
+    session = edit_session(ledger, resume=True if headless else None)
+    ledger_data = ledger_load(ledger, use_cache=not no_cache)
+    if ledger_data and len(ledger_data.transactions):
+        console.print(f"Parsed [number]{len(ledger_data.transactions)}[/] beans from LEDGER file")
+        console.print(f"Default currency: [answer]{ledger_data.currency}[/]")
+        for duplicate in ledger_data.rec_duplicates:
+            err_console.print(f"[warning]{duplicate}[/]")
+    else:
+        err_console.print(f"[error]No transaction entries found in LEDGER file. Exiting.[/]")
+        raise typer.Exit()
+    payee_store = PayeeStore(payees, rules=payee_rules_load(payee_rules))
+    if payee_store.rules is not None:
+        console.print(f"Loaded [number]{len(payee_store.rules)}[/] payee rules from [file]{payee_rules}[/]")
+    import_rules = import_rules_load(rules)
+    if import_rules is not None:
+        console.print(f"Loaded [number]{len(import_rules)}[/] import rules from [file]{rules}[/]")
+    ctx = ImportContext(ledger, ledger_data, session, payee_store, import_rules, output, flag, operating_currency, window, no_cache)
+
+    # Filter transactions by dates specified from cli
+    if period:
+        imports = [(txn_data, txn_account, [t for t in txn_data.transactions if t.date.startswith(period)]) for txn_data, txn_account in imports]
+        filtered_count = sum(len(filtered) for txn_data, txn_account, filtered in imports)
+        if filtered_count:
+            console.print(f"Found [number]{filtered_count}[/] transactions within period [date]{period}[/]")
+        else:
+            err_console.print(f"[error]No transactions found within the specified period [date]{period}[/]. Exiting.[/]")
+            raise typer.Exit()
+    else:
+        imports = [(txn_data, txn_account, txn_data.transactions) for txn_data, txn_account in imports]
+
+    # Check if account specified, else prompt
+    if any(not txn_account for txn_data, txn_account, filtered in imports) and headless:
+        err_console.print(f"[error]An --account or --account-map is required for headless imports. Exiting.[/]")
+        raise typer.Exit()
+    chosen = {}
+    for i, (txn_data, txn_account, filtered) in enumerate(imports):
+        if not txn_account:
+            # Statements of one account across several files are asked for once
+            txn_account = chosen.get(txn_data.account_id) or prompt(
+                f"Beancount account {txn_data.institution} - {txn_data.account_type} ({txn_data.account_id}) transactions belong to > ",
+                validator=valid_account,
+                completer=ctx.account_completer)
+            chosen[txn_data.account_id] = txn_account
+            imports[i] = (txn_data, txn_account, filtered)
+        console.print(f"Transaction account: [answer]{txn_account}[/] ({txn_data.institution} - {txn_data.account_type})")
+
+    # Match transactions not in beans into pending, one beancount account per worker
+    reconcile = headless or auto_reconcile_all
+    # Pairs made without a prompt are never further apart than either window allows
+    reconcile_days = min([days for days in (window, reconcile_window) if days], default=0)
+    groups = {}
+    for i, (txn_data, txn_account, filtered) in enumerate(imports):
+        groups.setdefault(txn_account, []).append(i)
+    with ThreadPoolExecutor(max_workers=jobs or min(len(groups), os.cpu_count() or 1)) as pool:
+        results = list(pool.map(lambda group: match_account([imports[i][2] for i in group[1]], ledger_data, group[0], reconcile_days, reconcile), groups.items()))
+    matched = [None] * len(imports)
+    pairs = []
+    for indexes, (pendings, account_pairs) in zip(groups.values(), results):
+        pairs += account_pairs
+        for i, pending in zip(indexes, pendings): matched[i] = pending
+    pending_count = sum(len(pending) for pending in matched)
+    if pending_count:
+        console.print(f"Found [number]{pending_count}[/] transactions not in LEDGER")
+    else:
+        console.print(f"[warning]No pending transactions found. Exiting.[/]")
+
+    # Resolve what needs no decisions first, leaving the rest for prompts or review
+    if pending_count and (reconcile or import_rules is not None):
+        start = time.perf_counter()
+        if reconcile:
+            reconciled = auto_reconcile(pairs, ledger_data, session)
+            ctx.reconcile_count = len(reconciled)
+            matched = [[txn for txn in pending if txn.id not in reconciled] for pending in matched]
+        if import_rules is not None:
+            matched = [auto_insert(ctx, pending, txn_account) for pending, (txn_data, txn_account, filtered) in zip(matched, imports)]
+            ctx.ledger_data.commit(session)
+        seconds = time.perf_counter() - start
+        rate = pending_count / seconds if seconds else 0
+        console.print(f"Auto-reconciled [number]{ctx.reconcile_count}[/] and inserted [number]{ctx.insert_count}[/] transactions in [number]{seconds:.2f}[/]s ([number]{rate:.0f}[/] transactions/s)")
+        left = [(txn_data, pending) for (txn_data, txn_account, filtered), pending in zip(imports, matched) if len(pending)]
+        if len(left):
+            console.print(f"[warning][number]{sum(len(pending) for txn_data, pending in left)}[/] transactions left for review[/]")
+        if review and len(left):
+            try:
+                simplefin_write(review, left)
+                console.print(f"Wrote transactions left for review to [file]{review}[/]")
+            except Exception as e:
+                err_console.print(f"[error]<<ERROR>> Error writing review file: {str(e)}[/]")
+        if headless: matched = []
+
+    # Parse each pending transaction
+    for (txn_data, txn_account, filtered), pending in zip(imports, matched):
+        if not len(pending): continue
+        if len(imports) > 1:
+            console.print(f"Importing [number]{len(pending)}[/] transactions into [answer]{txn_account}[/]")
+        if not import_transactions(ctx, txn_data, txn_account, pending): break
 
     # Finished parsing
-    if not output and buffer:
-        console.print(f"{buffer}")
-    if reconcile_count:
-        console.print(f"[string]Reconciled [number]{reconcile_count}[/] transactions[/]")
-    if insert_count:
-        console.print(f"[string]Inserted [number]{insert_count}[/] transactions[/]")
-    skipped = len(pending) - reconcile_count - insert_count
+    ctx.commit()
+    payee_store.flush()
+    if not output and ctx.buffer:
+        console.print(f"{ctx.buffer}")
+    if ctx.reconcile_count:
+        console.print(f"[string]Reconciled [number]{ctx.reconcile_count}[/] transactions[/]")
+    if ctx.insert_count:
+        console.print(f"[string]Inserted [number]{ctx.insert_count}[/] transactions[/]")
+    skipped = pending_count - ctx.reconcile_count - ctx.insert_count
     if skipped:
         console.print(f"[string]Skipped [number]{skipped}[/] transactions[/]")
     console.print(f"[warning]Finished parsing. Exiting[/]")
@@ -1,15 +1,35 @@
 import typer
+import dataclasses
+import datetime
+import functools
+import json
+import os
 import re
 import sys
+import beanquery
+from decimal import Decimal
 from typing_extensions import Annotated
 from typing import List
 from pathlib import Path
 from .prompts import version_callback, format_callback, console, err_console
 from .ledger import ledger_load
+from .cache import query_cache_get, query_cache_set, result_cache_get, result_cache_set
 from enum import Enum
-from beanquery import query
+from beanquery import parser
+from beanquery.parser import ast
+from beanquery.numberify import numberify_results
 from beanquery.query_render import render_text, render_csv
 
+PLACEHOLDER = re.compile(r'\{([^}]*)\}')
+# String literals and placeholders, so placeholders can be told apart by where they appear
+QUERY_TOKEN = re.compile(r"'[^']*'|\"[^\"]*\"|\{[^}]*\}")
+QUOTED_PLACEHOLDER = re.compile(r"^(['\"])\{([^}]*)\}\1$")
+# Functions whose value depends on the day a query runs
+TODAY = re.compile(r'\btoday\s*\(', re.IGNORECASE)
+# Parsed statements by query text for this process
+PARSED = {}
+RESULT_MAX_AGE = int(os.getenv('BEAN_TOOLS_RESULT_MAX_AGE', '86400'))
+
 class Placeholder(str, Enum):
     named = "named"
     indexed = "indexed"
@@ -42,12 +62,13 @@ def valid_query(line):
         }
     return None
 
+@functools.lru_cache(maxsize=None)
 def get_placeholders(query_string):
     # Find all placeholders like {0}, {1}, {name}, or {}
     placeholders = []
 
     # Match all placeholders (e.g., {name}, {0}, {})
-    matches = re.findall(r'\{([^}]*)\}', query_string)
+    matches = PLACEHOLDER.findall(query_string)
     if not len(matches):
         return placeholders, ''
     expected = which_type(matches[0])
@@ -90,14 +111,136 @@ def parse_params(params, placeholders, placeholders_type, placeholders_string):
 
     return params
 
-def run_query(ledger_data, query_string):
+def typed_value(text):
+    # Bare placeholders stand for BQL literals, only dates and numbers can be bound as such
+    if re.fullmatch(r'\d{4}-\d{2}-\d{2}', text):
+        try:
+            return datetime.date.fromisoformat(text)
+        except ValueError:
+            return None
+    if re.fullmatch(r'-?\d+', text): return int(text)
+    if re.fullmatch(r'-?\d+\.\d*', text): return Decimal(text)
+    return None
+
+def bind_query(query_string, params, use_cache=True):
+    """
+    Replace {} placeholders with bound query parameters instead of formatting values into the query
+
+    Quoted placeholders ('{0}') bind their value as a string, bare ones as a
+    date or number. The bound query text only depends on the template, so its
+    parse is cached across parameter values. Returns None when a value has to
+    be formatted into the text: a placeholder inside a longer string or next
+    to other characters, a bare value that is not a date or number, or a
+    placeholder in a clause that only takes literals (LIMIT, OPEN ON).
+    """
+    parts, bound = [], {}
+    pos = blank = 0
+    for match in QUERY_TOKEN.finditer(query_string):
+        token = match.group(0)
+        quoted = QUOTED_PLACEHOLDER.match(token)
+        if token[0] in '\'"' and not quoted:
+            if PLACEHOLDER.search(token): return None
+            continue
+        key = quoted.group(2) if quoted else token[1:-1]
+        if isinstance(params, dict): value = params[key]
+        elif key: value = params[int(key)]
+        else:
+            value = params[blank]
+            blank += 1
+        if not quoted:
+            before = query_string[match.start() - 1:match.start()]
+            after = query_string[match.end():match.end() + 1]
+            if re.match(r'[\w.:-]', before) or re.match(r'[\w.:-]', after): return None
+            value = typed_value(value)
+            if value is None: return None
+        name = f"p{len(bound)}"
+        bound[name] = value
+        parts.append(query_string[pos:match.start()])
+        parts.append(f"%({name})s")
+        pos = match.end()
+    parts.append(query_string[pos:])
+    text = ''.join(parts)
+    # The grammar only takes parameters where it takes expressions
+    try:
+        parse_query(text, use_cache)
+    except parser.ParseError:
+        return None
+    return text, bound
+
+class ParseInfo:
+    # Stand-in for the parser's position info, the compiler reads node text back from it
+    def __init__(self, text, pos, endpos):
+        self.tokenizer = self
+        self.text = text
+        self.pos = pos
+        self.endpos = endpos
+
+def tree_dump(node):
+    # Parser nodes are built at runtime and cannot be pickled, so they are stored as plain tuples
+    if isinstance(node, ast.Node):
+        info = node.parseinfo
+        values = [tree_dump(getattr(node, f.name)) for f in dataclasses.fields(node) if f.name != 'parseinfo']
+        return (type(node).__name__, values, info.pos if info else None, info.endpos if info else None)
+    if isinstance(node, list): return [tree_dump(n) for n in node]
+    return node
+
+def tree_load(data, query_string):
+    if isinstance(data, tuple):
+        name, values, pos, endpos = data
+        node = getattr(ast, name)(*[tree_load(v, query_string) for v in values])
+        if pos is not None: node.parseinfo = ParseInfo(query_string, pos, endpos)
+        return node
+    if isinstance(data, list): return [tree_load(v, query_string) for v in data]
+    return data
+
+def parse_query(query_string, use_cache=True):
+    # Parsing dominates short queries, so statements are kept per process and on disk
+    if query_string in PARSED: return PARSED[query_string]
+    tree = query_cache_get(query_string, beanquery.__version__) if use_cache else None
+    statement = None
+    if tree is not None:
+        try:
+            statement = tree_load(tree, query_string)
+            if not isinstance(statement, ast.Node): raise TypeError(f"not a statement: {statement!r}")
+        except Exception:
+            # The nodes are beanquery internals, an entry they no longer fit is parsed again
+            statement = None
+    if statement is None:
+        statement = parser.parse(query_string)
+        if use_cache: query_cache_set(query_string, beanquery.__version__, tree_dump(statement))
+    PARSED[query_string] = statement
+    return statement
+
+def run_query(ledger_data, query_string, params=None, use_cache=True):
     try:
-        rtypes, rrows = query.run_query(ledger_data.entries, ledger_data.options, query_string, numberify=True)
-        return rtypes, rrows
+        connection = beanquery.connect('beancount:', entries=ledger_data.entries, errors=[], options=ledger_data.options)
+        cursor = connection.execute(parse_query(query_string, use_cache), params)
+        return numberify_results(cursor.description, cursor.fetchall(), ledger_data.options['dcontext'].build())
     except Exception as e:
         err_console.print(f"[error]Error executing query: {str(e)}[/]")
         return None, None
 
+def render_results(rtypes, rrows, dcontext, format, output=None):
+    try:
+        console.print()
+        if format == 'text':
+            if output:
+                with output.open('w', encoding='utf-8') as f:
+                    render_text(rtypes, rrows, dcontext, file=f)
+            else:
+                render_text(rtypes, rrows, dcontext, sys.stdout)
+        elif format == 'csv':
+            if output:
+                with output.open('w', encoding='utf-8') as f:
+                    render_csv(rtypes, rrows, dcontext, file=f)
+            else:
+                render_csv(rtypes, rrows, dcontext, sys.stdout)
+    except Exception as e:
+        err_console.print(f"[error]Error rendering output: {str(e)}[/]")
+        raise typer.Exit(code=1)
+
+    if output: console.print(f"Saved to [file]{output}[/]")
+
 def bean_inquiry(
     ledger: Annotated[Path, typer.Argument(
         help="The beancount ledger file to parse",
@@ -124,6 +267,13 @@ def bean_inquiry(
         "--output", "-o",
         help="The output file to write to instead of stdout",
         show_default=False, exists=False)]=None,
+    no_cache: Annotated[bool, typer.Option(
+        "--no-cache",
+        help="Run the query on a freshly parsed ledger without reading or updating any cache")]=False,
+    max_age: Annotated[int, typer.Option(
+        "--max-age",
+        help="Reuse a cached result for the same query and parameters for this many seconds while the ledger files are unchanged, 0 disables the result cache",
+        min=0)] = RESULT_MAX_AGE,
     version: Annotated[bool, typer.Option(
         "--version", "-v",
         help="Show version info and exit",
@@ -133,11 +283,21 @@ def bean_inquiry(
     Inject parameters into beancount queries specified in your ledger
     """
 
-    # Load ledger
     if ledger is None:
         raise typer.BadParameter("Ledger file is required.")
+
+    # Render a cached result without loading the ledger
+    result_key = json.dumps([name, params or []])
+    if name and not check and not list_queries and not no_cache and max_age:
+        cached = result_cache_get(ledger, result_key, max_age)
+        if cached is not None:
+            console.print(f"Cached result for [string]{name}[/] {' '.join(params or [])}")
+            render_results(*cached, format, output)
+            raise typer.Exit()
+
+    # Load ledger
     console.print(f"Loading ledger [file]{ledger}[/]")
-    ledger_data = ledger_load(ledger)
+    ledger_data = ledger_load(ledger, use_cache=not no_cache)
 
     # Check queries
     if ledger_data.queries is None or not len(ledger_data.queries):
@@ -183,10 +343,15 @@ def bean_inquiry(
     if parsed_params is None:
         raise typer.Exit(code=1)
 
-    # Format query with parameters
+    # Bind parameters, or format them into the query when they cannot be bound
     query_string = ''
+    query_params = None
     try:
-        if parsed_params:
+        bound = bind_query(query_entry.query_string, parsed_params, use_cache=not no_cache) if parsed_params else None
+        if bound:
+            query_string, query_params = bound
+            console.print(f"[string]{query_entry.name}[/](bound){query_string} {query_params}")
+        elif parsed_params:
             if isinstance(parsed_params, (list, tuple)):
                 query_string = query_entry.query_string.format(*parsed_params)
             elif isinstance(parsed_params, dict):
@@ -198,28 +363,14 @@ def bean_inquiry(
         err_console.print(f"[error]Error formatting query with parameters: {str(e)}[/]")
         raise typer.Exit(code=1)
 
-     # Execute query
-    rtypes, rrows = run_query(ledger_data, query_string)
+     # Execute query, a result that depends on the date is only reused the same day
+    day = datetime.date.today().isoformat() if TODAY.search(query_string) else None
+    rtypes, rrows = run_query(ledger_data, query_string, query_params, use_cache=not no_cache)
     if rtypes is None or rrows is None:
         raise typer.Exit(code=1)
 
-    # Render results
-    try:
-        console.print()
-        if format == 'text':
-            if output:
-                with output.open('w', encoding='utf-8') as f:
-                    render_text(rtypes, rrows, ledger_data.options['dcontext'], file=f)
-            else:
-                render_text(rtypes, rrows, ledger_data.options['dcontext'], sys.stdout)
-        elif format == 'csv':
-            if output:
-                with output.open('w', encoding='utf-8') as f:
-                    render_csv(rtypes, rrows, ledger_data.options['dcontext'], file=f)
-            else:
-                render_csv(rtypes, rrows, ledger_data.options['dcontext'], sys.stdout)
-    except Exception as e:
-        err_console.print(f"[error]Error rendering output: {str(e)}[/]")
-        raise typer.Exit(code=1)
+    if not no_cache and max_age:
+        result_cache_set(ledger, result_key, ledger_data.stamps, (rtypes, rrows, ledger_data.options['dcontext']), day)
 
-    if output: console.print(f"Saved to [file]{output}[/]")
+    # Render results
+    render_results(rtypes, rrows, ledger_data.options['dcontext'], format, output)
@@ -0,0 +1,195 @@
+import datetime, hashlib, os, pickle, tempfile, time
+from pathlib import Path
+
+CACHE_VERSION = 1
+CACHE_MAX_BYTES = int(os.getenv('BEAN_TOOLS_CACHE_MAX_MB', '256')) * 1024 * 1024
+
+def cache_dir():
+    path = os.getenv('BEAN_TOOLS_CACHE_DIR')
+    if path: return Path(path)
+    return Path(os.getenv('XDG_CACHE_HOME') or Path.home() / '.cache') / 'bean-tools'
+
+def cache_path(ledger_path, kind='ledger', suffix='.pickle'):
+    key = hashlib.sha256(str(Path(ledger_path).resolve()).encode('utf-8')).hexdigest()[:32]
+    return cache_dir() / f"{kind}-{key}{suffix}"
+
+def file_stamps(filenames):
+    stamps = {}
+    for filename in filenames:
+        try:
+            stat = os.stat(filename)
+            stamps[filename] = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            stamps[filename] = None
+    return stamps
+
+def cache_read(path):
+    try:
+        with open(path, 'rb') as file:
+            data = pickle.load(file)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        # Corrupted or written by an incompatible version, recompute
+        cache_remove(path)
+        return None
+    if not isinstance(data, dict) or data.get('version') != CACHE_VERSION:
+        return None
+    return data
+
+def cache_write(path, data, max_bytes=CACHE_MAX_BYTES):
+    data['version'] = CACHE_VERSION
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    except OSError:
+        return False
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            pickle.dump(data, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except Exception:
+        cache_remove(tmp_path)
+        return False
+    cache_evict(max_bytes, keep=path)
+    return True
+
+def cache_remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def cache_evict(max_bytes=CACHE_MAX_BYTES, keep=None):
+    # Least recently used entries go first, hits refresh the mtime of their file
+    files = []
+    for path in cache_dir().glob('*.pickle'):
+        try:
+            stat = path.stat()
+            files.append((stat.st_mtime_ns, stat.st_size, path))
+        except OSError:
+            continue
+    total = 0
+    for mtime, size, path in sorted(files, reverse=True):
+        total += size
+        if total > max_bytes and path != keep:
+            cache_remove(path)
+
+def ledger_cache_get(ledger_path):
+    """
+    Return the cached (entries, errors, options) and the include tree they were parsed from
+
+    The entries are None when the cache is missing or any file changed. The
+    include tree of a stale entry is still returned, so the files can be
+    stamped before they are parsed again.
+    """
+    path = cache_path(ledger_path)
+    data = cache_read(path)
+    if data is None or data.get('ledger') != os.path.abspath(ledger_path):
+        return None, [os.path.abspath(ledger_path)]
+    if file_stamps(data['stamps']) != data['stamps']:
+        return None, list(data['stamps'])
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return (data['entries'], data['errors'], data['options']), list(data['stamps'])
+
+def parse_stamps(before, includes):
+    # Files stamped before parsing keep those stamps, so edits made during the parse show as stale
+    stamps = file_stamps(includes)
+    stamps.update({filename: stamp for filename, stamp in before.items() if filename in stamps})
+    return stamps
+
+def ledger_cache_set(ledger_path, entries, errors, options, stamps=None):
+    if stamps is None: stamps = file_stamps(options.get('include', [ledger_path]))
+    # A file edited while it was parsed would cache stale entries under its new stamps
+    elif file_stamps(stamps) != stamps: return False
+    return cache_write(cache_path(ledger_path), {
+        'ledger': os.path.abspath(ledger_path),
+        'stamps': stamps,
+        'entries': entries,
+        'errors': errors,
+        'options': options
+    })
+
+def query_cache_path(query_string):
+    key = hashlib.sha256(query_string.encode('utf-8')).hexdigest()[:32]
+    return cache_dir() / f"query-{key}.pickle"
+
+def query_cache_get(query_string, parser_version):
+    path = query_cache_path(query_string)
+    data = cache_read(path)
+    if data is None or data.get('query') != query_string or data.get('parser') != parser_version:
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return data['tree']
+
+def query_cache_set(query_string, parser_version, tree):
+    return cache_write(query_cache_path(query_string), {
+        'query': query_string,
+        'parser': parser_version,
+        'tree': tree
+    })
+
+def file_digests(filenames):
+    digests = {}
+    for filename in filenames:
+        try:
+            with open(filename, 'rb') as file:
+                digests[filename] = hashlib.file_digest(file, 'sha256').hexdigest()
+        except OSError:
+            digests[filename] = None
+    return digests
+
+def result_cache_path(ledger_path, key):
+    key = hashlib.sha256(f"{Path(ledger_path).resolve()}\n{key}".encode('utf-8')).hexdigest()[:32]
+    return cache_dir() / f"result-{key}.pickle"
+
+def result_cache_get(ledger_path, key, max_age):
+    """
+    Return a cached result if every file of the include tree still has the same content
+
+    Files whose stamps changed are hashed again, so touching a file without
+    editing it keeps the entry. Entries older than max_age seconds, and
+    entries for a query that depends on the current date made on another
+    day, are dropped.
+    """
+    path = result_cache_path(ledger_path, key)
+    data = cache_read(path)
+    if data is None or data.get('ledger') != os.path.abspath(ledger_path) or data.get('key') != key:
+        return None
+    day = data.get('day')
+    if time.time() - data['created'] > max_age or (day is not None and day != datetime.date.today().isoformat()):
+        cache_remove(path)
+        return None
+    stamps = file_stamps(data['stamps'])
+    if stamps != data['stamps']:
+        changed = [filename for filename in stamps if stamps[filename] != data['stamps'][filename]]
+        if file_digests(changed) != {filename: data['digests'][filename] for filename in changed}:
+            cache_remove(path)
+            return None
+        data['stamps'] = stamps
+        cache_write(path, data)
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return data['result']
+
+def result_cache_set(ledger_path, key, stamps, result, day=None):
+    # stamps are the ones the result was computed from, files edited since are not cached,
+    # day is the date a result that depends on the current date was computed on
+    if file_stamps(stamps) != stamps: return False
+    return cache_write(result_cache_path(ledger_path, key), {
+        'ledger': os.path.abspath(ledger_path),
+        'key': key,
+        'day': day,
+        'created': time.time(),
+        'stamps': stamps,
+        'digests': file_digests(stamps),
+        'result': result
+    })
@@ -1,16 +1,48 @@
+import importlib
 import typer
-from .bean_import import bean_import
-from .bean_download import bean_download
-from .bean_version import bean_version
-from .bean_bills import bean_bills
-from .bean_inquiry import bean_inquiry
-
-app = typer.Typer(no_args_is_help=True)
-app.command(name="bills")(bean_bills)
-app.command(name="download")(bean_download)
-app.command(name="import")(bean_import)
-app.command(name="inquiry")(bean_inquiry)
-app.command(name="version")(bean_version)
+from typer.core import TyperCommand, TyperGroup
+
+# Commands are imported only when they run, so `version`, `--help` and shell
+# completion do not pay for beancount, beanquery, prompt_toolkit or requests
+COMMANDS = {
+    "bills": ("bean_tools.bean_bills:bean_bills", "Review and keep track of bill payments in a beancount ledger"),
+    "download": ("bean_tools.bean_download:bean_download", "Download transactions from an aggregator. Currently supported aggregators are: SimpleFIN"),
+    "import": ("bean_tools.bean_import:bean_import", "Parse transactions for review and editing for a beancount LEDGER and output transaction entries to stdout"),
+    "inquiry": ("bean_tools.bean_inquiry:bean_inquiry", "Inject parameters into beancount queries specified in your ledger"),
+    "version": ("bean_tools.bean_version:bean_version", "Show version info and exit"),
+}
+
+class LazyCommand(TyperCommand):
+    def __init__(self, name, import_path, help):
+        super().__init__(name=name, help=help)
+        self.import_path = import_path
+        self.command = None
+
+    def load(self):
+        if self.command is None:
+            module, function = self.import_path.split(':')
+            command_app = typer.Typer(add_completion=False)
+            command_app.command(name=self.name)(getattr(importlib.import_module(module), function))
+            self.command = typer.main.get_command(command_app)
+        return self.command
+
+    def make_context(self, info_name, args, parent=None, **extra):
+        return self.load().make_context(info_name, args, parent=parent, **extra)
+
+class LazyGroup(TyperGroup):
+    def list_commands(self, ctx):
+        return list(COMMANDS)
+
+    def get_command(self, ctx, name):
+        if name not in COMMANDS: return None
+        import_path, help = COMMANDS[name]
+        return LazyCommand(name, import_path, help)
+
+app = typer.Typer(no_args_is_help=True, cls=LazyGroup)
+
+@app.callback()
+def main():
+    pass
 
 if __name__ == "__main__":
     app()
@@ -0,0 +1,208 @@
+import hashlib, json, os
+from pathlib import Path
+from prompt_toolkit import prompt
+from .cache import cache_path, file_stamps
+from .fileio import splice_file
+from .prompts import console, err_console, confirm_toolbar, ValidOptions
+
+class EditSession:
+    """
+    Queue line-range edits per file and write every file once on commit
+
+    Edits are addressed in the line numbers of each file as it was when its
+    first edit was queued, and are journaled before being queued so an
+    interrupted session can be resumed.
+    """
+    def __init__(self, journal_path, checkpoint=50):
+        self.journal_path = Path(journal_path)
+        self.checkpoint = checkpoint
+        self.edits = {}
+        self.appends = {}
+        self.lines = {}
+        self.stamps = {}
+        self.digests = {}
+        self.count = 0
+        # Edits and appends commits dropped because their file changed, until taken
+        self.dropped = (0, 0)
+        self.keep_journal = False
+        # The line each append of the last commit begins on, per written file
+        self.append_starts = {}
+
+    def __len__(self):
+        return self.count
+
+    def interrupted(self):
+        return self.journal_path.exists() and not self.count
+
+    def file_lines(self, filename):
+        if filename not in self.lines:
+            self.stamps[filename] = file_stamps([filename])[filename]
+            with open(filename, 'r', encoding='utf-8') as file:
+                self.lines[filename] = file.readlines()
+            self.digests[filename] = file_digest(self.lines[filename])
+        return self.lines[filename]
+
+    def entry_count(self, filename, lineno):
+        # An entry runs from its first line to the next blank line
+        lines = self.file_lines(filename)
+        end = lineno
+        while end < len(lines) and lines[end].strip(): end += 1
+        return end - lineno + 1
+
+    def replace(self, filename, new_data, line_start, line_count=1):
+        return self.queue(filename, line_start, line_count, [l + '\n' for l in new_data.split('\n')])
+
+    def queue(self, filename, line_start, line_count, new_lines):
+        filename = os.path.abspath(filename)
+        try:
+            self.file_lines(filename)
+        except Exception as e:
+            err_console.print(f"[error]<<ERROR>> Error reading {filename}: {str(e)}[/]")
+            return False
+        edits = self.edits.setdefault(filename, {})
+        for start, count in edits:
+            if (start, count) != (line_start, line_count) and overlaps(start, count, line_start, line_count):
+                err_console.print(f"[error]<<ERROR>> Overlapping edits at line {line_start} of {filename}[/]")
+                return False
+        self.journal({'file': filename, 'digest': self.digests[filename], 'start': line_start, 'count': line_count, 'lines': new_lines})
+        if not line_count and (line_start, 0) in edits:
+            new_lines = edits[(line_start, 0)] + new_lines
+        edits[(line_start, line_count)] = new_lines
+        self.count += 1
+        return True
+
+    def insert(self, filename, new_data, line_start):
+        return self.replace(filename, new_data, line_start, 0)
+
+    def append(self, filename, new_data):
+        filename = os.path.abspath(filename)
+        try:
+            self.file_lines(filename)
+        except Exception as e:
+            err_console.print(f"[error]<<ERROR>> Error reading {filename}: {str(e)}[/]")
+            return False
+        self.journal({'file': filename, 'digest': self.digests[filename], 'append': new_data})
+        self.appends.setdefault(filename, []).append(new_data)
+        self.count += 1
+        return True
+
+    def journal(self, record):
+        self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.journal_path, 'a', encoding='utf-8', newline='\n') as file:
+            file.write(json.dumps(record) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+
+    def changed(self, filename):
+        # A touch or a save without edits keeps the queued line numbers valid
+        if file_stamps([filename])[filename] == self.stamps[filename]: return False
+        try:
+            with open(filename, 'r', encoding='utf-8') as file:
+                return file_digest(file.readlines()) != self.digests[filename]
+        except OSError:
+            return True
+
+    def commit(self):
+        shifts = {}
+        failed = False
+        self.append_starts = {}
+        for filename in self.lines:
+            edits = self.edits.get(filename, {})
+            appends = self.appends.get(filename, [])
+            if not edits and not appends: continue
+            if self.changed(filename):
+                # The journal keeps them for recovery, later commits do not delete it
+                err_console.print(f"[error]<<ERROR>> {filename} changed on disk, {len(edits) + len(appends)} queued edits were not written and are kept in {self.journal_path}[/]")
+                self.dropped = (self.dropped[0] + len(edits), self.dropped[1] + len(appends))
+                self.keep_journal = True
+                continue
+            ordered = sorted((start, count, lines) for (start, count), lines in edits.items())
+            starts = [] if appends else None
+            try:
+                report = splice_file(filename, ordered, appends, starts)
+            except Exception as e:
+                err_console.print(f"[error]<<ERROR>> Error writing {filename}: {str(e)}[/]")
+                failed = True
+                continue
+            self.journal({'applied': filename})
+            if appends: self.append_starts[filename] = starts
+            shifts[filename] = [(start, count, len(lines)) for start, count, lines in ordered]
+            console.print(f"...Wrote [number]{len(ordered) + len(appends)}[/] edits, {report.print(theme=True)}")
+        self.discard(keep_journal=failed or self.keep_journal)
+        return shifts
+
+    def take_dropped(self):
+        dropped, self.dropped = self.dropped, (0, 0)
+        return dropped
+
+    def discard(self, keep_journal=False):
+        self.edits = {}
+        self.appends = {}
+        self.lines = {}
+        self.stamps = {}
+        self.digests = {}
+        self.count = 0
+        if keep_journal: return
+        try:
+            os.remove(self.journal_path)
+        except FileNotFoundError:
+            pass
+
+    def resume(self):
+        records = []
+        applied = set()
+        with open(self.journal_path, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn write of the last record, it was never queued
+                    break
+                if 'applied' in record: applied.add(record['applied'])
+                else: records.append(record)
+        self.discard()
+        for record in records:
+            filename = record['file']
+            if filename in applied: continue
+            try:
+                changed = filename not in self.lines and file_digest(self.file_lines(filename)) != record['digest']
+            except OSError:
+                changed = True
+            if changed:
+                err_console.print(f"[error]<<ERROR>> {filename} changed since the session was interrupted, skipping its edits[/]")
+                applied.add(filename)
+                continue
+            if 'append' in record: self.append(filename, record['append'])
+            else: self.queue(filename, record['start'], record['count'], record['lines'])
+        return self.commit()
+
+def file_digest(lines):
+    return hashlib.sha256(''.join(lines).encode('utf-8')).hexdigest()
+
+def overlaps(a_start, a_count, b_start, b_count):
+    if not a_count and not b_count: return False
+    if not a_count: return b_start < a_start < b_start + b_count
+    if not b_count: return a_start < b_start < a_start + a_count
+    return a_start < b_start + b_count and b_start < a_start + a_count
+
+def shift_line(lineno, shifts):
+    # Edits ending at or before a line push it down by their line count delta
+    offset = 0
+    for start, count, new_count in shifts:
+        if start + count <= lineno: offset += new_count - count
+    return lineno + offset
+
+def edit_session(ledger_path, checkpoint=50, resume=None):
+    session = EditSession(cache_path(ledger_path, kind='journal', suffix='.jsonl'), checkpoint)
+    if session.interrupted():
+        if resume is not None:
+            resume = 'y' if resume else 'n'
+        else:
+            resume = prompt(
+                f"...Found edits from an interrupted session. Resume and write them? [Y/n] > ",
+                default='y',
+                bottom_toolbar=confirm_toolbar,
+                validator=ValidOptions(['y', 'n'])).lower()
+        if resume == 'y': session.resume()
+        else: session.discard()
+    return session
@@ -0,0 +1,130 @@
+import os, stat, tempfile, time
+
+class WriteReport:
+    def __init__(self, path, size, seconds, counts=None):
+        self.path = path
+        self.bytes = size
+        self.seconds = seconds
+        self.counts = counts if counts is not None else []
+
+    def __str__(self):
+        return f"{self.bytes} bytes to {self.path} in {self.seconds:.3f}s"
+
+    def print(self, theme=False):
+        if theme: return f"[number]{self.bytes}[/] bytes to [file]{self.path}[/] in [number]{self.seconds:.3f}[/]s"
+        else: return self.__str__()
+
+def file_mode(path):
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+def fsync_dir(directory):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def atomic_write(path, chunks):
+    # Write to a temp file next to the target, then rename it over the target
+    start = time.perf_counter()
+    path = os.path.realpath(path)
+    directory = os.path.dirname(path)
+    mode = file_mode(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix='.tmp')
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            for chunk in chunks:
+                data = chunk if isinstance(chunk, bytes) else chunk.encode('utf-8')
+                file.write(data)
+                size += len(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    fsync_dir(directory)
+    return WriteReport(path, size, time.perf_counter() - start)
+
+def append_file(path, data):
+    # Appending never rewrites existing content, so it is fsynced in place
+    start = time.perf_counter()
+    encoded = data if isinstance(data, bytes) else data.encode('utf-8')
+    with open(path, 'ab') as file:
+        file.write(encoded)
+        file.flush()
+        os.fsync(file.fileno())
+    return WriteReport(os.path.realpath(path), len(encoded), time.perf_counter() - start)
+
+def splice_lines(source, edits, appends, counts):
+    # edits are (line_start, line_count, new_lines), a None line_count replaces
+    # the entry starting at line_start up to the next blank line
+    pushback = []
+    def next_line():
+        return pushback.pop() if pushback else source.readline()
+    lineno = 1
+    for line_start, line_count, new_lines in sorted(edits, key=lambda e: (e[0], e[1] != 0)):
+        while lineno < line_start:
+            line = next_line()
+            if not line: break
+            yield line
+            lineno += 1
+        removed = 0
+        if line_count is None:
+            line = next_line()
+            while line:
+                if removed and not line.strip():
+                    pushback.append(line)
+                    break
+                removed += 1
+                line = next_line()
+        else:
+            while removed < line_count and next_line():
+                removed += 1
+        lineno += removed
+        counts.append(removed)
+        yield from new_lines
+    while True:
+        line = next_line()
+        if not line: break
+        yield line
+    yield from appends
+
+def counted_appends(lines, appends, starts):
+    newlines = 0
+    for line in lines:
+        if line.endswith('\n'): newlines += 1
+        yield line
+    for data in appends:
+        starts.append(newlines + 1)
+        newlines += data.count('\n')
+        yield data
+
+def splice_file(path, edits, appends=(), starts=None):
+    # starts receives the line each append begins on
+    counts = []
+    with open(path, 'r', encoding='utf-8') as source:
+        if starts is None: chunks = splice_lines(source, edits, appends, counts)
+        else: chunks = counted_appends(splice_lines(source, edits, (), counts), appends, starts)
+        report = atomic_write(path, chunks)
+    report.counts = counts
+    return report
+
+def line_count(path):
+    with open(path, 'rb') as file:
+        return sum(chunk.count(b'\n') for chunk in iter(lambda: file.read(1 << 20), b''))
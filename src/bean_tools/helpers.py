@@ -1,7 +1,9 @@
 import json, os, re
 from decimal import Decimal, ROUND_HALF_UP
-from datetime import datetime
+from datetime import date, datetime
+from difflib import SequenceMatcher
 from .prompts import err_console
+from .fileio import atomic_write, append_file, splice_file
 
 class Transaction:
     def __init__(self, id="", date=datetime.today(), payee="", amount=0.0):
@@ -38,8 +40,7 @@ def set_key(json_path, key, value):
     set_json(data, json_path)
 
 def set_json(data, json_path):
-    with open(json_path, 'w', encoding='utf-8', newline='\n') as file:
-        json.dump(data, file, indent=4, sort_keys=True, ensure_ascii=False)
+    return atomic_write(json_path, [json.dumps(data, indent=4, sort_keys=True, ensure_ascii=False)])
 
 def get_json(json_path, default={}, overwrite_invalid=True):
     data = default
@@ -61,21 +62,14 @@ def get_json_values(json_path):
 def replace_lines(file_path, new_data, line_start, line_count=1):
     new_data_arr = [l + '\n' for l in new_data.split('\n')]
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            lines = file.readlines()
-        new_lines = lines[:line_start - 1] + new_data_arr + lines[line_start + line_count - 1:]
-        with open(file_path, 'w', encoding='utf-8', newline='\n') as file:
-            file.writelines(new_lines)
-        return True
+        return splice_file(file_path, [(line_start, line_count, new_data_arr)])
     except Exception as e:
         err_console.print(f"[error]<<ERROR>> Error replacing lines: {str(e)}[/]")
         return False
 
 def append_lines(file_path, new_data):
     try:
-        with open(file_path, 'a', encoding='utf-8', newline='\n') as file:
-            file.write(f"\n{new_data}")
-        return True
+        return append_file(file_path, f"\n{new_data}")
     except Exception as e:
         err_console.print(f"[error]<<ERROR>> Error appending lines: {str(e)}[/]")
         return False
@@ -83,12 +77,7 @@ def append_lines(file_path, new_data):
 def insert_lines(file_path, new_data, line_start):
     new_data_arr = [l + '\n' for l in new_data.split('\n')]
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            lines = file.readlines()
-        new_lines = lines[:line_start-1] + new_data_arr + lines[line_start-1:]
-        with open(file_path, 'w', encoding='utf-8', newline='\n') as file:
-            file.writelines(new_lines)
-        return True
+        return splice_file(file_path, [(line_start, 0, new_data_arr)])
     except Exception as e:
         err_console.print(f"[error]<<Error>> Error inserting lines: {str(e)}[/]")
         return False
@@ -114,23 +103,55 @@ def eval_string_float(text):
     except Exception as e:
         err_console.print(f"[error]<<ERROR> Error converting expression to float: {str(e)}[/]")
 
-def get_pending(txns, beans, acct):
-    pending = []
-    for txn in txns:
-        found = False
-        for bean in beans:
-            for post in bean.entry.postings:
-                if 'rec' in post.meta and post.meta['rec'] == txn.id:
-                    found = True
-                    break
-        if not found:
-            pending.append(txn)
-    return pending
-
-def get_matches(txn, beans, acct):
-    matches = []
-    for bean in beans:
-        for post in bean.entry.postings:
-            if post.account == acct and 'rec' not in post.meta and abs(post.units.number) == dec(txn.abs_amount):
-                matches.append(bean)
-    return matches
+def get_pending(txns, ledger, acct):
+    return [txn for txn in txns if not ledger.has_rec(txn.id)]
+
+def payee_similarity(a, b):
+    if not a or not b: return 0.0
+    return SequenceMatcher(None, a.lower(), b.lower()).ratio()
+
+def get_matches(txn, ledger, acct, days=0):
+    txn_date = date.fromisoformat(txn.date)
+    ranked = {}
+    for post_date, seq, bean, post in ledger.unreconciled_postings(acct, txn.abs_amount, txn_date, days):
+        if bean in ranked: continue
+        ranked[bean] = (abs((post_date - txn_date).days), -payee_similarity(txn.payee, bean.entry.payee or bean.entry.narration), seq)
+    return sorted(ranked, key=ranked.get)
+
+def reconcile_pairs(txns, ledger, acct, days=0):
+    """
+    Pair transactions with unreconciled postings one-to-one across all of txns
+
+    Candidates share the account and exact amount. Pairs are taken best first
+    by (date difference, payee similarity), and a pair is only kept when no
+    other free transaction or posting ties it, so ambiguous ones are left out.
+    """
+    edges = []
+    posts = {}
+    for ti, txn in enumerate(txns):
+        txn_date = date.fromisoformat(txn.date)
+        for post_date, seq, bean, post in ledger.unreconciled_postings(acct, txn.abs_amount, txn_date, days):
+            pk = posts.setdefault(id(post), (seq, bean, post))[0]
+            score = (abs((post_date - txn_date).days), -payee_similarity(txn.payee, bean.entry.payee or bean.entry.narration))
+            edges.append((score, ti, pk))
+    edges.sort()
+    by_seq = {seq: (bean, post) for seq, bean, post in posts.values()}
+    taken_txns, taken_posts = set(), set()
+    pairs = []
+    i = 0
+    while i < len(edges):
+        # Edges with the same score are decided together so ties can be seen
+        j = i
+        while j < len(edges) and edges[j][0] == edges[i][0]: j += 1
+        group = [(ti, pk) for score, ti, pk in edges[i:j] if ti not in taken_txns and pk not in taken_posts]
+        txn_degree, post_degree = {}, {}
+        for ti, pk in group:
+            txn_degree[ti] = txn_degree.get(ti, 0) + 1
+            post_degree[pk] = post_degree.get(pk, 0) + 1
+        for ti, pk in group:
+            if txn_degree[ti] == 1 and post_degree[pk] == 1:
+                pairs.append((txns[ti],) + by_seq[pk])
+            taken_txns.add(ti)
+            taken_posts.add(pk)
+        i = j
+    return pairs
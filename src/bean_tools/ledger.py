@@ -2,33 +2,219 @@ from beancount import loader
 from beancount.core.data import Transaction, Posting, Open, Query
 from beancount.core.amount import Amount
 from beancount.parser import printer
-from .helpers import cur, dec, del_spaces, set_from_sets
-from decimal import Decimal
-from pathlib import Path
-from .prompts import err_console
-import datetime
+from .helpers import cur, dec, del_spaces, append_lines
+from decimal import Decimal, ROUND_HALF_UP
+from .prompts import console, err_console
+from .cache import ledger_cache_get, ledger_cache_set, file_stamps, parse_stamps
+from .edits import shift_line
+from .fileio import splice_file, line_count
+import bisect, datetime, gc, itertools, os, time
+
+CENTS = Decimal('0.01')
 
 class Ledger:
-    def __init__(self, entries, errors, options):
+    def __init__(self, entries, errors, options, stamps=None):
         self.title = options.get('title', 'Unknown')
         self.entries = entries
         self.errors = errors
         self.options = options
         currency = options.get('operating_currency', [])
         self.currency = currency[0] if len(currency) else ''
-        self.transactions = [Bean(t) for t in entries if isinstance(t, Transaction)]
-        self.accounts = [o.account for o in entries if isinstance(o, Open)]
-        self.tags = set_from_sets([t.tags for t in entries if isinstance(t, Transaction)])
-        self.links = set_from_sets([t.links for t in entries if isinstance(t, Transaction)])
         self.errors = [str(err) for err in errors] if errors else []
-        self.payees = sorted(set([t.payee for t in entries if isinstance(t, Transaction) and t.payee]))
-        self.queries = [q for q in entries if isinstance(q, Query)]
+        self.stamps = stamps if stamps is not None else file_stamps(options.get('include', []))
+        self.transactions = []
+        self.accounts = []
+        self.queries = []
+        self.recs = {}
+        self.rec_duplicates = []
+        self.unreconciled = {}
+        self.unreconciled_keys = {}
+        self.unreconciled_seq = 0
+        # Beans appended in the edit session by file, with their append index, until written
+        self.unplaced = {}
+        # Beans written since the load, their entries are not in self.entries
+        self.inserted = []
+        self.by_tag = {}
+        self.by_link = {}
+        self.bean_labels = {}
+        self.tags = []
+        self.links = []
+        payees = set()
+        # Nothing built here is garbage, skip the collector passes while allocating
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for entry in entries:
+                if isinstance(entry, Transaction):
+                    bean = Bean(entry)
+                    self.transactions.append(bean)
+                    if entry.payee: payees.add(entry.payee)
+                    self.index_bean(bean, new=True)
+                elif isinstance(entry, Open):
+                    self.accounts.append(entry.account)
+                elif isinstance(entry, Query):
+                    self.queries.append(entry)
+        finally:
+            if gc_enabled: gc.enable()
+        self.payees = sorted(payees)
+
+    def index_bean(self, bean, new=False):
+        if not new: self.unindex_unreconciled(bean)
+        self.index_labels(bean)
+        keys = []
+        # A bean without a location cannot be rewritten, so it is never offered as a match
+        located = 'filename' in bean.entry.meta and 'lineno' in bean.entry.meta
+        for post in bean.entry.postings:
+            if not post.meta or 'rec' not in post.meta:
+                if not located or post.units is None or post.units.number is None: continue
+                key = (post.account, post.units.number.copy_abs().quantize(CENTS, rounding=ROUND_HALF_UP))
+                self.unreconciled_seq += 1
+                bisect.insort(self.unreconciled.setdefault(key, []), (bean.entry.date, self.unreconciled_seq, bean, post))
+                keys.append(key)
+                continue
+            rec = post.meta['rec']
+            if rec in self.recs and self.recs[rec][0] is not bean:
+                self.rec_duplicates.append(f"Duplicate rec '{rec}': {self.recs[rec][0].print_head()} | {bean.print_head()}")
+                continue
+            self.recs[rec] = (bean, post)
+        if keys: self.unreconciled_keys[bean] = keys
+
+    def index_labels(self, bean):
+        # Tag and link -> beans in ledger order, the sorted tags and links lists feed completion
+        entry = bean.entry
+        old = self.bean_labels.get(bean)
+        if old is None and not entry.tags and not entry.links: return
+        labels = (frozenset(entry.tags or ()), frozenset(entry.links or ()))
+        if old == labels: return
+        if old is not None:
+            for index, keys in zip((self.by_tag, self.by_link), old):
+                for key in keys:
+                    index[key].remove(bean)
+                    if not index[key]: del index[key]
+        for index, names, keys in zip((self.by_tag, self.by_link), (self.tags, self.links), labels):
+            for key in keys:
+                if key not in index:
+                    index[key] = []
+                    insort_unique(names, key)
+                index[key].append(bean)
+        if labels[0] or labels[1]: self.bean_labels[bean] = labels
+        else: self.bean_labels.pop(bean, None)
+
+    def tagged(self, tag):
+        return self.by_tag.get(tag, [])
+
+    def linked(self, link):
+        return self.by_link.get(link, [])
+
+    def unindex_unreconciled(self, bean):
+        for key in self.unreconciled_keys.pop(bean, []):
+            self.unreconciled[key] = [item for item in self.unreconciled[key] if item[2] is not bean]
+
+    def unreconciled_postings(self, account, amount, date=None, days=0):
+        postings = self.unreconciled.get((account, dec(amount)), [])
+        if date is None or not days: return postings
+        start = bisect.bisect_left(postings, (date - datetime.timedelta(days=days),))
+        end = bisect.bisect_left(postings, (date + datetime.timedelta(days=days+1),))
+        return postings[start:end]
+
+    def has_rec(self, rec):
+        return rec in self.recs
+
+    def is_stale(self):
+        return file_stamps(self.stamps) != self.stamps
+
+    def restamp(self, filename):
+        filename = os.path.abspath(filename)
+        if filename in self.stamps:
+            self.stamps.update(file_stamps([filename]))
+
+    def add_bean(self, bean):
+        self.transactions.append(bean)
+        self.index_bean(bean, new=True)
+        if bean.entry.payee: insort_unique(self.payees, bean.entry.payee)
+        for post in bean.entry.postings:
+            if post.account not in self.accounts: self.accounts.append(post.account)
+
+    def insert(self, bean, output=None, session=None):
+        # Returns the entry text to buffer for stdout when there is no output file
+        self.add_bean(bean)
+        if not output: return f"\n{bean.print()}"
+        if session is not None and self.includes(output):
+            filename = os.path.abspath(output)
+            if session.append(filename, f"\n{bean.print()}"):
+                self.unplaced.setdefault(filename, []).append((bean, len(session.appends[filename]) - 1))
+        elif self.includes(output):
+            start = line_count(output) + 1
+            if append_lines(output, bean.print()):
+                self.restamp(output)
+                self.place(bean, os.path.abspath(output), start + 1)
+        else: append_lines(output, bean.print())
+        return ''
+
+    def place(self, bean, filename, lineno):
+        # The appended text starts with a blank line, the entry begins on the next one
+        bean.update(meta={**bean.entry.meta, 'filename': filename, 'lineno': lineno})
+        self.inserted.append(bean)
+        self.index_bean(bean)
+
+    def file_metas(self, filename):
+        for entry in itertools.chain(self.entries, (bean.entry for bean in self.inserted)):
+            meta = entry.meta
+            if meta and meta.get('filename') == filename and 'lineno' in meta: yield meta
+
+    def shift_lines(self, filename, after, delta):
+        if not delta: return
+        for meta in self.file_metas(filename):
+            if meta['lineno'] > after: meta['lineno'] += delta
+
+    def includes(self, filename):
+        return os.path.abspath(filename) in self.stamps
+
+    def replace(self, bean, session=None, checkpoint=True):
+        result = bean.replace(session)
+        if not result: return False
+        if session is None:
+            old_count, new_count = result
+            self.shift_lines(bean.entry.meta['filename'], bean.entry.meta['lineno'], new_count - old_count)
+            self.restamp(bean.entry.meta['filename'])
+        self.index_bean(bean)
+        if checkpoint and session is not None and session.checkpoint and len(session) >= session.checkpoint:
+            self.commit(session)
+        return True
+
+    def commit(self, session):
+        if not len(session): return
+        for filename, shifts in session.commit().items():
+            for meta in self.file_metas(filename):
+                meta['lineno'] = shift_line(meta['lineno'], shifts)
+            self.restamp(filename)
+        # Appends dropped with a changed file stay in the journal and out of matching
+        for filename, beans in self.unplaced.items():
+            starts = session.append_starts.get(filename)
+            if starts is None: continue
+            for bean, i in beans: self.place(bean, filename, starts[i] + 1)
+        self.unplaced = {}
 
 class Bean:
+    __slots__ = ('_entry', '_amount')
+
     def __init__(self, entry):
-        self.entry = entry
-        self.amount = 0.0
-        self.total()
+        self._entry = entry
+        self._amount = None
+
+    @property
+    def entry(self):
+        return self._entry
+
+    @entry.setter
+    def entry(self, entry):
+        self._entry = entry
+        self._amount = None
+
+    @property
+    def amount(self):
+        if self._amount is None: return self.total()
+        return self._amount
 
     def __str__(self):
         return printer.format_entry(self.entry)
@@ -60,10 +246,11 @@ class Bean:
         return links
 
     def total(self):
-        self.amount = 0.0
+        amount = 0.0
         for posting in self.entry.postings:
-            self.amount += float(posting.units.number) if posting.units and posting.units.number > 0 else 0.0
-        # self.remaining = self.limit - self.amount
+            amount += float(posting.units.number) if posting.units and posting.units.number > 0 else 0.0
+        self._amount = amount
+        return amount
 
     def add_posting(self, posting):
         post_i = -1
@@ -76,11 +263,13 @@ class Bean:
         new_post = Posting(posting["account"], Amount(post_amount, posting["currency"]), None, None, None, {})
         if post_i >= 0: self.entry.postings[post_i] = new_post
         else: self.entry.postings.append(new_post)
-        self.total()
+        self._amount = None
 
     def update(self, meta=None, date=None, flag=None, payee=None, narration=None, tags=None, links=None, postings=None):
         if meta is None: meta = self.entry.meta
         if date is None: date = self.entry.date
+        # Prompted dates come in as text, the indexes compare real dates
+        elif isinstance(date, str): date = datetime.date.fromisoformat(date)
         if flag is None: flag = self.entry.flag
         if payee is None: payee = self.entry.payee
         if narration is None: narration = self.entry.narration
@@ -88,27 +277,42 @@ class Bean:
         if links is None: links = self.entry.links
         if postings is None: postings = self.entry.postings
         self.entry = Transaction(meta, date, flag, payee, narration, tags, links, postings)
-        self.total()
 
-    def replace(self):
+    def replace(self, session=None):
         if not 'filename' in self.entry.meta or not 'lineno' in self.entry.meta:
             return False
         try:
-            with open(Path(self.entry.meta['filename']), 'r', encoding='utf-8') as file:
-                lines = file.readlines()
-            txn_end = [l.strip() for l in lines].index('', self.entry.meta['lineno'] + 1)
-            new_lines = lines[:self.entry.meta['lineno']-1] + [line + '\n' for line in self.print().strip().split('\n')] + lines[txn_end:]
-            with open(self.entry.meta['filename'], 'w', encoding='utf-8', newline='\n') as file:
-                file.writelines(new_lines)
-            return True
+            if session is not None:
+                old_count = session.entry_count(self.entry.meta['filename'], self.entry.meta['lineno'])
+                bean_text = self.print().strip()
+                if not session.replace(self.entry.meta['filename'], bean_text, self.entry.meta['lineno'], old_count):
+                    return False
+                return old_count, len(bean_text.split('\n'))
+            bean_lines = [line + '\n' for line in self.print().strip().split('\n')]
+            report = splice_file(self.entry.meta['filename'], [(self.entry.meta['lineno'], None, bean_lines)])
+            return report.counts[0], len(bean_lines)
         except Exception as e:
             err_console.print(f"[error]<<ERROR>> Error replacing transaction: {str(e)}[/]")
             return False
 
-def ledger_load(ledger_path):
+def ledger_load(ledger_path, use_cache=True):
     try:
-        entries, errors, options = loader.load_file(ledger_path)
-        return Ledger(entries, errors, options)
+        start = time.perf_counter()
+        cached, includes = ledger_cache_get(ledger_path) if use_cache else (None, [os.path.abspath(ledger_path)])
+        if cached is not None:
+            entries, errors, options = cached
+            stamps = None
+            console.print(f"Ledger cache [pos]hit[/] ([number]{time.perf_counter() - start:.2f}[/]s)")
+        else:
+            before = file_stamps(includes)
+            # Without our cache the parse is fresh, beancount's own pickle cache is skipped too
+            loader.initialize(use_cache and os.getenv('BEANCOUNT_DISABLE_LOAD_CACHE') is None)
+            entries, errors, options = loader.load_file(ledger_path)
+            stamps = parse_stamps(before, options.get('include', [ledger_path]))
+            if use_cache:
+                ledger_cache_set(ledger_path, entries, errors, options, stamps)
+                console.print(f"Ledger cache [warning]miss[/] ([number]{time.perf_counter() - start:.2f}[/]s)")
+        return Ledger(entries, errors, options, stamps)
     except FileNotFoundError:
         err_console.print(f"[error]Error: File {ledger_path} not found[/]")
         return None
@@ -116,8 +320,12 @@ def ledger_load(ledger_path):
         err_console.print(f"[error]Error parsing Beancount file: {str(e)}[/]")
         return None
 
+def insort_unique(arr, item):
+    i = bisect.bisect_left(arr, item)
+    if i == len(arr) or arr[i] != item: arr.insert(i, item)
+
 def ledger_bean(txn, account_id, flag):
-    return Bean(Transaction({}, txn.date, flag, txn.payee, '', [], [], []))
+    return Bean(Transaction({}, datetime.date.fromisoformat(txn.date), flag, txn.payee, '', [], [], []))
 
 def new_bean(meta={}, date=datetime.date.today(), flag='*', payee='', narration='', tags=[], links=[], postings=[]):
     return Bean(Transaction(meta, date, flag, payee, narration, tags, links, postings))
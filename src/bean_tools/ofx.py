@@ -1,23 +1,124 @@
-from .helpers import cur, dec, Transaction
-from ofxparse import OfxParser
+import codecs, glob, html, os, re
+from .helpers import Transaction
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from decimal import Decimal, ROUND_HALF_UP
-from .prompts import err_console
+from .prompts import console, err_console
+
+CHUNK_SIZE = 1 << 20
+OFX_TAG = re.compile(r'<(/?)([A-Za-z0-9_.]+)>([^<]*)')
+OFX_POSTED = re.compile(r'<DTPOSTED>\s*(\d+)')
+STATEMENTS = {'STMTRS': 'CHECKING', 'CCSTMTRS': 'CREDITCARD', 'INVSTMTRS': 'INVESTMENT'}
+ACCOUNTS = ('BANKACCTFROM', 'CCACCTFROM', 'INVACCTFROM')
 
 class Account:
-    def __init__(self, data):
-        self.account_id = data.account.account_id
-        self.account_type = data.account.account_type
-        self.institution = data.account.institution.organization if data.account.institution else 'Unknown'
-        self.transactions = [Transaction(id=t.id, date=t.date, payee=t.payee, amount=t.amount) for t in data.account.statement.transactions]
+    def __init__(self, account_id, account_type, institution, transactions=None):
+        self.account_id = account_id
+        self.account_type = account_type
+        self.institution = institution if institution else 'Unknown'
+        self.transactions = transactions if transactions is not None else []
 
-def ofx_load(ofx_path):
-    try:
-        # Open and parse the OFX file
-        with open(ofx_path, 'r') as file:
-            ofx = OfxParser.parse(file)
+def ofx_encoding(head):
+    # A byte order mark wins over any declaration and must not be read as text
+    if head.startswith(codecs.BOM_UTF8): return 'utf-8-sig'
+    # SGML files declare their charset in the header, XML ones in the prolog
+    if head.lstrip().startswith(b'<?xml'):
+        match = re.search(rb'encoding="([^"]+)"', head)
+        return match.group(1).decode('ascii') if match else 'utf-8'
+    if re.search(rb'CHARSET:\s*1252', head): return 'cp1252'
+    if re.search(rb'ENCODING:\s*UTF-8', head): return 'utf-8'
+    return 'latin-1'
+
+def ofx_segments(file):
+    # Yields (True, STMTTRN body) or (False, text between them) across chunk boundaries
+    # without reading the whole file, so only one chunk is held at a time
+    data = ''
+    pos = 0
+    eof = False
+    while True:
+        start = data.find('<STMTTRN>', pos)
+        end = data.find('</STMTTRN>', start) if start >= 0 else -1
+        if end >= 0:
+            if start > pos: yield False, data[pos:start]
+            yield True, data[start + 9:end]
+            pos = end + 10
+            continue
+        if eof:
+            if start >= 0:
+                if start > pos: yield False, data[pos:start]
+                yield True, data[start + 9:]
+            elif pos < len(data):
+                yield False, data[pos:]
+            return
+        # Keep an unfinished transaction or a partial opening tag for the next chunk
+        keep = start if start >= 0 else data.rfind('<', pos)
+        if keep < 0: keep = len(data)
+        if keep > pos: yield False, data[pos:keep]
+        chunk = file.read(CHUNK_SIZE)
+        if not chunk: eof = True
+        data = data[keep:] + chunk
+        pos = 0
+
+def ofx_date(value):
+    # Only the local calendar date is kept, times and zone offsets are dropped
+    return datetime.strptime(value[:8], '%Y%m%d')
+
+def ofx_stream(ofx_path, period=''):
+    """
+    Yield (Account, Transaction) for every STMTTRN in an OFX or QFX file
+
+    Handles SGML (unclosed leaf tags) and XML files. The Account is shared by
+    all transactions of one statement and has no transactions attached.
+    Transactions outside of period are skipped before they are built.
+    """
+    prefix = period.replace('-', '')
+    with open(ofx_path, 'rb') as file:
+        encoding = ofx_encoding(file.read(1024))
+    with open(ofx_path, 'r', encoding=encoding, errors='replace') as file:
+        account = None
+        institution = None
+        aggregate = None
+        for is_txn, text in ofx_segments(file):
+            if is_txn:
+                posted = OFX_POSTED.search(text)
+                if posted is None or not posted.group(1).startswith(prefix): continue
+                fields = {}
+                for closing, tag, value in OFX_TAG.findall(text):
+                    value = value.strip()
+                    if value and not closing and tag not in fields: fields[tag] = value
+                if 'TRNAMT' not in fields: continue
+                yield account, Transaction(
+                    id=fields.get('FITID', ''),
+                    date=ofx_date(fields['DTPOSTED']),
+                    payee=html.unescape(fields.get('NAME') or fields.get('PAYEE') or fields.get('MEMO', '')),
+                    amount=fields['TRNAMT'].replace(',', '.'))
+                continue
+            for closing, tag, value in OFX_TAG.findall(text):
+                if closing:
+                    if tag == aggregate: aggregate = None
+                elif tag in STATEMENTS:
+                    account = Account('', STATEMENTS[tag], institution)
+                elif tag in ACCOUNTS or tag == 'FI':
+                    aggregate = tag
+                elif aggregate == 'FI' and tag == 'ORG':
+                    institution = html.unescape(value.strip())
+                    if account is not None: account.institution = institution
+                elif aggregate in ACCOUNTS and account is not None:
+                    if tag == 'ACCTID': account.account_id = value.strip()
+                    elif tag == 'ACCTTYPE': account.account_type = value.strip()
+
+def ofx_accounts(ofx_path, period=''):
+    # One Account per statement account id, statements for the same account are merged
+    accounts = {}
+    for account, txn in ofx_stream(ofx_path, period):
+        accounts.setdefault(account.account_id, Account(account.account_id, account.account_type, account.institution)).transactions.append(txn)
+    return list(accounts.values())
 
-        return Account(ofx)
+def ofx_load(ofx_path, period=''):
+    try:
+        accounts = ofx_accounts(ofx_path, period)
+        if not accounts:
+            return Account('', '', None)
+        return accounts[0]
 
     except FileNotFoundError:
         err_console.print(f"[error]Error: File {ofx_path} not found.[/]")
@@ -25,3 +126,54 @@ def ofx_load(ofx_path):
     except Exception as e:
         err_console.print(f"[error]Error parsing OFX file: {str(e)}[/]")
         return None
+
+def ofx_paths(patterns):
+    # Expands glob patterns the shell left alone, missing plain paths are returned as is
+    paths = []
+    for pattern in patterns:
+        pattern = os.path.expanduser(str(pattern))
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            path = os.path.abspath(path)
+            if path not in paths: paths.append(path)
+    return paths
+
+def ofx_file(ofx_path, period=''):
+    # Runs in worker processes, so errors are returned rather than printed
+    try:
+        return ofx_accounts(ofx_path, period), None
+    except Exception as e:
+        return [], str(e)
+
+def ofx_files_load(ofx_paths, period='', jobs=0):
+    """
+    Parse OFX files in a process pool and merge their statements per account
+
+    Overlapping downloads repeat transactions, so they are deduplicated by
+    FITID within each account, keeping the first file's copy.
+    """
+    if len(ofx_paths) > 1:
+        with ProcessPoolExecutor(max_workers=jobs or None) as pool:
+            results = list(pool.map(ofx_file, ofx_paths, [period] * len(ofx_paths)))
+    else:
+        results = [ofx_file(path, period) for path in ofx_paths]
+    accounts = {}
+    fitids = {}
+    duplicates = 0
+    for path, (file_accounts, error) in zip(ofx_paths, results):
+        if error is not None:
+            err_console.print(f"[error]Error parsing OFX file {path}: {error}[/]")
+            continue
+        for account in file_accounts:
+            merged = accounts.setdefault(account.account_id, Account(account.account_id, account.account_type, account.institution))
+            seen = fitids.setdefault(account.account_id, set())
+            for txn in account.transactions:
+                if txn.id:
+                    if txn.id in seen:
+                        duplicates += 1
+                        continue
+                    seen.add(txn.id)
+                merged.transactions.append(txn)
+    if duplicates:
+        console.print(f"Dropped [number]{duplicates}[/] duplicate OFX transactions")
+    return list(accounts.values())
@@ -0,0 +1,174 @@
+import atexit, bisect, os, re
+from .helpers import get_json, set_json
+from .prompts import err_console
+
+RULE_TYPES = ('exact', 'prefix', 'regex', 'fuzzy')
+# Numbered backreferences point at the wrong group once patterns are combined
+BACKREFERENCE = re.compile(r'(?<!\\)(?:\\\\)*\\[1-9]')
+
+class PayeeStore:
+    def __init__(self, json_path, batch=25, rules=None):
+        self.json_path = json_path
+        self.batch = batch
+        self.rules = rules
+        self.dirty = 0
+        self.payees = get_json(json_path, default={})
+        self.raw_payees = {}
+        for raw, payee in self.payees.items():
+            self.raw_payees.setdefault(payee, set()).add(raw)
+        self.names = sorted(self.raw_payees)
+        atexit.register(self.flush)
+
+    def __contains__(self, raw):
+        return raw in self.payees
+
+    def __len__(self):
+        return len(self.payees)
+
+    def get(self, raw):
+        return self.payees.get(raw)
+
+    def resolve(self, raw):
+        payee = self.payees.get(raw)
+        if payee is None and self.rules is not None:
+            payee = self.rules.normalize(raw)
+        return payee
+
+    def set(self, raw, payee):
+        old = self.payees.get(raw)
+        if old == payee: return
+        if old is None and self.rules is not None and self.rules.normalize(raw) == payee: return
+        if old is not None:
+            self.raw_payees[old].discard(raw)
+            if not self.raw_payees[old]:
+                del self.raw_payees[old]
+                self.names.remove(old)
+        if payee not in self.raw_payees:
+            bisect.insort(self.names, payee)
+        self.raw_payees.setdefault(payee, set()).add(raw)
+        self.payees[raw] = payee
+        self.dirty += 1
+        if self.dirty >= self.batch:
+            self.flush()
+
+    def flush(self):
+        if not self.dirty: return
+        try:
+            set_json(self.payees, self.json_path)
+            self.dirty = 0
+        except Exception as e:
+            err_console.print(f"[error]<<ERROR>> Error saving payees: {str(e)}[/]")
+
+class PayeeRules:
+    """
+    Normalize raw bank payees with exact, prefix, regex and fuzzy token rules
+
+    Rules are tried in that order of type. Within a type the first exact or
+    regex rule in file order wins, the longest matching prefix wins and the
+    best scoring fuzzy rule wins, ties going to the earlier rule. Results are
+    memoized per raw payee.
+    """
+    def __init__(self, rules, threshold=0.8):
+        self.threshold = threshold
+        self.exact = {}
+        self.prefixes = []
+        self.regexes = []
+        self.fuzzy = []
+        self.tokens = {}
+        self.memo = {}
+        for i, rule in enumerate(rules):
+            match = rule.get('match', 'exact') if isinstance(rule, dict) else None
+            if match not in RULE_TYPES or not rule.get('pattern') or not rule.get('payee'):
+                err_console.print(f"[error]Invalid payee rule {i}: {rule}[/]")
+                continue
+            pattern, payee = rule['pattern'], rule['payee']
+            if match == 'exact':
+                self.exact.setdefault(pattern.casefold(), payee)
+            elif match == 'prefix':
+                self.prefixes.append((pattern, payee))
+            elif match == 'regex':
+                try:
+                    self.regexes.append((re.compile(pattern, re.IGNORECASE), payee))
+                except re.error as e:
+                    err_console.print(f"[error]Invalid payee rule {i} regex: {str(e)}[/]")
+            else:
+                tokens = payee_tokens(pattern)
+                if not tokens: continue
+                for token in tokens:
+                    self.tokens.setdefault(token, []).append(len(self.fuzzy))
+                self.fuzzy.append((tokens, float(rule.get('threshold', threshold)), payee))
+        self.prefix_payees, self.prefix_re = self.compile_prefixes()
+        self.regex_payees, self.regex_re = self.compile_regexes()
+
+    def __len__(self):
+        return len(self.exact) + len(self.prefixes) + len(self.regexes) + len(self.fuzzy)
+
+    def compile_prefixes(self):
+        # Longest prefixes first so the alternation prefers the most specific rule
+        if not self.prefixes: return [], None
+        ordered = sorted(self.prefixes, key=lambda p: -len(p[0]))
+        alternatives = '|'.join(f"(?P<p{i}>{re.escape(prefix)})" for i, (prefix, payee) in enumerate(ordered))
+        return [payee for prefix, payee in ordered], re.compile(f"(?:{alternatives})", re.IGNORECASE)
+
+    def compile_regexes(self):
+        # Each alternative scans the whole payee before the next one is tried,
+        # so the first matching rule in file order wins
+        if not self.regexes: return [], None
+        if any(BACKREFERENCE.search(r.pattern) for r, payee in self.regexes):
+            return [payee for r, payee in self.regexes], None
+        alternatives = '|'.join(f".*?(?:{r.pattern})(?P<r{i}>)" for i, (r, payee) in enumerate(self.regexes))
+        try:
+            combined = re.compile(f"^(?:{alternatives})", re.IGNORECASE | re.DOTALL)
+        except re.error:
+            # Patterns with inline flags or repeated group names cannot be combined
+            return [payee for r, payee in self.regexes], None
+        return [payee for r, payee in self.regexes], combined
+
+    def normalize(self, raw):
+        if raw in self.memo: return self.memo[raw]
+        payee = self.match(raw)
+        self.memo[raw] = payee
+        return payee
+
+    def match(self, raw):
+        if not raw: return None
+        folded = raw.casefold()
+        if folded in self.exact: return self.exact[folded]
+        if self.prefix_re is not None:
+            m = self.prefix_re.match(raw)
+            if m: return self.prefix_payees[int(m.lastgroup[1:])]
+        if self.regex_re is not None:
+            m = self.regex_re.match(raw)
+            if m: return self.regex_payees[int(m.lastgroup[1:])]
+        elif self.regexes:
+            for regex, payee in self.regexes:
+                if regex.search(raw): return payee
+        if self.fuzzy:
+            return self.match_fuzzy(payee_tokens(raw))
+        return None
+
+    def match_fuzzy(self, tokens):
+        hits = {}
+        for token in tokens:
+            for i in self.tokens.get(token, ()):
+                hits[i] = hits.get(i, 0) + 1
+        best, best_score = None, 0.0
+        for i, count in sorted(hits.items()):
+            rule_tokens, threshold, payee = self.fuzzy[i]
+            score = count / len(rule_tokens)
+            if score >= threshold and score > best_score:
+                best, best_score = payee, score
+        return best
+
+def payee_tokens(text):
+    # Words without digits, reference numbers and store ids vary per transaction
+    return set(t for t in re.findall(r'[a-z0-9]+', text.casefold()) if not any(c.isdigit() for c in t))
+
+def payee_rules_load(json_path):
+    if not json_path or not os.path.exists(json_path):
+        return None
+    rules = get_json(json_path, default=[], overwrite_invalid=False)
+    if not isinstance(rules, list):
+        err_console.print(f"[error]Invalid payee rules file {json_path}, expected a list of rules[/]")
+        return None
+    return PayeeRules(rules)
@@ -0,0 +1,122 @@
+import os, re
+from decimal import Decimal, InvalidOperation
+from .helpers import dec, get_json
+from .ledger import ledger_bean
+from .prompts import err_console
+
+MATCH_TYPES = ('exact', 'prefix', 'regex')
+
+class ImportRule:
+    def __init__(self, rule):
+        self.match = rule.get('match', 'exact')
+        self.pattern = rule['pattern']
+        self.account = rule.get('account')
+        self.min = Decimal(str(rule['min'])) if rule.get('min') is not None else None
+        self.max = Decimal(str(rule['max'])) if rule.get('max') is not None else None
+        self.payee = rule.get('payee')
+        self.narration = rule.get('narration', '')
+        self.flag = rule.get('flag')
+        self.tags = set(rule.get('tags', []))
+        self.links = set(rule.get('links', []))
+        self.postings = []
+        remainder = 0
+        for posting in rule['postings']:
+            amount = posting.get('amount')
+            if amount is None:
+                remainder += 1
+            elif isinstance(amount, str) and amount.endswith('%'):
+                amount = (amount, Decimal(amount[:-1]) / 100)
+            else:
+                amount = Decimal(str(amount))
+            self.postings.append((posting['account'], amount))
+        if remainder > 1:
+            raise ValueError("only one posting may leave out its amount")
+        if self.match == 'regex':
+            self.regex = re.compile(self.pattern, re.IGNORECASE)
+        elif self.match == 'prefix':
+            self.regex = re.compile(re.escape(self.pattern), re.IGNORECASE)
+        else:
+            self.regex = None
+
+    def matches_payee(self, payee):
+        if not payee: return False
+        if self.match == 'exact': return payee.casefold() == self.pattern.casefold()
+        if self.match == 'prefix': return self.regex.match(payee) is not None
+        return self.regex.search(payee) is not None
+
+    def matches_amount(self, amount):
+        if self.min is not None and amount < self.min: return False
+        if self.max is not None and amount > self.max: return False
+        return True
+
+    def bean(self, txn, account, payee, flag, currency):
+        # Template amounts are shares of the absolute total, signed against the bank posting
+        total = dec(txn.abs_amount)
+        sign = 1 if txn.amount < 0 else -1
+        bean = ledger_bean(txn, account, self.flag or flag)
+        bean.update(payee=self.payee or payee or txn.payee, narration=self.narration, tags=set(self.tags), links=set(self.links))
+        left = total
+        remainder = None
+        for posting_account, amount in self.postings:
+            if amount is None:
+                remainder = posting_account
+                continue
+            share = dec(total * amount[1]) if isinstance(amount, tuple) else dec(amount)
+            left -= share
+            bean.add_posting({"account": posting_account, "amount": sign * share, "currency": currency})
+        # Without an open posting the last one absorbs rounding so the entry balances
+        if remainder is None: remainder = self.postings[-1][0]
+        if left:
+            bean.add_posting({"account": remainder, "amount": sign * left, "currency": currency})
+        bean.add_posting({"account": account, "amount": dec(txn.amount), "currency": currency})
+        for post in bean.entry.postings:
+            if post.account == account:
+                post.meta.update({'rec': txn.id})
+                break
+        return bean
+
+class ImportRules:
+    """
+    Map payee patterns and amount ranges to transaction templates
+
+    The first rule in file order whose payee pattern, amount range and account
+    match a transaction is used. Payee pattern matches are memoized per payee
+    since bank payees repeat across thousands of transactions.
+    """
+    def __init__(self, rules):
+        self.rules = []
+        self.memo = {}
+        for i, rule in enumerate(rules):
+            if not isinstance(rule, dict) or rule.get('match', 'exact') not in MATCH_TYPES or not rule.get('pattern') or not rule.get('postings'):
+                err_console.print(f"[error]Invalid import rule {i}: {rule}[/]")
+                continue
+            try:
+                self.rules.append(ImportRule(rule))
+            except (KeyError, ValueError, InvalidOperation, re.error) as e:
+                err_console.print(f"[error]Invalid import rule {i}: {str(e)}[/]")
+
+    def __len__(self):
+        return len(self.rules)
+
+    def candidates(self, payee):
+        if payee not in self.memo:
+            self.memo[payee] = [rule for rule in self.rules if rule.matches_payee(payee)]
+        return self.memo[payee]
+
+    def match(self, txn, account, payee=None):
+        amount = dec(txn.abs_amount)
+        # Rules may be written against the normalized payee or the raw bank payee
+        for name in (payee, txn.payee) if payee and payee != txn.payee else (txn.payee,):
+            for rule in self.candidates(name):
+                if rule.account and rule.account != account: continue
+                if rule.matches_amount(amount): return rule
+        return None
+
+def import_rules_load(json_path):
+    if not json_path or not os.path.exists(json_path):
+        return None
+    rules = get_json(json_path, default=[], overwrite_invalid=False)
+    if not isinstance(rules, list):
+        err_console.print(f"[error]Invalid import rules file {json_path}, expected a list of rules[/]")
+        return None
+    return ImportRules(rules)
@@ -1,10 +1,12 @@
-import requests, os, sys, base64, binascii, datetime, json, typer
-from .helpers import Transaction, get_json
-from .prompts import cancel_toolbar, cancel_bindings, ValidOptions, console
-from dotenv import dotenv_values
-from prompt_toolkit import prompt, HTML
+import gzip, json, os, re, zlib
+from .helpers import Transaction, get_json, set_json
+from .fileio import atomic_write, append_file
+from .prompts import cancel_toolbar, cancel_bindings, ValidOptions, console, err_console
+from prompt_toolkit import prompt
 from datetime import datetime
 
+STORE_INDEX = 'index.json'
+
 class Account:
     def __init__(self, data):
         self.account_id = data['id']
@@ -17,19 +19,114 @@ class Account:
             amount=t['amount']
         ) for t in data['transactions']]
 
-def simplefin_load(simplefin_path):
-    data = get_json(simplefin_path)
-    if 'accounts' in data and len(data['accounts']):
+def store_file(account_id, compress=False):
+    name = re.sub(r'[^A-Za-z0-9_.-]', '_', account_id)
+    return f"{name}.ndjson.gz" if compress else f"{name}.ndjson"
+
+def store_chunks(transactions, compress=False):
+    # One compact JSON object per line, gzip output is streamed through a compressor
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    for txn in transactions:
+        line = json.dumps(txn, separators=(',', ':'), ensure_ascii=False) + '\n'
+        yield compressor.compress(line.encode('utf-8')) if compressor else line
+    if compressor: yield compressor.flush()
+
+def store_index(store_path):
+    index_path = os.path.join(store_path, STORE_INDEX)
+    if not os.path.exists(index_path): return {"errors": [], "accounts": []}
+    return get_json(index_path, overwrite_invalid=False)
+
+def store_write(store_path, data, compress=False):
+    """
+    Write SimpleFIN data as a store directory: one NDJSON partition per account and an index
+
+    The index holds the account details without transactions and is written
+    last, so it never names a partition that is not complete.
+    """
+    os.makedirs(store_path, exist_ok=True)
+    index = {"errors": data.get('errors', []), "accounts": []}
+    for account in data['accounts']:
+        file = store_file(account['id'], compress)
+        atomic_write(os.path.join(store_path, file), store_chunks(account['transactions'], compress))
+        index['accounts'].append(dict({k: v for k, v in account.items() if k != 'transactions'}, file=file, count=len(account['transactions'])))
+    set_json(index, os.path.join(store_path, STORE_INDEX))
+    return index
+
+def store_append(store_path, index, account, transactions, compress=False):
+    # Appends to an account partition, gzip partitions get a new gzip member
+    entry = next((e for e in index['accounts'] if e['id'] == account['id']), None)
+    if entry is None:
+        entry = {"file": store_file(account['id'], compress), "count": 0}
+        index['accounts'].append(entry)
+    entry.update({k: v for k, v in account.items() if k != 'transactions'})
+    if not transactions: return
+    chunks = list(store_chunks(transactions, entry['file'].endswith('.gz')))
+    os.makedirs(store_path, exist_ok=True)
+    append_file(os.path.join(store_path, entry['file']), b''.join(chunks) if entry['file'].endswith('.gz') else ''.join(chunks))
+    entry['count'] += len(transactions)
+
+def store_transactions(store_path, entry):
+    # Streams one partition, ids repeated by an interrupted sync are skipped
+    path = os.path.join(store_path, entry['file'])
+    if not os.path.exists(path): return
+    seen = set()
+    with (gzip.open(path, 'rt', encoding='utf-8') if path.endswith('.gz') else open(path, 'r', encoding='utf-8')) as file:
+        for line in file:
+            if not line.strip(): continue
+            txn = json.loads(line)
+            if txn['id'] in seen: continue
+            seen.add(txn['id'])
+            yield txn
+
+def simplefin_data(simplefin_path):
+    # Returns the account entries and a function that loads one of them as an Account,
+    # store directories only read the chosen account's partition
+    if os.path.isdir(simplefin_path):
+        index = store_index(simplefin_path)
+        if index is None:
+            err_console.print(f"[error]Invalid SimpleFIN store index in {simplefin_path}[/]")
+            return [], Account
+        return index['accounts'], lambda entry: Account(dict(entry, transactions=store_transactions(simplefin_path, entry)))
+    return get_json(simplefin_path).get('accounts', []), Account
+
+def simplefin_load(simplefin_path, headless=False):
+    accounts, load = simplefin_data(simplefin_path)
+    if headless and len(accounts) > 1:
+        err_console.print(f"[error]Found [number]{len(accounts)}[/] SimpleFIN accounts, headless import needs a file with a single account[/]")
+        return None
+    if headless and len(accounts):
+        return load(accounts[0])
+    if len(accounts):
         console.print(f"...SimpleFIN accounts available:")
-        for i, acct in enumerate(data['accounts']):
+        for i, acct in enumerate(accounts):
             console.print(f"   [{i}] {acct['org']['name']} - {acct['name']}")
         account_choice = prompt(
             f"\n...Select account to parse > ",
             bottom_toolbar = cancel_toolbar,
             key_bindings = cancel_bindings,
-            validator=ValidOptions([str(n) for n in range(len(data['accounts']))]),
+            validator=ValidOptions([str(n) for n in range(len(accounts))]),
             default="0"
         )
-        if account_choice and data['accounts'][int(account_choice)]:
-            return Account(data['accounts'][int(account_choice)])
+        if account_choice and accounts[int(account_choice)]:
+            return load(accounts[int(account_choice)])
     return None
+
+def simplefin_accounts(simplefin_path):
+    accounts, load = simplefin_data(simplefin_path)
+    return [load(acct) for acct in accounts]
+
+def simplefin_write(simplefin_path, accounts):
+    # Writes (account, transactions) pairs back out in SimpleFIN format so they can be imported later
+    data = {"errors": [], "accounts": [{
+        "id": account.account_id,
+        "name": account.account_type,
+        "org": {"name": account.institution},
+        "transactions": [{
+            "id": t.id,
+            "posted": int(datetime.strptime(t.date, '%Y-%m-%d').timestamp()),
+            "amount": f"{t.amount:.2f}",
+            "payee": t.payee,
+            "description": t.payee
+        } for t in transactions]
+    } for account, transactions in accounts]}
+    return set_json(data, simplefin_path)
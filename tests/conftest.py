@@ -0,0 +1,26 @@
+import pytest
+
+LEDGER = """option "title" "Test"
+option "operating_currency" "USD"
+
+2024-01-01 open Assets:Checking USD
+2024-01-01 open Liabilities:Card USD
+2024-01-01 open Expenses:Food USD
+2024-01-01 open Expenses:Power USD
+
+2024-01-05 * "Grocer" ""
+  Expenses:Food  45.00 USD
+  Assets:Checking  -45.00 USD
+
+2024-02-05 * "Grocer" ""
+  Expenses:Food  45.00 USD
+  Assets:Checking  -45.00 USD
+"""
+
+@pytest.fixture
+def ledger_path(tmp_path, monkeypatch):
+    # Keep the on-disk caches inside the test directory
+    monkeypatch.setenv('BEAN_TOOLS_CACHE_DIR', str(tmp_path / 'cache'))
+    path = tmp_path / 'main.beancount'
+    path.write_text(LEDGER, encoding='utf-8')
+    return path
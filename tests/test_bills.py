@@ -0,0 +1,155 @@
+import csv
+import json
+import pytest
+from beancount import loader
+from beancount.core.data import Transaction
+from typer.testing import CliRunner
+from bean_tools.bean_bills import bill_status
+from bean_tools.cli import app
+from bean_tools import edits
+from bean_tools.edits import edit_session
+from bean_tools.ledger import ledger_load
+from tests.test_import import simplefin_file
+
+BILLS = [
+    {"tag": "power", "account": "Expenses:Power", "liability": "Liabilities:Card", "amount": "60.00", "due": "10", "payee": "Power Co"},
+    {"tag": "water", "account": "Expenses:Water", "liability": "Liabilities:Card", "amount": "30.00", "due": "20", "payee": "Water Co"},
+    {"tag": "gas", "account": "Expenses:Water", "liability": "Liabilities:Card", "amount": "30.00", "due": "20", "payee": "Gas Co"},
+]
+
+# January power is paid, February power is unpaid and March power is pending
+LEDGER = """
+2024-01-01 open Expenses:Water USD
+
+2024-01-10 * "Power Co" "" #bill ^power-2024-01
+  Expenses:Power  60.00 USD
+  Liabilities:Card  -60.00 USD
+
+2024-01-12 * "Power Co" "" #payment ^power-2024-01
+  Liabilities:Card  60.00 USD
+  Assets:Checking  -60.00 USD
+
+2024-02-10 ! "Power Co" "" #bill ^power-2024-02
+  Expenses:Power  60.00 USD
+  Liabilities:Card  -60.00 USD
+
+2024-03-10 * "Power Co" "" #bill ^power-2024-03
+  Expenses:Power  61.50 USD
+  Liabilities:Card  -61.50 USD
+"""
+
+@pytest.fixture
+def bills_path(tmp_path, ledger_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with ledger_path.open('a', encoding='utf-8') as f: f.write(LEDGER)
+    path = tmp_path / 'bills.json'
+    path.write_text(json.dumps(BILLS), encoding='utf-8')
+    return path
+
+def bills(ledger_path, *args):
+    return CliRunner().invoke(app, ['bills', str(ledger_path), '--no-cache', *args])
+
+def beans(ledger_path):
+    entries, errors, options = loader.load_file(str(ledger_path))
+    assert not errors
+    return [entry for entry in entries if isinstance(entry, Transaction)]
+
+def test_batch_resumes_an_interrupted_session_without_prompting(ledger_path, bills_path, monkeypatch):
+    session = edit_session(ledger_path)
+    session.append(str(ledger_path), '\n2024-01-31 * "Interrupted" ""\n  Expenses:Food  1.00 USD\n  Assets:Checking  -1.00 USD\n')
+    monkeypatch.setattr('bean_tools.edits.prompt', lambda *args, **kwargs: pytest.fail('prompted to resume'))
+    result = bills(ledger_path, '--batch', '-m', '2024-04', '-o', str(ledger_path))
+    assert result.exit_code == 0, result.output
+    assert any(entry.payee == 'Interrupted' for entry in beans(ledger_path))
+
+def flags(ledger_path):
+    return {link: entry.flag for entry in beans(ledger_path) if 'bill' in entry.tags for link in entry.links}
+
+def test_auto_pay_matches_unpaid_bills_only(tmp_path, ledger_path, bills_path):
+    # The January payment is already linked, the February one pays the unpaid bill
+    simplefin = simplefin_file(tmp_path / 'data.json', {'A': [
+        ('p1', '2024-01-11', -60, 'POWER CO'),
+        ('p2', '2024-02-12', -60, 'POWER CO'),
+        ('p3', '2024-03-25', -60, 'POWER CO'),
+    ]})
+    result = bills(ledger_path, '-s', str(simplefin), '--from', '2024-01', '--to', '2024-03')
+    assert result.exit_code == 0, result.output
+    assert 'Matched 1 unpaid bills' in result.output and 'Paid 1 bills' in result.output
+    assert flags(ledger_path) == {'power-2024-01': '*', 'power-2024-02': '*', 'power-2024-03': '*'}
+
+def test_auto_pay_leaves_tied_bills_unpaid(tmp_path, ledger_path, bills_path):
+    with ledger_path.open('a', encoding='utf-8') as f: f.write("""
+2024-02-20 ! "Water Co" "" #bill ^water-2024-02
+  Expenses:Water  30.00 USD
+  Liabilities:Card  -30.00 USD
+
+2024-02-20 ! "Gas Co" "" #bill ^gas-2024-02
+  Expenses:Water  30.00 USD
+  Liabilities:Card  -30.00 USD
+""")
+    simplefin = simplefin_file(tmp_path / 'data.json', {'A': [('w1', '2024-02-21', -30, 'UTILITY')]})
+    result = bills(ledger_path, '-s', str(simplefin), '-m', '2024-02')
+    assert result.exit_code == 0, result.output
+    assert 'Matched 0 unpaid bills' in result.output
+    assert flags(ledger_path)['water-2024-02'] == '!' and flags(ledger_path)['gas-2024-02'] == '!'
+
+    # A payment closer to one of them pays that one
+    simplefin = simplefin_file(tmp_path / 'data.json', {'A': [('w1', '2024-02-21', -30, 'UTILITY'), ('w2', '2024-02-24', -30, 'UTILITY')]})
+    text = ledger_path.read_text(encoding='utf-8').replace('2024-02-20 ! "Gas Co"', '2024-02-25 ! "Gas Co"')
+    ledger_path.write_text(text, encoding='utf-8')
+    result = bills(ledger_path, '-s', str(simplefin), '-m', '2024-02')
+    assert 'Matched 2 unpaid bills' in result.output
+    assert flags(ledger_path)['water-2024-02'] == '*' and flags(ledger_path)['gas-2024-02'] == '*'
+
+def test_link_index_gives_bill_status(ledger_path, bills_path):
+    ledger_data = ledger_load(ledger_path, use_cache=False)
+    assert [bean.entry.date.month for bean in ledger_data.tagged('bill')] == [1, 2, 3]
+    assert [sorted(bean.entry.tags) for bean in ledger_data.linked('power-2024-01')] == [['bill'], ['payment']]
+    statuses = [bill_status(BILLS[0], ledger_data, month) for month in ('2024-01', '2024-02', '2024-03', '2024-04')]
+    assert [status['status'] for status in statuses] == ['paid', 'unpaid', 'pending', 'missing']
+    assert statuses[2]['amount'] == '61.50'
+
+    # Relabelled beans move between links
+    bean = ledger_data.linked('power-2024-03')[0]
+    bean.update(links={'power-2024-04'})
+    ledger_data.index_bean(bean)
+    assert ledger_data.linked('power-2024-03') == []
+    assert bill_status(BILLS[0], ledger_data, '2024-04')['bill_txn'] is bean
+    assert 'power-2024-04' in ledger_data.links
+
+def test_dashboard_matrix_and_exports(tmp_path, ledger_path, bills_path):
+    result = bills(ledger_path, '--from', '2024-01', '--to', '2024-03', '-x', str(tmp_path / 'bills.csv'))
+    assert result.exit_code == 0, result.output
+    lines = result.output.splitlines()
+    header = next(line for line in lines if line.split()[:1] == ['2024-01'])
+    assert header.split() == ['2024-01', '2024-02', '2024-03']
+    assert next(line for line in lines if line.startswith('power')).split('|')[1].split() == ['60.00', '60.00', '61.50']
+    assert next(line for line in lines if line.startswith('water')).split('|')[1].split() == ['-', '-', '-']
+    assert next(line for line in lines if line.startswith('total')).split('|')[1].split() == ['60.00', '60.00', '61.50']
+    assert 'Exported 9 bill months' in result.output
+
+    with open(tmp_path / 'bills.csv', encoding='utf-8', newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert [(row['tag'], row['month'], row['status']) for row in rows[:3]] == [('power', '2024-01', 'paid'), ('power', '2024-02', 'unpaid'), ('power', '2024-03', 'pending')]
+    assert rows[0]['due'] == '2024-01-10' and rows[0]['paid'] == '2024-01-12'
+    assert rows[3] == {'tag': 'water', 'month': '2024-01', 'status': 'missing', 'amount': '30.00', 'due': '2024-01-20', 'paid': ''}
+
+    result = bills(ledger_path, '--from', '2024-01', '--to', '2024-03', '-x', str(tmp_path / 'bills.json'))
+    exported = json.loads((tmp_path / 'bills.json').read_text(encoding='utf-8'))
+    assert [(row['tag'], row['status']) for row in exported] == [(row['tag'], row['status']) for row in rows]
+    assert exported[3]['paid'] is None
+
+def test_batch_writes_every_bill_in_one_commit(ledger_path, bills_path, monkeypatch):
+    writes = []
+    splice_file = edits.splice_file
+    monkeypatch.setattr(edits, 'splice_file', lambda path, *args: writes.append(path) or splice_file(path, *args))
+    result = bills(ledger_path, '--batch', '--from', '2024-02', '--to', '2024-04', '-p', 'power', '-o', str(ledger_path))
+    assert result.exit_code == 0, result.output
+    assert 'Inserted 7 and paid 1 bills from 2024-02 to 2024-04' in result.output
+    assert writes == [str(ledger_path)]
+    # Missing bills being paid are inserted cleared, the rest stay unpaid
+    assert flags(ledger_path) == {
+        'power-2024-01': '*', 'power-2024-02': '*', 'power-2024-03': '*', 'power-2024-04': '*',
+        'water-2024-02': '!', 'water-2024-03': '!', 'water-2024-04': '!',
+        'gas-2024-02': '!', 'gas-2024-03': '!', 'gas-2024-04': '!',
+    }
@@ -0,0 +1,61 @@
+import os
+import pickle
+from beancount import loader
+from beancount.core.data import Transaction
+from bean_tools.cache import ledger_cache_get
+from bean_tools.ledger import ledger_load
+
+def include(ledger_path, text):
+    include_path = ledger_path.parent / 'more.beancount'
+    include_path.write_text(text, encoding='utf-8')
+    with ledger_path.open('a', encoding='utf-8') as file: file.write('\ninclude "more.beancount"\n')
+    return include_path
+
+def test_cache_hits_until_an_include_changes(ledger_path):
+    include_path = include(ledger_path, '2024-03-01 * "Power" ""\n  Expenses:Power  10.00 USD\n  Assets:Checking  -10.00 USD\n')
+    assert ledger_cache_get(ledger_path)[0] is None
+    assert len(ledger_load(ledger_path).transactions) == 3
+    assert ledger_cache_get(ledger_path)[0] is not None
+    assert len(ledger_load(ledger_path).transactions) == 3
+
+    with include_path.open('a', encoding='utf-8') as file: file.write('\n2024-03-02 * "Power" ""\n  Expenses:Power  5.00 USD\n  Assets:Checking  -5.00 USD\n')
+    cached, includes = ledger_cache_get(ledger_path)
+    assert cached is None and str(include_path) in includes
+    assert len(ledger_load(ledger_path).transactions) == 4
+
+def test_edit_during_parse_is_not_cached(ledger_path, monkeypatch):
+    include_path = include(ledger_path, '')
+    # A cached ledger whose include changed, so the next load parses it
+    ledger_load(ledger_path)
+    os.utime(include_path, ns=(0, 0))
+
+    # The include is edited after the parser has read it
+    load_file = loader.load_file
+    def edited_load_file(filename):
+        result = load_file(filename)
+        include_path.write_text('2024-03-01 * "Power" ""\n  Expenses:Power  10.00 USD\n  Assets:Checking  -10.00 USD\n', encoding='utf-8')
+        return result
+    monkeypatch.setattr(loader, 'load_file', edited_load_file)
+    ledger_data = ledger_load(ledger_path)
+    assert len(ledger_data.transactions) == 2
+    assert ledger_data.is_stale()
+    assert ledger_cache_get(ledger_path)[0] is None
+
+    monkeypatch.setattr(loader, 'load_file', load_file)
+    assert len(ledger_load(ledger_path).transactions) == 3
+
+def test_relative_paths_share_an_entry(ledger_path, monkeypatch):
+    monkeypatch.chdir(ledger_path.parent)
+    ledger_load('./main.beancount')
+    assert ledger_cache_get('main.beancount')[0] is not None
+    assert ledger_cache_get(ledger_path)[0] is not None
+
+def test_no_cache_skips_the_beancount_pickle_cache(ledger_path):
+    # A pickle cache newer than the ledger that beancount would return as is
+    entries, errors, options = loader.load_file(str(ledger_path))
+    stale = [entry for entry in entries if not isinstance(entry, Transaction)]
+    pickle_path = ledger_path.parent / f".{ledger_path.name}.picklecache"
+    with open(pickle_path, 'wb') as file: pickle.dump((stale, errors, options), file)
+    stat = os.stat(ledger_path)
+    os.utime(pickle_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert len(ledger_load(ledger_path, use_cache=False).transactions) == 2
@@ -0,0 +1,11 @@
+import click
+import pytest
+from bean_tools.cli import app, COMMANDS
+from typer.main import get_command
+
+@pytest.mark.parametrize('name', COMMANDS)
+def test_options_do_not_share_flags(name):
+    group = get_command(app)
+    command = group.get_command(click.Context(group), name).load()
+    flags = [opt for param in command.params for opt in param.opts + param.secondary_opts]
+    assert sorted(set(flags)) == sorted(flags)
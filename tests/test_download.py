@@ -0,0 +1,118 @@
+import email.utils
+import json
+import pytest
+from typer.testing import CliRunner
+from tests.simplefin_server import serve
+from bean_tools import bean_download
+from bean_tools.bean_download import DAY, date_windows, simplefin_fetch
+from bean_tools.cli import app
+
+START = 1704067200  # 2024-01-01
+
+def account(id, transactions):
+    return {"id": id, "name": f"Account {id}", "currency": "USD", "balance": "0.00", "balance-date": 0, "org": {"name": "Test Bank"}, "transactions": transactions}
+
+def txn(id, day, amount=-10):
+    return {"id": id, "posted": START + day * DAY + 3600, "amount": str(amount), "description": "Grocer", "payee": "Grocer"}
+
+@pytest.fixture
+def bridge(tmp_path):
+    # One transaction a day for 100 days on two accounts, served locally
+    def start(data=None, **kwargs):
+        if data is None:
+            data = {"errors": [], "accounts": [account(a, [txn(f"{a}-{day}", day) for day in range(100)]) for a in ('A', 'B')]}
+        path = tmp_path / 'bridge.json'
+        path.write_text(json.dumps(data), encoding='utf-8')
+        server, access_url = serve(path, **kwargs)
+        servers.append(server)
+        return server, access_url
+    servers = []
+    yield start
+    for server in servers: server.shutdown()
+
+def ids(data):
+    return {account['id']: [t['id'] for t in account['transactions']] for account in data['accounts']}
+
+def test_date_windows():
+    assert date_windows(0, 10 * DAY, 3) == [(0, 10 * DAY)]
+    assert date_windows(START, START + 10 * DAY, 3) == [(START + i * DAY, START + min(i + 3, 10) * DAY) for i in (0, 3, 6, 9)]
+    assert date_windows(START, START + 10 * DAY, 0) == [(START, START + 10 * DAY)]
+
+def test_windows_are_fetched_and_merged_in_order(bridge):
+    server, access_url = bridge()
+    data, failed = simplefin_fetch(access_url, START, START + 100 * DAY, window_days=30, workers=3)
+    assert failed == []
+    assert ids(data) == {a: [f"{a}-{day}" for day in range(100)] for a in ('A', 'B')}
+    assert server.requests == 4
+    assert sorted(server.queries) == sorted(f"start-date={s}&end-date={e}" for s, e in date_windows(START, START + 100 * DAY, 30))
+    # Workers share pooled keep-alive connections
+    assert len(server.connections) <= 3
+
+def test_retries_honour_retry_after(bridge, monkeypatch):
+    server, access_url = bridge(fail_every=2)
+    delays = []
+    monkeypatch.setattr(bean_download.time, 'sleep', delays.append)
+    data, failed = simplefin_fetch(access_url, START, START + 100 * DAY, window_days=10, workers=2, retries=1, backoff=5)
+    assert failed == []
+    assert len(ids(data)['A']) == 100
+    # Every second window failed once and was retried after the server's Retry-After: 0
+    assert server.requests == 15
+    assert delays == [0.0] * 5
+
+def test_retries_back_off_exponentially(monkeypatch):
+    class Response:
+        status_code = 503
+        reason = 'Unavailable'
+        headers = {}
+    class Session:
+        def get(self, url, params, timeout): return Response()
+    delays = []
+    monkeypatch.setattr(bean_download.time, 'sleep', delays.append)
+    with pytest.raises(bean_download.requests.HTTPError):
+        bean_download.fetch_window(Session(), 'http://bridge/accounts', START, START + DAY, False, 3, 0.5)
+    assert delays == [0.5, 1.0, 2.0]
+
+@pytest.mark.parametrize('header, expected', [('2', 2.0), (None, 0.5), ('soon', 0.5), ('date', 30.0)])
+def test_retry_after_seconds_or_http_date(header, expected, monkeypatch):
+    monkeypatch.setattr(bean_download.time, 'time', lambda: 1704067200.0)
+    if header == 'date': header = email.utils.formatdate(1704067230, usegmt=True)
+    assert bean_download.retry_after(header, 0.5) == expected
+
+def test_duplicate_ids_across_windows_are_dropped(bridge):
+    # A pending transaction that posted again later keeps its id
+    server, access_url = bridge({"errors": ["stale balance"], "accounts": [account('A', [txn('a1', 1), txn('a2', 2), txn('a1', 40, -12)])]})
+    data, failed = simplefin_fetch(access_url, START, START + 60 * DAY, window_days=30)
+    assert ids(data) == {'A': ['a1', 'a2']}
+    assert data['accounts'][0]['transactions'][0]['amount'] == '-10'
+    assert data['errors'] == ['stale balance']
+
+def missing_days(failed):
+    # Which windows fail depends on the order requests reach the server
+    return sum(min(end, START + 100 * DAY) - start for start, end, error in failed) // DAY
+
+def test_failed_windows_are_reported(bridge):
+    server, access_url = bridge(fail_every=2)
+    data, failed = simplefin_fetch(access_url, START, START + 100 * DAY, window_days=30, retries=0)
+    windows = date_windows(START, START + 100 * DAY, 30)
+    assert len(failed) == 2
+    assert all((start, end) in windows and '503' in error for start, end, error in failed)
+    assert len(ids(data)['A']) == 100 - missing_days(failed)
+
+def download(tmp_path, monkeypatch, access_url, *args):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / '.env').write_text(f"ACCESS_URL={access_url}\n", encoding='utf-8')
+    return CliRunner().invoke(app, ['download', '-s', '2024-01-01', '-e', '2024-04-10', '-w', '30', *args])
+
+def test_partial_download_is_saved_and_fails(tmp_path, monkeypatch, bridge):
+    server, access_url = bridge(fail_every=2)
+    result = download(tmp_path, monkeypatch, access_url, '-r', '0')
+    assert result.exit_code == 1
+    assert 'the saved data is incomplete' in result.output
+    saved = json.loads((tmp_path / 'data.json').read_text(encoding='utf-8'))
+    assert 0 < len(saved['accounts'][0]['transactions']) < 100
+
+def test_partial_sync_writes_nothing(tmp_path, monkeypatch, bridge):
+    server, access_url = bridge(fail_every=2)
+    result = download(tmp_path, monkeypatch, access_url, '-r', '0', '--sync')
+    assert result.exit_code == 1
+    assert not (tmp_path / 'data.json').exists() and not (tmp_path / 'sync_state.json').exists()
@@ -0,0 +1,87 @@
+import os
+import pytest
+from bean_tools.edits import EditSession, edit_session, shift_line
+
+TEXT = """2024-01-05 * "Grocer" ""
+  Expenses:Food  45.00 USD
+  Assets:Checking  -45.00 USD
+
+2024-02-05 * "Grocer" ""
+  Expenses:Food  45.00 USD
+  Assets:Checking  -45.00 USD
+"""
+
+@pytest.fixture
+def journal(tmp_path):
+    return tmp_path / 'journal.jsonl'
+
+@pytest.fixture
+def beans(tmp_path):
+    path = tmp_path / 'beans.beancount'
+    path.write_text(TEXT, encoding='utf-8')
+    return str(path)
+
+def reconciled(rec):
+    return f'2024-01-05 * "Grocer" ""\n  Expenses:Food  45.00 USD\n  Assets:Checking  -45.00 USD\n    rec: "{rec}"'
+
+def test_entry_count_stops_at_blank_line(journal, beans):
+    session = EditSession(journal)
+    assert session.entry_count(beans, 1) == 3
+    assert session.entry_count(beans, 5) == 3
+
+def test_commit_writes_queued_edits_once(journal, beans):
+    session = EditSession(journal)
+    assert session.replace(beans, reconciled('a1'), 1, 3)
+    assert session.append(beans, '\n2024-03-01 * "Power" ""\n  Expenses:Power  10.00 USD\n  Assets:Checking  -10.00 USD\n')
+    shifts = session.commit()
+    text = open(beans, encoding='utf-8').read()
+    assert 'rec: "a1"' in text and '"Power"' in text
+    assert shift_line(5, shifts[os.path.abspath(beans)]) == 6
+    assert not journal.exists()
+
+def test_touch_keeps_queued_edits(journal, beans):
+    session = EditSession(journal)
+    session.replace(beans, reconciled('a1'), 1, 3)
+    stat = os.stat(beans)
+    os.utime(beans, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    session.commit()
+    assert 'rec: "a1"' in open(beans, encoding='utf-8').read()
+    assert session.take_dropped() == (0, 0)
+
+def test_changed_file_keeps_journal(journal, beans, tmp_path):
+    session = EditSession(journal)
+    other = tmp_path / 'other.beancount'
+    other.write_text(TEXT, encoding='utf-8')
+    session.replace(beans, reconciled('a1'), 1, 3)
+    with open(beans, 'a', encoding='utf-8') as file: file.write('\n; edited elsewhere\n')
+    session.commit()
+    assert 'rec: "a1"' not in open(beans, encoding='utf-8').read()
+    assert session.take_dropped() == (1, 0)
+    assert journal.exists()
+
+    # Later commits of other files keep the journal for recovery
+    session.replace(str(other), reconciled('b1'), 1, 3)
+    session.commit()
+    assert 'rec: "b1"' in other.read_text(encoding='utf-8')
+    assert journal.exists()
+
+def test_interrupted_session_resumes(journal, beans, monkeypatch):
+    monkeypatch.setattr('bean_tools.edits.cache_path', lambda *args, **kwargs: journal)
+    session = edit_session(beans)
+    session.replace(beans, reconciled('a1'), 1, 3)
+    session.insert(beans, '; inserted', 4)
+    assert 'rec:' not in open(beans, encoding='utf-8').read()
+
+    # A torn last record is ignored
+    with open(journal, 'a', encoding='utf-8') as file: file.write('{"file": ')
+    session = edit_session(beans, resume=True)
+    text = open(beans, encoding='utf-8').read()
+    assert 'rec: "a1"' in text and '; inserted\n\n2024-02-05' in text
+    assert not journal.exists()
+
+def test_interrupted_session_skips_changed_files(journal, beans, monkeypatch):
+    monkeypatch.setattr('bean_tools.edits.cache_path', lambda *args, **kwargs: journal)
+    edit_session(beans).replace(beans, reconciled('a1'), 1, 3)
+    with open(beans, 'a', encoding='utf-8') as file: file.write('\n; edited elsewhere\n')
+    edit_session(beans, resume=True)
+    assert 'rec:' not in open(beans, encoding='utf-8').read()
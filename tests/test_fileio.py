@@ -0,0 +1,42 @@
+import io
+import os
+from bean_tools.fileio import splice_lines, splice_file, atomic_write, append_file
+
+LINES = ['a1\n', 'a2\n', '\n', 'b1\n', 'b2\n', 'b3\n', '\n', 'c1\n']
+
+def splice(edits, appends=()):
+    counts = []
+    return ''.join(splice_lines(io.StringIO(''.join(LINES)), edits, appends, counts)), counts
+
+def test_replace_insert_and_append():
+    text, counts = splice([(4, 3, ['B\n']), (1, 0, ['top\n']), (8, 1, ['C\n'])], ['end\n'])
+    assert text == 'top\na1\na2\n\nB\n\nC\nend\n'
+    assert counts == [0, 3, 1]
+
+def test_insert_before_replace_at_same_line():
+    text, counts = splice([(4, 1, ['B\n']), (4, 0, ['new\n'])])
+    assert text == 'a1\na2\n\nnew\nB\nb2\nb3\n\nc1\n'
+
+def test_replace_entry_to_blank_line():
+    text, counts = splice([(4, None, ['B\n'])])
+    assert text == 'a1\na2\n\nB\n\nc1\n'
+    assert counts == [3]
+    # The last entry has no blank line after it
+    text, counts = splice([(8, None, ['C\n'])])
+    assert text.endswith('\nC\n') and counts == [1]
+
+def test_splice_file_keeps_mode(tmp_path):
+    path = tmp_path / 'ledger.beancount'
+    path.write_text(''.join(LINES), encoding='utf-8')
+    os.chmod(path, 0o640)
+    report = splice_file(path, [(1, 2, ['A\n'])], ['end\n'])
+    assert path.read_text(encoding='utf-8') == 'A\n\nb1\nb2\nb3\n\nc1\nend\n'
+    assert report.counts == [2] and report.bytes == path.stat().st_size
+    assert os.stat(path).st_mode & 0o777 == 0o640
+    assert [p.name for p in tmp_path.iterdir()] == ['ledger.beancount']
+
+def test_atomic_write_and_append(tmp_path):
+    path = tmp_path / 'data.json'
+    atomic_write(path, ['{"a":', b' 1}'])
+    append_file(path, '\n')
+    assert path.read_text(encoding='utf-8') == '{"a": 1}\n'
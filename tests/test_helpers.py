@@ -0,0 +1,34 @@
+import datetime
+from bean_tools.helpers import Transaction, reconcile_pairs, get_matches
+from bean_tools.ledger import ledger_load
+
+def txn(id, date, amount=-45, payee='Grocer'):
+    return Transaction(id, datetime.datetime.fromisoformat(date), payee, amount)
+
+def dates(pairs):
+    return {txn.id: bean.entry.date.isoformat() for txn, bean, post in pairs}
+
+def test_reconcile_pairs_is_one_to_one(ledger_path):
+    ledger_data = ledger_load(ledger_path, use_cache=False)
+    pairs = reconcile_pairs([txn('a', '2024-01-06'), txn('b', '2024-01-07')], ledger_data, 'Assets:Checking')
+    # a is closest to the January posting, b takes the one left
+    assert dates(pairs) == {'a': '2024-01-05', 'b': '2024-02-05'}
+
+def test_reconcile_pairs_leaves_ties_out(ledger_path):
+    ledger_data = ledger_load(ledger_path, use_cache=False)
+    # Two transactions equally close to the January posting
+    pairs = reconcile_pairs([txn('a', '2024-01-04'), txn('b', '2024-01-06')], ledger_data, 'Assets:Checking', 7)
+    assert pairs == []
+
+def test_reconcile_pairs_prefers_similar_payee(ledger_path):
+    ledger_data = ledger_load(ledger_path, use_cache=False)
+    ledger_data.transactions[1].update(date='2024-01-05', payee='Power Co')
+    ledger_data.index_bean(ledger_data.transactions[1])
+    pairs = reconcile_pairs([txn('a', '2024-01-05', payee='POWER CO 123')], ledger_data, 'Assets:Checking')
+    assert [bean.entry.payee for txn_, bean, post in pairs] == ['Power Co']
+
+def test_reconcile_pairs_window(ledger_path):
+    ledger_data = ledger_load(ledger_path, use_cache=False)
+    assert reconcile_pairs([txn('a', '2024-03-20')], ledger_data, 'Assets:Checking', 7) == []
+    assert dates(reconcile_pairs([txn('a', '2024-03-20')], ledger_data, 'Assets:Checking')) == {'a': '2024-02-05'}
+    assert [bean.entry.date.isoformat() for bean in get_matches(txn('a', '2024-01-20'), ledger_data, 'Assets:Checking', 20)] == ['2024-01-05', '2024-02-05']
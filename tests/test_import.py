@@ -0,0 +1,190 @@
+import datetime
+import json
+import os
+import pytest
+from beancount import loader
+from beancount.core.data import Transaction
+from typer.testing import CliRunner
+from bean_tools.cli import app
+from bean_tools.bean_import import ImportContext, auto_reconcile
+from bean_tools.edits import EditSession
+from bean_tools.helpers import Transaction as BankTransaction
+from bean_tools.ledger import ledger_load, ledger_bean
+
+def simplefin_file(path, accounts):
+    # accounts maps an account id to (id, date, amount, payee) transactions
+    data = {"errors": [], "accounts": [{
+        "id": account_id,
+        "name": f"Account {account_id}",
+        "org": {"name": "Test Bank"},
+        "transactions": [{
+            "id": id,
+            "posted": int(datetime.datetime.fromisoformat(date).timestamp()),
+            "amount": amount,
+            "description": payee,
+            "payee": payee
+        } for id, date, amount, payee in txns]
+    } for account_id, txns in accounts.items()]}
+    path.write_text(json.dumps(data), encoding='utf-8')
+    return path
+
+def ofx_file(path, statements):
+    # statements are (account id, (id, date, amount, payee) transactions), the first is checking, the rest cards
+    lines = ['OFXHEADER:100', 'DATA:OFXSGML', 'VERSION:102', '', '<OFX>', '<SIGNONMSGSRSV1><SONRS><FI><ORG>Test Bank<FID>1</FI></SONRS></SIGNONMSGSRSV1>']
+    for i, (account_id, txns) in enumerate(statements):
+        lines.append('<STMTRS><BANKACCTFROM><ACCTID>' + account_id + '<ACCTTYPE>CHECKING</BANKACCTFROM>' if not i else '<CCSTMTRS><CCACCTFROM><ACCTID>' + account_id + '</CCACCTFROM>')
+        lines.append('<BANKTRANLIST>')
+        for id, date, amount, payee in txns:
+            lines.append(f"<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>{date.replace('-', '')}<TRNAMT>{amount}<FITID>{id}<NAME>{payee}</STMTTRN>")
+        lines.append('</BANKTRANLIST>' + ('</STMTRS>' if not i else '</CCSTMTRS>'))
+    lines.append('</OFX>')
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    return path
+
+def recs(ledger_path):
+    entries, errors, options = loader.load_file(str(ledger_path))
+    assert not errors
+    return [post.meta['rec'] for entry in entries if isinstance(entry, Transaction) for post in entry.postings if post.meta and 'rec' in post.meta]
+
+def run_import(ledger_path, *args):
+    return CliRunner().invoke(app, ['import', str(ledger_path), '--headless', '--no-cache', *args])
+
+@pytest.fixture(autouse=True)
+def in_tmp_path(tmp_path, monkeypatch):
+    # payees.json and rules.json default to the working directory
+    monkeypatch.chdir(tmp_path)
+
+def test_shared_account_postings_pair_once(tmp_path, ledger_path):
+    simplefin = simplefin_file(tmp_path / 'data.json', {
+        'A': [('a1', '2024-01-05', -45, 'Grocer')],
+        'B': [('b1', '2024-01-06', -45, 'Grocer')],
+    })
+    account_map = tmp_path / 'map.json'
+    account_map.write_text(json.dumps({'A': 'Assets:Checking', 'B': 'Assets:Checking'}), encoding='utf-8')
+    result = run_import(ledger_path, '-s', str(simplefin), '-m', str(account_map), '--reconcile-window', '40')
+    assert result.exit_code == 0, result.output
+    assert sorted(recs(ledger_path)) == ['a1', 'b1']
+    assert 'Reconciled 2 transactions' in result.output
+
+def test_statements_of_several_accounts_need_a_map_headless(tmp_path, ledger_path):
+    ofx = ofx_file(tmp_path / 'download.ofx', [
+        ('CHK', [('c1', '2024-01-05', -45, 'Grocer')]),
+        ('CARD', [('x1', '2024-02-05', -45, 'Grocer')]),
+    ])
+    before = ledger_path.read_text(encoding='utf-8')
+    result = run_import(ledger_path, '-x', str(ofx), '-a', 'Assets:Checking')
+    assert 'an --account-map is required' in result.output
+    assert ledger_path.read_text(encoding='utf-8') == before
+
+def test_statements_of_several_accounts_are_prompted_for(tmp_path, ledger_path, monkeypatch):
+    ofx = ofx_file(tmp_path / 'download.ofx', [
+        ('CHK', [('c1', '2024-01-05', -45, 'Grocer')]),
+        ('CARD', [('x1', '2024-02-05', -45, 'Grocer')]),
+    ])
+    asked = []
+    def answer(message, **kwargs):
+        asked.append(str(message))
+        if 'CHK' in str(message): return 'Assets:Checking'
+        if 'CARD' in str(message): return 'Liabilities:Card'
+        return 'q'
+    monkeypatch.setattr('bean_tools.bean_import.prompt', answer)
+    result = CliRunner().invoke(app, ['import', str(ledger_path), '--no-cache', '-x', str(ofx), '-a', 'Assets:Checking'])
+    assert result.exit_code == 0, result.output
+    assert sum(1 for message in asked if 'CHK' in message or 'CARD' in message) == 2
+    assert 'Transaction account: Assets:Checking (Test Bank - CHECKING)' in result.output
+    assert 'Transaction account: Liabilities:Card (Test Bank - CREDITCARD)' in result.output
+
+@pytest.mark.parametrize('edited', [False, True])
+def test_reload_keeps_edits_unless_content_changed(tmp_path, ledger_path, edited):
+    ledger_data = ledger_load(ledger_path, use_cache=False)
+    session = EditSession(tmp_path / 'journal.jsonl')
+    ctx = ImportContext(ledger_path, ledger_data, session, None, None, None, '*', False, 0, True)
+    bean = ledger_data.transactions[0]
+    bean.entry.postings[1].meta.update({'rec': 'a1'})
+    assert ledger_data.replace(bean, session)
+    ctx.reconcile_count += 1
+
+    if edited:
+        with ledger_path.open('a', encoding='utf-8') as file: file.write('\n; edited elsewhere\n')
+    else:
+        stat = os.stat(ledger_path)
+        os.utime(ledger_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert ctx.reload()
+    assert ctx.reconcile_count == (0 if edited else 1)
+    assert recs(ledger_path) == ([] if edited else ['a1'])
+
+@pytest.mark.parametrize('reconcile_window, expected', [([], []), (['--reconcile-window', '60'], ['a1'])])
+def test_auto_reconcile_window(tmp_path, ledger_path, reconcile_window, expected):
+    # The closest unreconciled 45.00 posting is 44 days before the transaction
+    simplefin = simplefin_file(tmp_path / 'data.json', {'A': [('a1', '2024-03-20', -45, 'Grocer')]})
+    result = run_import(ledger_path, '-s', str(simplefin), '-a', 'Assets:Checking', *reconcile_window)
+    assert result.exit_code == 0, result.output
+    assert recs(ledger_path) == expected
+
+def test_headless_inserts_rule_matches_and_writes_review(tmp_path, ledger_path):
+    (tmp_path / 'rules.json').write_text(json.dumps([
+        {"pattern": "GROCER", "match": "prefix", "max": 300, "payee": "Grocer", "tags": ["food"], "postings": [{"account": "Expenses:Food"}]},
+    ]), encoding='utf-8')
+    # Expenses:Food already has unreconciled 45.00 postings, far from these dates
+    simplefin = simplefin_file(tmp_path / 'data.json', {'A': [
+        ('g1', '2024-06-01', -45, 'GROCER #12'),
+        ('u1', '2024-06-02', -45, 'Unknown'),
+    ]})
+    result = run_import(ledger_path, '-s', str(simplefin), '-a', 'Assets:Checking', '--window', '7', '-o', str(ledger_path), '--review', str(tmp_path / 'review.json'))
+    assert result.exit_code == 0, result.output
+    assert 'Inserted 1 transactions' in result.output
+    assert recs(ledger_path) == ['g1']
+    review = json.loads((tmp_path / 'review.json').read_text(encoding='utf-8'))
+    assert [t['id'] for t in review['accounts'][0]['transactions']] == ['u1']
+
+def test_inserted_bean_reconciles_from_another_account(tmp_path, ledger_path, monkeypatch):
+    (tmp_path / 'rules.json').write_text(json.dumps([
+        {"pattern": "CARD PAYMENT", "match": "prefix", "payee": "Card", "postings": [{"account": "Liabilities:Card"}]},
+    ]), encoding='utf-8')
+    ofx = ofx_file(tmp_path / 'download.ofx', [
+        ('CHK', [('c1', '2024-03-01', -100, 'CARD PAYMENT')]),
+        ('CARD', [('k1', '2024-03-02', 100, 'PAYMENT THANK YOU')]),
+    ])
+    account_map = tmp_path / 'map.json'
+    account_map.write_text(json.dumps({'CHK': 'Assets:Checking', 'CARD': 'Liabilities:Card'}), encoding='utf-8')
+    # The card payment is reconciled against the bean the rule just inserted
+    answers = iter(['r', '0'])
+    monkeypatch.setattr('bean_tools.bean_import.prompt', lambda message, **kwargs: next(answers))
+    result = CliRunner().invoke(app, ['import', str(ledger_path), '--no-cache', '-x', str(ofx), '-m', str(account_map), '-o', str(ledger_path)])
+    assert result.exit_code == 0, result.output
+    assert sorted(recs(ledger_path)) == ['c1', 'k1']
+    assert 'Reconciled 1 transactions' in result.output and 'Inserted 1 transactions' in result.output
+
+def test_inserted_beans_are_matched_once_written(tmp_path, ledger_path):
+    ledger_data = ledger_load(ledger_path, use_cache=False)
+    session = EditSession(tmp_path / 'journal.jsonl')
+    txn = BankTransaction('t1', datetime.datetime(2024, 3, 5), 'Power', -10)
+    bean = ledger_bean(txn, 'Assets:Checking', '*')
+    bean.add_posting({"account": "Expenses:Power", "amount": 10, "currency": "USD"})
+    bean.add_posting({"account": "Assets:Checking", "amount": -10, "currency": "USD"})
+    ledger_data.insert(bean, ledger_path, session)
+    assert ledger_data.unreconciled_postings('Expenses:Power', 10) == []
+
+    # Edits above the appended bean shift it like any other entry
+    first = ledger_data.transactions[0]
+    first.entry.postings[1].meta.update({'rec': 'a1'})
+    assert ledger_data.replace(first, session)
+    ledger_data.commit(session)
+    assert ledger_data.unreconciled_postings('Expenses:Power', 10)[0][2] is bean
+    post = bean.entry.postings[0]
+    post.meta.update({'rec': 'p1'})
+    assert ledger_data.replace(bean, session)
+    ledger_data.commit(session)
+    assert sorted(recs(ledger_path)) == ['a1', 'p1']
+
+def test_auto_reconcile_rolls_back_unwritten_recs(tmp_path, ledger_path):
+    ledger_data = ledger_load(ledger_path, use_cache=False)
+    session = EditSession(tmp_path / 'journal.jsonl')
+    txn = BankTransaction('t1', datetime.datetime(2024, 3, 5), 'Power', -10)
+    unplaced = ledger_bean(txn, 'Assets:Checking', '*')
+    unplaced.add_posting({"account": "Assets:Checking", "amount": -10, "currency": "USD"})
+    placed = ledger_data.transactions[0]
+    pairs = [(txn, unplaced, unplaced.entry.postings[0]), (BankTransaction('a1', datetime.datetime(2024, 1, 5), 'Grocer', -45), placed, placed.entry.postings[1])]
+    assert auto_reconcile(pairs, ledger_data, session) == {'a1'}
+    assert 'rec' not in unplaced.entry.postings[0].meta
+    assert recs(ledger_path) == ['a1']
@@ -0,0 +1,96 @@
+import os
+import datetime
+import json
+import beanquery
+import pytest
+from beanquery import parser
+from typer.testing import CliRunner
+from bean_tools import bean_inquiry
+from bean_tools.cli import app
+from bean_tools.bean_inquiry import bind_query
+from bean_tools.cache import cache_read, cache_write, query_cache_get, query_cache_set, result_cache_path
+
+QUERIES = """
+2024-01-01 query "by_year" "SELECT date, narration WHERE year = {year}"
+2024-01-01 query "by_payee" "SELECT date WHERE payee = '{0}'"
+2024-01-01 query "first" "SELECT date, payee ORDER BY date LIMIT {n}"
+2024-01-01 query "opened" "SELECT date, account FROM OPEN ON {start} CLOSE ON {end} WHERE account ~ 'Expenses'"
+"""
+
+def inquiry(ledger_path, *args):
+    with ledger_path.open('a', encoding='utf-8') as f: f.write(QUERIES)
+    return CliRunner().invoke(app, ['inquiry', str(ledger_path), '--no-cache', *args])
+
+def test_bind_query_binds_expressions():
+    assert bind_query("SELECT date WHERE year = {year}", {'year': '2024'}, use_cache=False) == ("SELECT date WHERE year = %(p0)s", {'p0': 2024})
+    assert bind_query("SELECT date WHERE date > {0}", ['2024-02-01'], use_cache=False)[1] == {'p0': datetime.date(2024, 2, 1)}
+    assert bind_query("SELECT date WHERE payee = '{0}'", ['Grocer'], use_cache=False)[1] == {'p0': 'Grocer'}
+
+def test_bind_query_falls_back_outside_expressions():
+    assert bind_query("SELECT date LIMIT {n}", {'n': '1'}, use_cache=False) is None
+    assert bind_query("SELECT date FROM OPEN ON {start} CLOSE ON {end}", {'start': '2024-01-01', 'end': '2024-02-01'}, use_cache=False) is None
+
+def test_limit_placeholder(ledger_path):
+    result = inquiry(ledger_path, 'first', 'n:1')
+    assert result.exit_code == 0, result.output
+    assert '(injected)' in result.output
+    assert '2024-01-05' in result.output and '2024-02-05' not in result.output
+
+def test_open_close_placeholders(ledger_path):
+    result = inquiry(ledger_path, 'opened', 'start:2024-01-01', 'end:2024-02-01')
+    assert result.exit_code == 0, result.output
+    assert 'Expenses:Food' in result.output
+
+def test_bound_placeholders(ledger_path):
+    result = inquiry(ledger_path, 'by_payee', 'Grocer')
+    assert result.exit_code == 0, result.output
+    assert '(bound)' in result.output
+    assert '2024-02-05' in result.output
+
+def test_results_are_cached_until_the_ledger_changes(ledger_path, monkeypatch):
+    with ledger_path.open('a', encoding='utf-8') as f: f.write(QUERIES)
+    run = lambda *args: CliRunner().invoke(app, ['inquiry', str(ledger_path), 'by_payee', 'Grocer', *args])
+    first = run()
+    assert first.exit_code == 0 and 'Loading ledger' in first.output
+
+    # Hits render without loading the ledger
+    monkeypatch.setattr('bean_tools.bean_inquiry.ledger_load', lambda *args, **kwargs: pytest.fail('ledger loaded'))
+    second = run()
+    assert second.exit_code == 0 and 'Cached result for by_payee Grocer' in second.output
+    assert '2024-01-05' in second.output and '2024-02-05' in second.output
+
+    # Touching a file keeps the result, editing one drops it
+    stat = os.stat(ledger_path)
+    os.utime(ledger_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert 'Cached result' in run().output
+    monkeypatch.undo()
+    with ledger_path.open('a', encoding='utf-8') as f: f.write('\n2024-03-05 * "Grocer" ""\n  Expenses:Food  45.00 USD\n  Assets:Checking  -45.00 USD\n')
+    third = run()
+    assert 'Loading ledger' in third.output and '2024-03-05' in third.output
+    assert 'Loading ledger' in run('--max-age', '0').output
+    assert 'Loading ledger' in run('--no-cache').output
+
+@pytest.mark.parametrize('tree', ['SELECT date', ('NoSuchNode', [], None, None), ('Select', [1], 0, 1), ['Select']])
+def test_unusable_cached_trees_are_parsed_again(ledger_path, monkeypatch, tree):
+    monkeypatch.setattr(bean_inquiry, 'PARSED', {})
+    query = "SELECT date, narration WHERE year = %(p0)s"
+    query_cache_set(query, beanquery.__version__, tree)
+    statement = bean_inquiry.parse_query(query)
+    assert bean_inquiry.tree_dump(statement) == bean_inquiry.tree_dump(parser.parse(query))
+    # The entry is replaced with one that loads
+    monkeypatch.setattr(bean_inquiry, 'PARSED', {})
+    assert bean_inquiry.tree_dump(bean_inquiry.parse_query(query)) == query_cache_get(query, beanquery.__version__)
+
+def test_results_of_today_queries_expire_with_the_day(ledger_path):
+    with ledger_path.open('a', encoding='utf-8') as f: f.write('\n2024-01-01 query "recent" "SELECT date WHERE date > today() - 100000"\n')
+    run = lambda: CliRunner().invoke(app, ['inquiry', str(ledger_path), 'recent'])
+    assert 'Loading ledger' in run().output
+    assert 'Cached result' in run().output
+
+    # The same entry made yesterday is recomputed
+    path = result_cache_path(ledger_path, json.dumps(['recent', []]))
+    data = cache_read(path)
+    assert data['day'] == datetime.date.today().isoformat()
+    data['day'] = (datetime.date.today() - datetime.timedelta(days=1)).isoformat()
+    cache_write(path, data)
+    assert 'Loading ledger' in run().output
@@ -0,0 +1,30 @@
+import datetime
+from beancount import loader
+from bean_tools.helpers import Transaction
+from bean_tools.ledger import ledger_load, ledger_bean
+
+def test_insert_indexes_beans_with_real_dates(ledger_path):
+    ledger_data = ledger_load(ledger_path, use_cache=False)
+    txn = Transaction('t1', datetime.datetime(2024, 3, 5), 'Grocer', -45)
+    bean = ledger_bean(txn, 'Assets:Checking', '*')
+    bean.add_posting({"account": "Expenses:Food", "amount": 45, "currency": "USD"})
+    bean.add_posting({"account": "Assets:Checking", "amount": -45, "currency": "USD"})
+    assert bean.entry.date == datetime.date(2024, 3, 5)
+
+    # The (account, amount) keys already hold postings from the loaded ledger
+    ledger_data.insert(bean, ledger_path)
+    postings = ledger_data.unreconciled_postings('Expenses:Food', 45)
+    assert [item[0] for item in postings] == [datetime.date(2024, 1, 5), datetime.date(2024, 2, 5), datetime.date(2024, 3, 5)]
+    assert ledger_data.unreconciled_postings('Assets:Checking', 45, datetime.date(2024, 3, 1), 7)[0][2] is bean
+
+    entries, errors, options = loader.load_file(str(ledger_path))
+    assert not errors
+    assert sum(1 for entry in entries if getattr(entry, 'payee', None) == 'Grocer') == 3
+
+def test_update_parses_prompted_dates(ledger_path):
+    ledger_data = ledger_load(ledger_path, use_cache=False)
+    bean = ledger_data.transactions[0]
+    bean.update(date='2024-03-07')
+    assert bean.entry.date == datetime.date(2024, 3, 7)
+    ledger_data.index_bean(bean)
+    assert ledger_data.unreconciled_postings('Expenses:Food', 45)[-1][2] is bean
@@ -0,0 +1,67 @@
+import io
+import pytest
+from bean_tools import ofx
+from bean_tools.ofx import ofx_segments, ofx_accounts, ofx_files_load
+
+SGML = """OFXHEADER:100
+DATA:OFXSGML
+CHARSET:1252
+
+<OFX><SIGNONMSGSRSV1><SONRS><FI><ORG>Test &amp; Bank<FID>1</FI></SONRS></SIGNONMSGSRSV1>
+<BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKACCTFROM><ACCTID>CHK<ACCTTYPE>CHECKING</BANKACCTFROM><BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240105120000<TRNAMT>-45.00<FITID>c1<NAME>Grocer</STMTTRN>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240206[-5:EST]<TRNAMT>-10,50<FITID>c2<NAME>Caf\xe9</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1>
+<CREDITCARDMSGSRSV1><CCSTMTTRNRS><CCSTMTRS><CCACCTFROM><ACCTID>CARD</CCACCTFROM><BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240210<TRNAMT>-20.00<FITID>x1<MEMO>Power</STMTTRN>
+</BANKTRANLIST></CCSTMTRS></CCSTMTTRNRS></CREDITCARDMSGSRSV1></OFX>
+"""
+
+XML = """<?xml version="1.0" encoding="UTF-8"?>
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKACCTFROM><ACCTID>CHK</ACCTID><ACCTTYPE>SAVINGS</ACCTTYPE></BANKACCTFROM>
+<BANKTRANLIST><STMTTRN><TRNTYPE>CREDIT</TRNTYPE><DTPOSTED>20240301</DTPOSTED><TRNAMT>100.00</TRNAMT><FITID>s1</FITID><NAME>Pay</NAME></STMTTRN></BANKTRANLIST>
+</STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+def segments(text, size, monkeypatch):
+    monkeypatch.setattr(ofx, 'CHUNK_SIZE', size)
+    return list(ofx_segments(io.StringIO(text)))
+
+@pytest.mark.parametrize('size', [1, 2, 7, 9, 10, 11, 64, 1 << 20])
+def test_segments_do_not_depend_on_chunk_boundaries(size, monkeypatch):
+    result = segments(SGML, size, monkeypatch)
+    assert ''.join(text if not is_txn else f"<STMTTRN>{text}</STMTTRN>" for is_txn, text in result) == SGML
+    assert [text for is_txn, text in result if is_txn] == [text for is_txn, text in segments(SGML, 1 << 20, monkeypatch) if is_txn]
+    assert sum(1 for is_txn, text in result if is_txn) == 3
+
+def test_unclosed_last_transaction(monkeypatch):
+    result = segments('<A><STMTTRN><TRNAMT>1', 4, monkeypatch)
+    assert result[-1] == (True, '<TRNAMT>1')
+
+@pytest.mark.parametrize('size', [3, 1 << 20])
+def test_accounts_per_statement(tmp_path, size, monkeypatch):
+    monkeypatch.setattr(ofx, 'CHUNK_SIZE', size)
+    path = tmp_path / 'download.ofx'
+    path.write_bytes(SGML.encode('cp1252'))
+    checking, card = ofx_accounts(path)
+    assert (checking.account_id, checking.account_type, checking.institution) == ('CHK', 'CHECKING', 'Test & Bank')
+    assert [(t.id, t.date, t.payee, t.amount) for t in checking.transactions] == [('c1', '2024-01-05', 'Grocer', -45.0), ('c2', '2024-02-06', 'Café', -10.5)]
+    assert (card.account_id, card.account_type, [t.payee for t in card.transactions]) == ('CARD', 'CREDITCARD', ['Power'])
+    assert [t.id for account in ofx_accounts(path, '2024-02') for t in account.transactions] == ['c2', 'x1']
+
+def test_xml_and_duplicates_across_files(tmp_path):
+    sgml = tmp_path / 'a.ofx'
+    sgml.write_bytes(SGML.encode('cp1252'))
+    xml = tmp_path / 'b.qfx'
+    xml.write_text(XML, encoding='utf-8')
+    again = tmp_path / 'c.ofx'
+    again.write_bytes(SGML.encode('cp1252'))
+    accounts = {account.account_id: account for account in ofx_files_load([str(sgml), str(xml), str(again)], jobs=2)}
+    assert [t.id for t in accounts['CHK'].transactions] == ['c1', 'c2', 's1']
+    assert [t.id for t in accounts['CARD'].transactions] == ['x1']
+
+def test_xml_with_byte_order_mark(tmp_path):
+    path = tmp_path / 'bom.qfx'
+    path.write_bytes(b'\xef\xbb\xbf' + XML.replace('>Pay<', '>Caf\u00e9<').encode('utf-8'))
+    (account,) = ofx_accounts(path)
+    assert [(t.id, t.payee) for t in account.transactions] == [('s1', 'Café')]
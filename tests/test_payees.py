@@ -0,0 +1,56 @@
+import json
+from bean_tools.payees import PayeeRules, PayeeStore
+
+def test_rule_types_are_tried_in_order():
+    rules = PayeeRules([
+        {'pattern': 'amzn', 'match': 'prefix', 'payee': 'Amazon'},
+        {'pattern': 'AMZN MKTP', 'match': 'exact', 'payee': 'Amazon Marketplace'},
+        {'pattern': 'mktp', 'match': 'regex', 'payee': 'Marketplace'},
+    ])
+    assert rules.normalize('amzn mktp') == 'Amazon Marketplace'
+    assert rules.normalize('AMZN Digital') == 'Amazon'
+    assert rules.normalize('EBAY MKTP') == 'Marketplace'
+    assert rules.normalize('Unknown') is None
+
+def test_longest_prefix_wins():
+    rules = PayeeRules([
+        {'pattern': 'SQ *', 'match': 'prefix', 'payee': 'Square'},
+        {'pattern': 'SQ *COFFEE', 'match': 'prefix', 'payee': 'Coffee'},
+    ])
+    assert rules.normalize('SQ *COFFEE 123') == 'Coffee'
+    assert rules.normalize('SQ *BAKERY') == 'Square'
+
+def test_first_regex_in_file_order_wins():
+    rules = PayeeRules([
+        {'pattern': r'shell', 'match': 'regex', 'payee': 'Shell'},
+        {'pattern': r'^shell oil \d+', 'match': 'regex', 'payee': 'Shell Oil'},
+    ])
+    assert rules.regex_re is not None
+    assert rules.normalize('SHELL OIL 5744') == 'Shell'
+
+def test_backreferences_match_per_rule():
+    rules = PayeeRules([
+        {'pattern': r'^(\w+) x', 'match': 'regex', 'payee': 'First'},
+        {'pattern': r'(\w)\1', 'match': 'regex', 'payee': 'Doubled'},
+    ])
+    assert rules.regex_re is None
+    assert rules.normalize('book') == 'Doubled'
+    assert rules.normalize('abc') is None
+    assert rules.normalize('abc x') == 'First'
+
+def test_fuzzy_rules_ignore_reference_numbers():
+    rules = PayeeRules([{'pattern': 'CITY WATER UTILITY', 'match': 'fuzzy', 'payee': 'Water'}], threshold=0.6)
+    assert rules.normalize('CITY WATER 000123') == 'Water'
+    assert rules.normalize('CITY PARKING') is None
+
+def test_store_writes_in_batches(tmp_path):
+    path = tmp_path / 'payees.json'
+    store = PayeeStore(path, batch=2)
+    store.set('AMZN 1', 'Amazon')
+    assert json.loads(path.read_text(encoding='utf-8')) == {}
+    store.set('AMZN 2', 'Amazon')
+    assert json.loads(path.read_text(encoding='utf-8')) == {'AMZN 1': 'Amazon', 'AMZN 2': 'Amazon'}
+    store.set('AMZN 1', 'Amazon Digital')
+    store.flush()
+    assert PayeeStore(path).get('AMZN 1') == 'Amazon Digital'
+    assert store.names == ['Amazon', 'Amazon Digital']
@@ -0,0 +1,41 @@
+import datetime
+from decimal import Decimal
+from bean_tools.helpers import Transaction
+from bean_tools.rules import ImportRules
+
+RULES = ImportRules([
+    {"pattern": "GROCER", "match": "prefix", "max": 300, "payee": "Grocer", "tags": ["food"], "postings": [{"account": "Expenses:Food"}]},
+    {"pattern": "utility|power", "match": "regex", "account": "Assets:Checking",
+     "postings": [{"account": "Expenses:Power", "amount": "60%"}, {"account": "Expenses:Water"}]},
+    {"pattern": "Rent", "postings": [{"account": "Expenses:Rent", "amount": 1000}, {"account": "Expenses:Fees", "amount": 5}]},
+])
+
+def txn(payee, amount, id='t1'):
+    return Transaction(id, datetime.datetime(2024, 3, 1), payee, amount)
+
+def postings(bean):
+    return [(post.account, post.units.number) for post in bean.entry.postings]
+
+def test_first_matching_rule_by_payee_amount_and_account():
+    assert RULES.match(txn('GROCER #12', -45), 'Assets:Checking').payee == 'Grocer'
+    assert RULES.match(txn('GROCER #12', -450), 'Assets:Checking') is None
+    assert RULES.match(txn('City Utility', -80), 'Liabilities:Card') is None
+    # Normalized payees are tried before the raw bank payee
+    assert RULES.match(txn('ACH 123', -1005), 'Assets:Checking', payee='rent') is not None
+
+def test_bean_splits_and_balances():
+    bean = RULES.match(txn('CITY UTILITY', -80.01), 'Assets:Checking').bean(txn('CITY UTILITY', -80.01), 'Assets:Checking', None, '*', 'USD')
+    assert bean.entry.date == datetime.date(2024, 3, 1)
+    assert postings(bean) == [('Expenses:Power', Decimal('48.01')), ('Expenses:Water', Decimal('32.00')), ('Assets:Checking', Decimal('-80.01'))]
+    assert bean.entry.postings[-1].meta == {'rec': 't1'}
+
+def test_bean_without_open_posting_absorbs_rounding():
+    rule = RULES.match(txn('Rent', -1010), 'Assets:Checking')
+    bean = rule.bean(txn('Rent', 1010), 'Assets:Checking', 'Landlord', '!', 'USD')
+    assert (bean.entry.flag, bean.entry.payee) == ('!', 'Landlord')
+    assert postings(bean) == [('Expenses:Rent', Decimal('-1000.00')), ('Expenses:Fees', Decimal('-10.00')), ('Assets:Checking', Decimal('1010.00'))]
+
+def test_invalid_rules_are_skipped():
+    rules = ImportRules([{"pattern": "x"}, {"pattern": "(", "match": "regex", "postings": [{"account": "Expenses:A"}]},
+                         {"pattern": "y", "postings": [{"account": "Expenses:A"}, {"account": "Expenses:B"}]}])
+    assert len(rules) == 0
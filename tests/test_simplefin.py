@@ -0,0 +1,34 @@
+import pytest
+from bean_tools.bean_download import DAY, sync_cursors, sync_store
+from bean_tools.simplefin import simplefin_accounts, simplefin_write, store_write, store_index, store_transactions
+from tests.test_sync import START, txn, delta
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_store_sync_appends_partitions(tmp_path, compress):
+    output = tmp_path / 'data'
+    store_write(output, delta(txn('a1', 0), txn('a2', 1)), compress)
+    cursors = sync_cursors(output, 7)
+    assert cursors['A']['posted'] == START + DAY
+    assert sync_store(output, delta(txn('a2', 1), txn('a3', 2)), cursors, 7, compress) == 1
+    assert sync_store(output, delta(txn('b1', 0), id='B'), cursors, 7, compress) == 1
+    index = store_index(output)
+    assert [(entry['id'], entry['count']) for entry in index['accounts']] == [('A', 3), ('B', 1)]
+    assert all(entry['file'].endswith('.ndjson.gz' if compress else '.ndjson') for entry in index['accounts'])
+    assert [t['id'] for t in store_transactions(output, index['accounts'][0])] == ['a1', 'a2', 'a3']
+    accounts = simplefin_accounts(str(output))
+    assert [(account.account_id, [t.id for t in account.transactions]) for account in accounts] == [('A', ['a1', 'a2', 'a3']), ('B', ['b1'])]
+
+def test_store_skips_ids_repeated_by_an_interrupted_sync(tmp_path):
+    output = tmp_path / 'data'
+    index = store_write(output, delta(txn('a1', 0), txn('a2', 1)))
+    with open(output / index['accounts'][0]['file'], 'a', encoding='utf-8') as file:
+        file.write('{"id":"a2","posted":0,"amount":"-10.00","payee":"Grocer"}\n\n')
+    assert [t['id'] for t in store_transactions(output, index['accounts'][0])] == ['a1', 'a2']
+
+def test_review_file_round_trips(tmp_path):
+    store_write(tmp_path / 'data', delta(txn('a1', 0), txn('a2', 1)))
+    account = simplefin_accounts(str(tmp_path / 'data'))[0]
+    review = tmp_path / 'review.json'
+    simplefin_write(review, [(account, account.transactions)])
+    again = simplefin_accounts(str(review))[0]
+    assert [(t.id, t.date, t.payee, t.amount) for t in again.transactions] == [(t.id, t.date, t.payee, t.amount) for t in account.transactions]
@@ -0,0 +1,44 @@
+from bean_tools.bean_download import DAY, sync_merge, sync_cursors, sync_json
+from bean_tools.helpers import get_json
+
+START = 1704067200  # 2024-01-01
+
+def txn(id, day):
+    return {"id": id, "posted": START + day * DAY, "amount": "-10.00", "description": "Grocer", "payee": "Grocer"}
+
+def delta(*txns, id='A'):
+    return {"errors": [], "accounts": [{"id": id, "name": "Checking", "org": {"name": "Test Bank"}, "transactions": list(txns)}]}
+
+def added(merged):
+    return {account['id']: [t['id'] for t in txns] for account, txns in merged}
+
+def test_sync_merge_advances_cursors():
+    cursors = {}
+    assert added(sync_merge(delta(txn('a1', 0), txn('a2', 5)), cursors, 7)) == {'A': ['a1', 'a2']}
+    assert cursors['A'] == {"posted": START + 5 * DAY, "ids": {'a1': START, 'a2': START + 5 * DAY}}
+
+    # The next delta repeats the overlap, a late posting inside it is new
+    assert added(sync_merge(delta(txn('a2', 5), txn('late', 3), txn('a3', 20)), cursors, 7)) == {'A': ['late', 'a3']}
+    assert cursors['A']['posted'] == START + 20 * DAY
+    # Ids older than the overlap before the cursor are dropped
+    assert set(cursors['A']['ids']) == {'a3'}
+
+def test_sync_merge_skips_transactions_before_the_overlap():
+    cursors = {'A': {"posted": START + 30 * DAY, "ids": {}}}
+    assert added(sync_merge(delta(txn('old', 10), txn('near', 25)), cursors, 7)) == {'A': ['near']}
+    assert cursors['A']['posted'] == START + 30 * DAY
+
+def test_sync_merge_checks_stored_transactions():
+    # A previous run wrote the store but stopped before saving its cursors
+    cursors = {'A': {"posted": START, "ids": {}}}
+    stored = {'A': [txn('a2', 2)]}
+    assert added(sync_merge(delta(txn('a2', 2), txn('a3', 3)), cursors, 7, stored)) == {'A': ['a3']}
+
+def test_sync_json_and_cursor_bootstrap(tmp_path):
+    output = tmp_path / 'data.json'
+    cursors = {}
+    assert sync_json(output, delta(txn('a1', 0), txn('a2', 1)), cursors, 7) == 2
+    assert sync_json(output, delta(txn('a2', 1), txn('a3', 2), txn('a4', 2)), cursors, 7) == 2
+    assert [t['id'] for t in get_json(output)['accounts'][0]['transactions']] == ['a1', 'a2', 'a3', 'a4']
+    # Without a state file the cursors are rebuilt from the output
+    assert sync_cursors(output, 7) == cursors